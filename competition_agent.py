@@ -6,9 +6,49 @@ champions) in a tournament.
 """
 import random
 
-class SearchTimeout(Exception):
-    """Subclass base exception for code clarity. """
-    pass
+from collections import namedtuple
+
+from game_agent import EXACT, LOWER, UPPER, SearchTimeout, TranspositionTable
+from isolation.isolation import board_geometry
+
+SymmetryTables = namedtuple("SymmetryTables", ["enter", "leave", "inverse"])
+
+_SYMMETRY_TABLES = {}
+
+
+def symmetry_tables(width, height):
+    """Return the tables that keep the Zobrist keys of the images of a
+    position under every board symmetry (see `Board.symmetric_keys`) up to
+    date as moves are made, cached per board size.
+
+    `enter[slot][idx]` holds, for each symmetry, the key change of player
+    `slot` (0 or 1) moving to cell `idx`: the blocked cell, the new location
+    and the change of initiative; `leave[slot][idx]` holds the key of player
+    `slot` standing on cell `idx`, which is removed when it moves on.
+    `inverse[s]` maps the cells of the image under symmetry `s` back to the
+    cells of the position.
+    """
+    tables = _SYMMETRY_TABLES.get((width, height))
+    if tables is None:
+        geometry = board_geometry(width, height)
+        symmetries = geometry.symmetries
+        enter, leave = [], []
+        for positions in (geometry.zobrist_p1, geometry.zobrist_p2):
+            enter.append([tuple(geometry.zobrist_cells[image[idx]] ^
+                                positions[image[idx]] ^ geometry.zobrist_side
+                                for image in symmetries)
+                          for idx in range(width * height)])
+            leave.append([tuple(positions[image[idx]] for image in symmetries)
+                          for idx in range(width * height)])
+        inverse = []
+        for image in symmetries:
+            cells = [0] * len(image)
+            for idx, target in enumerate(image):
+                cells[target] = idx
+            inverse.append(cells)
+        tables = SymmetryTables(enter, leave, inverse)
+        _SYMMETRY_TABLES[width, height] = tables
+    return tables
 
 def cornerpenalty(game, player):
     corners_2moves = [(0, 0), (game.width - 1, 0), (0, game.height - 1), (game.width - 1, game.height - 1)]
@@ -75,14 +115,47 @@ class CustomPlayer:
         the PvP competition uses more accurate timers that are not cross-
         platform compatible, so a limit of 1ms (vs 10ms for the other classes)
         is generally sufficient.
+
+    time_manager : game_agent.TimeManager (optional)
+        Controls when iterative deepening stops and how often the clock is
+        read. When None, every node reads the clock.
+
+    stats : game_agent.SearchStats (optional)
+        Collects per-move search statistics when given.
+
+    ponder : concurrent_search.Ponderer (optional)
+        When given, the player keeps searching while the opponent thinks: it
+        predicts the reply to its move with a shallow search and ponders the
+        resulting position until the next call to get_move().
+
+    book : opening_book.OpeningBook or solver.SolutionDatabase (optional)
+        Moves played without searching, as for game_agent.AlphaBetaPlayer.
+
+    cache : game_agent.TranspositionTable (optional)
+        The position cache, kept across iterations and turns (a 2 ** 16 entry
+        table by default). Entries are keyed by the canonical key of the
+        position under the board symmetries and tagged with the search depth
+        and bound; older turns' entries are replaced first, and the stored
+        best move is searched first when the entry is too shallow to answer.
     """
 
-    def __init__(self, data=None, timeout=10.):
+    def __init__(self, data=None, timeout=10., time_manager=None, stats=None,
+                 ponder=None, book=None, cache=None):
         self.score = custom_score_improve
         self.search_depth = 100
         self.time_left = None
         self.TIMER_THRESHOLD = timeout  
-        self.mirrortable = dict()
+        self.time_manager = time_manager
+        self.stats = stats
+        self.ponder = ponder
+        self.book = book
+        self._tm = None
+        self._stats = None
+        self.mirrortable = TranspositionTable() if cache is None else cache
+
+    def reset(self):
+        """Forget the earlier searches: clear the position cache. """
+        self.mirrortable.clear()
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -112,50 +185,147 @@ class CustomPlayer:
             (-1, -1) if there are no available legal moves.
         """
         # OPTIONAL: Finish this function!
+        pondered = None
+        if self.ponder is not None:
+            pondered = self.ponder.stop(game)
         self.time_left = time_left
+        stats = self._stats = self.stats
+        if stats is not None:
+            stats.begin_move(time_left)
         
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
         m = (-1, -1)
         lm = game.get_legal_moves()
         if not lm:
+            if stats is not None:
+                stats.end_move(time_left, m)
             return m
+        if self.book is not None:
+            m = self.book.lookup(game)
+            if m is not None:
+                if stats is not None:
+                    stats.end_move(time_left, m)
+                return m
+            m = (-1, -1)
+        start = 0
+        if pondered is not None:
+            depth, m, _ = pondered
+            start = depth + 1
+        tm = self._tm = self.time_manager
+        if tm is not None:
+            tm.start(time_left, self.TIMER_THRESHOLD)
+        self.mirrortable.new_search()
 
         try:
             # The try/except block will automatically catch the exception
             # raised when the timer is about to expire.
-            for i in range(0, self.search_depth): 
-                self.mirrortable.clear()
+            for i in range(start, self.search_depth): 
+                if tm is not None and not tm.should_start(time_left):
+                    break
                 m = self.alphabeta(game, i)
+                if stats is not None:
+                    stats.end_iteration(time_left, i)
+                if tm is not None and tm.end_iteration(time_left, i, m):
+                    break
 
         except SearchTimeout:
              # Handle any actions required after timeout as needed
             if m == (-1, -1):
                 m = random.choice(lm)
+        if stats is not None:
+            stats.end_move(time_left, m)
+        if self.ponder is not None:
+            board = game.copy()
+            board.apply_move(m)
+            self.ponder.start(board, self.__ponder_search)
         return m
 
+    def __ponder_search(self, board, ponderer):
+        self.time_left = ponderer.time_left
+        self._tm = None
+        self._stats = None
+        reply = self.alphabeta(board, 2)
+        if reply == (-1, -1):
+            return
+        board.apply_move(reply)
+        for i in range(0, self.search_depth):
+            m = self.alphabeta(board, i)
+            if m != (-1, -1):
+                ponderer.record(i, m, None)
+
     def alphabeta(self, game, depth, alpha=float("-inf"), beta=float("inf")):
-        m, _ = self.__ab(game, depth, alpha, beta)
+        self._root_depth = depth
+        second = (game.active_player == self) == bool(game.move_count & 1)
+        self._seat = game.SEAT_KEY if second else 0
+        self._symmetry = symmetry_tables(game.width, game.height)
+        m, _ = self.__ab(game, depth, alpha, beta,
+                         tuple(game.symmetric_keys()))
         return m
+
+    def __child_keys(self, game, keys, move):
+        #symmetric keys of the position after `move`, from those of `game`
+        slot = game.move_count & 1
+        idx = move[0] + move[1] * game.height
+        enter = self._symmetry.enter[slot][idx]
+        prev = game._location_index(game.active_player)
+        if prev is None:
+            return tuple([k ^ e for k, e in zip(keys, enter)])
+        leave = self._symmetry.leave[slot][prev]
+        return tuple([k ^ e ^ l for k, e, l in zip(keys, enter, leave)])
     
-    def __ab(self, game, depth, alpha, beta):
-        if self.time_left() < self.TIMER_THRESHOLD:
-            raise SearchTimeout()
+    def __ab(self, game, depth, alpha, beta, keys):
+        tm = self._tm
+        if tm is None:
+            if self.time_left() < self.TIMER_THRESHOLD:
+                raise SearchTimeout()
+        else:
+            tm.countdown -= 1
+            if tm.countdown <= 0:
+                tm.poll(self.time_left)
+        stats = self._stats
+        if stats is not None:
+            stats.nodes += 1
 
         # TODO: finish this function!
         best_move = (-1, -1)
         ml = game.get_legal_moves(game.active_player)
+
+        if depth and ml:
+            key = min(keys)
+            symmetry = keys.index(key)
+            entry = self.__retrieve(game, key, symmetry)
+            if entry is not None:
+                cached_depth, value, bound, move = entry
+                if cached_depth >= depth:
+                    if bound == EXACT:
+                        return move, value
+                    if bound == LOWER:
+                        alpha = max(alpha, value)
+                    else:
+                        beta = min(beta, value)
+                    if beta <= alpha:
+                        return move, value
+                # search the stored best move first
+                if move in ml:
+                    ml.remove(move)
+                    ml.insert(0, move)
+            alpha_orig, beta_orig = alpha, beta
         
         if game.active_player == self:
             if not depth or not ml:
+                if stats is not None:
+                    stats.leaves += 1
                 return best_move, self.score(game, self)
-            value, move = self.__retrieve(game)
-            if value:
-                return move, value
             best_move = random.choice(ml)
             v = float("-inf")
             for m in ml:
-                _, x = self.__ab(game.forecast_move(m), depth - 1, alpha, beta)
+                child_keys = self.__child_keys(game, keys, m)
+                game.apply_move(m)
+                try:
+                    _, x = self.__ab(game, depth - 1, alpha, beta, child_keys)
+                finally:
+                    game.undo_move()
                 if x > v:
                     v = x
                     best_move = m
@@ -163,17 +333,23 @@ class CustomPlayer:
                     alpha = v
                     best_move = m
                 if beta <= alpha:
+                    if stats is not None:
+                        stats.cutoff(self._root_depth - depth)
                     break            
         else:
             if not depth or not ml:
+                if stats is not None:
+                    stats.leaves += 1
                 return best_move, self.score(game, game.inactive_player) 
-            value, move = self.__retrieve(game)
-            if value:
-                return move, value            
             best_move = random.choice(ml)
             v = float("inf")        
             for m in ml:
-                _, x = self.__ab(game.forecast_move(m), depth - 1, alpha, beta)
+                child_keys = self.__child_keys(game, keys, m)
+                game.apply_move(m)
+                try:
+                    _, x = self.__ab(game, depth - 1, alpha, beta, child_keys)
+                finally:
+                    game.undo_move()
                 if x < v:
                     v = x
                     best_move = m
@@ -181,118 +357,40 @@ class CustomPlayer:
                     beta = v
                     best_move = m
                 if beta <= alpha:
+                    if stats is not None:
+                        stats.cutoff(self._root_depth - depth)
                     break
-        self.__update(game, v, best_move)
+        if v <= alpha_orig:
+            bound = UPPER
+        elif v >= beta_orig:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.__update(game, key, symmetry, depth, v, bound, best_move)
         return best_move, v    
     
-    def __normalhash(self, game):
-        h = 0
-        for i in range(len(game._board_state) - 3):
-            h = h + 2 ^ i * game._board_state[i]
-        return (h, game._board_state[-1], game._board_state[-2])
-    
-    def __updownmirror(self, game):
-        h = 0
-        mirror = [0] * (len(game._board_state) - 3)
-        for i in range(len(game._board_state) - 3):
-            x = i % game.height
-            y = game.height - 1 - i // game.height
-            mirror[x + y * game.height] = 1            
-        for i in range(len(mirror)):
-            h = h + 2 ^ i * mirror[i]
-            
-        x = game._board_state[-1] % game.height
-        y = game.height - 1 - game._board_state[-1] // game.height
-        p1 = x + y * game.height
-        
-        x = game._board_state[-2] % game.height
-        y = game.height - 1 - game._board_state[-2] // game.height
-        p2 = x + y * game.height        
-        
-        return (h, p1, p2)   
-
-    def __leftrightmirror(self, game):
-        h = 0
-        mirror = [0] * (len(game._board_state) - 3)
-        for i in range(len(game._board_state) - 3):
-            x = game.width - 1 - i % game.height
-            y = i // game.height
-            mirror[x + y * game.height] = 1            
-        for i in range(len(mirror)):
-            h = h + 2 ^ i * mirror[i]   
-            
-        x = game.width - 1 - game._board_state[-1] % game.height
-        y = game._board_state[-1] // game.height
-        p1 = x + y * game.height
-        
-        x = game.width - 1 - game._board_state[-2] % game.height
-        y = game._board_state[-2] // game.height
-        p2 = x + y * game.height
-            
-        return (h, p1, p2)  
-
-    def __diagonalmirror(self, game):  
-        h = 0
-        mirror = [0] * (len(game._board_state) - 3)
-        for i in range(len(game._board_state) - 3):
-            x = i // game.height
-            y = i % game.height
-            mirror[x + y * game.height] = 1 
-        for i in range(len(mirror)):
-            h = h + 2 ^ i * mirror[i]
-            
-        x = game._board_state[-1] // game.height
-        y = game._board_state[-1] % game.height
-        p1 = x + y * game.height
-        
-        x = game._board_state[-2] // game.height
-        y = game._board_state[-2] % game.height
-        p2 = x + y * game.height            
-            
-        return (h, p1, p2)  
-
-    def __reversediagmirror(self, game):  
-        h = 0
-        mirror = [0] * (len(game._board_state) - 3)
-        for i in range(len(game._board_state) - 3):
-            x = game.height - 1 - i // game.height
-            y = game.width - 1 - i % game.height
-            mirror[x + y * game.height] = 1 
-        for i in range(len(mirror)):
-            h = h + 2 ^ i * mirror[i]
-            
-        x = game.height - 1 - game._board_state[-1] // game.height
-        y = game.width - 1 - game._board_state[-1] % game.height
-        p1 = x + y * game.height
-        
-        x = game.height - 1 - game._board_state[-2] // game.height
-        y = game.width - 1 - game._board_state[-2] % game.height
-        p2 = x + y * game.height   
-            
-        return (h, p1, p2)  
-    
-    def __retrieve(self, game):
-        #in mirrortable, {normalhash, value}
-        if game._board_state[-1] == None or game._board_state[-2] == None \
-                or game._board_state[:-3].count(1) > 3:
-            return [False, None]
-        ha = [self.__normalhash(game), self.__updownmirror(game),
-              self.__leftrightmirror(game), self.__diagonalmirror(game),
-              self.__reversediagmirror(game)]
-        for i in range(len(ha)):
-            if ha[i] in self.mirrortable.keys():                
-                return self.mirrortable[ha[i]]        
-        return [False, None] 
-         
-    def __update(self, game, value, move):
-        if game._board_state[-1] == None or game._board_state[-2] == None \
-            or game._board_state[:-3].count(1) > 3:
-            return
-        ha = [self.__normalhash(game), self.__updownmirror(game),
-              self.__leftrightmirror(game), self.__diagonalmirror(game),
-              self.__reversediagmirror(game)]
-        for i in range(len(ha)):
-            if ha[i] in self.mirrortable.keys(): 
-                self.mirrortable[ha[i]] = [value, move]
-                return
-        self.mirrortable[self.__normalhash(game)] = [value, move]      
\ No newline at end of file
+    def __retrieve(self, game, key, symmetry):
+        """Return the cached (depth, value, bound, move) of the position or of
+        one of its images under the board symmetries, with the move mapped
+        back to the orientation of `game`, or None.
+
+        `key` is the canonical key of the position and `symmetry` the index
+        of the symmetry that maps the position to it.
+        """
+        stats = self._stats
+        if stats is not None:
+            stats.cache_probes += 1
+        entry = self.mirrortable.probe(key ^ self._seat)
+        if entry is None:
+            return None
+        if stats is not None:
+            stats.cache_hits += 1
+        r, c = entry[3]
+        idx = self._symmetry.inverse[symmetry][r + c * game.height]
+        return entry[:3] + (game._geometry.cells[idx],)
+
+    def __update(self, game, key, symmetry, depth, value, bound, move):
+        #the move is stored in the orientation of the canonical position
+        image = game._geometry.symmetries[symmetry]
+        move = game._geometry.cells[image[move[0] + move[1] * game.height]]
+        self.mirrortable.store(key ^ self._seat, depth, value, bound, move)
@@ -0,0 +1,465 @@
+"""Searches that run concurrently with an agent's own search.
+
+They rely on standard library modules that the project sandbox does not
+allow in `game_agent.py` (see the README), so they live in this module and
+are handed to the agents as options:
+
+    from concurrent_search import Ponderer
+    from game_agent import AlphaBetaPlayer, TranspositionTable
+
+    player = AlphaBetaPlayer(tt=TranspositionTable(), ponder=Ponderer())
+"""
+import multiprocessing
+import struct
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from game_agent import AlphaBetaPlayer, SearchTimeout, TranspositionTable
+
+
+class Ponderer:
+    """Search on the opponent's time.
+
+    When a player returns its move it hands the ponderer a copy of the board
+    with its move (and, if it can predict it, the opponent's reply) applied.
+    The ponderer searches that position in a background thread until the
+    player's next call to `get_move()` stops it. If the opponent played the
+    predicted reply, the result of the deepest completed iteration is handed
+    back so that iterative deepening resumes from there; otherwise the work
+    is only kept in the player's transposition table, if it has one.
+
+    The thread is started once and then waits for work between moves. It
+    gives up the interpreter lock at every node it searches, so pondering
+    only uses the time the process would otherwise spend idle and does not
+    slow down the player's own search, nor an opponent searching in the same
+    process.
+
+    Parameters
+    ----------
+    max_time : float (optional)
+        Milliseconds after which pondering stops on its own, so that a search
+        left running at the end of a game does not go on forever.
+    """
+
+    def __init__(self, max_time=1000.):
+        self.max_time = max_time
+        self.board = None
+        self.result = None
+        self.hits = 0
+        self.misses = 0
+        self._search = None
+        self._deadline = 0.
+        self._stop = threading.Event()
+        self._ready = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = None
+
+    def time_left(self):
+        """Timer for the background search: the milliseconds left before
+        `max_time` runs out, or -inf once `stop()` has been called.
+        """
+        # yield the interpreter lock to any thread waiting for it
+        time.sleep(0)
+        if self._stop.is_set():
+            return float("-inf")
+        return self._deadline - 1000 * time.perf_counter()
+
+    def start(self, board, search):
+        """Run `search(board, self)` in the background thread. The search
+        calls `record()` after each completed iteration and uses `time_left()`
+        as its timer; the position pondered is `board` as it stands when the
+        search returns.
+        """
+        self.stop()
+        self.board = board
+        self.result = None
+        self._search = search
+        self._deadline = 1000 * time.perf_counter() + self.max_time
+        self._stop.clear()
+        self._idle.clear()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self.__run)
+            self._thread.daemon = True
+            self._thread.start()
+        self._ready.set()
+
+    def record(self, depth, move, score):
+        """Record the result of an iteration of the background search. """
+        self.result = (depth, move, score)
+
+    def stop(self, game=None):
+        """Stop the background search and wait for it to return.
+
+        Returns the (depth, move, score) recorded by the search if `game` is
+        the position that was pondered, else None.
+        """
+        self._stop.set()
+        self._idle.wait()
+        board, self.board = self.board, None
+        if game is None or board is None:
+            return None
+        if game != board:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.result
+
+    def __run(self):
+        while True:
+            self._ready.wait()
+            self._ready.clear()
+            try:
+                self._search(self.board, self)
+            except SearchTimeout:
+                pass
+            finally:
+                self._idle.set()
+
+
+class SharedTranspositionTable:
+    """TranspositionTable stored in a block of shared memory, so that several
+    processes can read and write the same table while they search (e.g., the
+    workers of a `ParallelSearch`).
+
+    It has the interface of TranspositionTable. Each slot holds three 64-bit
+    words: the value, a word packing the depth, bound, move and generation,
+    and a check word equal to the position key XOR the other two. There are
+    no locks: a reader that sees a slot while another process is writing it
+    finds that the check word does not match, and treats the slot as empty.
+    The generation counter is kept in the header of the block, so
+    `new_search()` ages the entries for every process; the probe counters are
+    local to each process.
+
+    A pickled table attaches to the same block instead of copying it, so it
+    can be passed to worker processes. The process that created the table
+    should call `unlink()` once every process is done with it; the processes
+    that attach never destroy the block, even when they exit first.
+
+    Parameters
+    ----------
+    size : int (optional)
+        Number of entries in the table; rounded up to a power of two.
+
+    policy : str (optional)
+        Replacement policy, as for TranspositionTable.
+
+    name : str (optional)
+        Name of the shared memory block of an existing table to attach to;
+        when None, a new block is created.
+    """
+    _WORD = struct.Struct("<Q")
+    _DOUBLE = struct.Struct("<d")
+
+    def __init__(self, size=2 ** 16, policy="depth", name=None):
+        if policy not in TranspositionTable.POLICIES:
+            raise ValueError("Unknown replacement policy: {}".format(policy))
+        self.size = 2
+        while self.size < size:
+            self.size <<= 1
+        self.policy = policy
+        self._mask = self.size - 1
+        if policy == "two-tier":
+            self._mask &= ~1
+        if name is None:
+            self._shm = shared_memory.SharedMemory(
+                create=True, size=8 * (1 + 3 * self.size))
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            # only the creating process unlinks the block: a process that
+            # attaches must not leave it to its resource tracker, which
+            # would destroy it when the process exits
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        self.name = self._shm.name
+        self._words = self._shm.buf.cast("Q")
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def __reduce__(self):
+        return (SharedTranspositionTable, (self.size, self.policy, self.name))
+
+    @property
+    def generation(self):
+        return self._words[0]
+
+    def new_search(self):
+        """Start a new generation; call once per move searched. """
+        self._words[0] = (self._words[0] + 1) & 0xffffff
+
+    def clear(self):
+        """Remove every entry and reset this process's hit counters. """
+        self._shm.buf[8:8 * (1 + 3 * self.size)] = bytes(24 * self.size)
+        self.probes = self.hits = self.stores = 0
+
+    def hit_rate(self):
+        """Return the fraction of probes that found a matching entry. """
+        return self.hits / self.probes if self.probes else 0.
+
+    def close(self):
+        """Detach this process from the shared memory block. """
+        self._words.release()
+        self._shm.close()
+
+    def unlink(self):
+        """Detach from and destroy the shared memory block. """
+        self.close()
+        # a process that attached may have unregistered the block from the
+        # resource tracker it shares with this one (e.g., a forked worker)
+        resource_tracker.register(self._shm._name, "shared_memory")
+        self._shm.unlink()
+
+    def probe(self, key):
+        """Return the (depth, value, bound, move) stored for a position key,
+        or None if the position is not in the table.
+        """
+        self.probes += 1
+        idx = key & self._mask
+        entry = self.__read(idx, key)
+        if entry is None and self.policy == "two-tier":
+            entry = self.__read(idx + 1, key)
+        if entry is None:
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, value, bound, move):
+        """Record the result of searching a position to `depth` plies. """
+        idx = key & self._mask
+        words = self._words
+        if self.policy != "always" and not self.__replaceable(idx, key, depth):
+            if self.policy == "depth":
+                return
+            idx += 1
+        elif self.policy == "two-tier" and not self.__matches(idx, key):
+            # demote the entry evicted from the depth-preferred slot
+            base = 1 + 3 * idx
+            words[base + 3:base + 6] = words[base:base + 3]
+        self.stores += 1
+        if move is None or move == (-1, -1):
+            code = 0
+        else:
+            code = (move[0] + 1) << 8 | (move[1] + 1)
+        # the depth is stored plus one so that an empty slot reads as zero
+        meta = (depth + 1) | bound << 16 | code << 24 | self.generation << 40
+        bits = self._WORD.unpack(self._DOUBLE.pack(value))[0]
+        base = 1 + 3 * idx
+        words[base + 1] = meta
+        words[base + 2] = bits
+        words[base] = key ^ meta ^ bits
+
+    def __matches(self, idx, key):
+        base = 1 + 3 * idx
+        words = self._words
+        meta = words[base + 1]
+        return meta and words[base] ^ meta ^ words[base + 2] == key
+
+    def __read(self, idx, key):
+        base = 1 + 3 * idx
+        words = self._words
+        check, meta, bits = words[base], words[base + 1], words[base + 2]
+        if not meta or check ^ meta ^ bits != key:
+            return None
+        code = (meta >> 24) & 0xffff
+        move = ((code >> 8) - 1, (code & 0xff) - 1) if code else None
+        value = self._DOUBLE.unpack(self._WORD.pack(bits))[0]
+        return (meta & 0xffff) - 1, value, (meta >> 16) & 0xff, move
+
+    def __replaceable(self, idx, key, depth):
+        meta = self._words[1 + 3 * idx + 1]
+        return (not meta or self.__matches(idx, key) or
+                meta >> 40 != self.generation or depth >= (meta & 0xffff) - 1)
+
+
+# State of a ParallelSearch pool worker: the shared [generation, alpha]
+# array and a [searcher, last generation, last epoch] list per (score
+# function, options)
+_worker_shared = None
+_worker_players = {}
+
+
+def _init_worker(shared):
+    global _worker_shared
+    _worker_shared = shared
+
+
+def _search_root_move(task):
+    """Pool task of ParallelSearch: search one root move and return
+    (value, alpha, nodes), or None if the deadline passed first.
+    """
+    board, move, depth, deadline, generation, epoch, score_fn, options = task
+    entry = _worker_players.get((score_fn, options))
+    if entry is None:
+        ordering, pvs, tt_spec = options
+        if tt_spec is None:
+            tt = None
+        elif tt_spec[2] is None:
+            tt = TranspositionTable(tt_spec[0], tt_spec[1])
+        else:
+            tt = SharedTranspositionTable(*tt_spec)
+        entry = [AlphaBetaPlayer(score_fn=score_fn, timeout=0., tt=tt,
+                                 ordering=ordering, pvs=pvs), None, epoch]
+        _worker_players[score_fn, options] = entry
+    player = entry[0]
+    # a shared table is aged and cleared by the player that owns it
+    if isinstance(player.tt, TranspositionTable):
+        if entry[2] != epoch:
+            player.tt.clear()
+        elif entry[1] != generation:
+            player.tt.new_search()
+    entry[1], entry[2] = generation, epoch
+    if board.active_player == 1:
+        board = board.replace_players(player, 2)
+    else:
+        board = board.replace_players(1, player)
+    player.time_left = lambda: 1000 * (deadline - time.monotonic())
+    player.nodes = 0
+
+    shared = _worker_shared
+    with shared.get_lock():
+        alpha = shared[1] if shared[0] == generation else float("-inf")
+    try:
+        value = player.move_value(board, move, depth, alpha)
+    except SearchTimeout:
+        return None
+    with shared.get_lock():
+        if shared[0] == generation and value > shared[1]:
+            shared[1] = value
+    return value, alpha, player.nodes
+
+
+class ParallelSearch:
+    """Root-split parallel search for AlphaBetaPlayer.
+
+    Each iteration hands the root moves to a pool of worker processes, best
+    move of the previous iteration first. A worker searches its move with the
+    best value any worker has found so far in the iteration as its alpha
+    bound, read from shared memory when the move starts, so once a good move
+    is known the others are mostly refuted by cutoffs. Workers rebuild the
+    board from a pickled copy, search it with their own AlphaBetaPlayer and
+    give up at the same deadline as the player, derived from `time_left` and
+    the player's timer threshold. If the player has a transposition table,
+    each worker has one of the same size, except that a
+    SharedTranspositionTable is shared by the player and all the workers.
+
+    The pool is started once, when the object is built, and runs until
+    `close()`. The player's score function is pickled to reach the workers,
+    so it must be a module-level function.
+
+    Parameters
+    ----------
+    processes : int (optional)
+        Number of worker processes; defaults to the number of CPUs.
+
+    min_depth : int (optional)
+        Iterations shallower than this are searched serially, since
+        dispatching the root moves would cost more than the search itself.
+    """
+
+    def __init__(self, processes=None, min_depth=2):
+        self.min_depth = min_depth
+        self._shared = multiprocessing.Array("d", [0., float("-inf")])
+        self._pool = multiprocessing.Pool(processes, _init_worker,
+                                          (self._shared,))
+        self._generation = 0
+        self._epoch = 0
+        self._root = None
+        self._values = {}
+
+    def clear(self):
+        """Forget the results of earlier searches: the root move order and
+        the workers' own transposition tables, which are cleared before their
+        next search.
+        """
+        self._epoch += 1
+        self._root = None
+        self._values = {}
+
+    def close(self):
+        """Stop the worker processes. """
+        self._pool.terminate()
+        self._pool.join()
+
+    def search(self, player, game, depth, time_left):
+        """Search `game`, where `player` is to move and has legal moves, to
+        `depth` plies and return the best (move, value).
+
+        Raises SearchTimeout if the deadline passes before every root move
+        has been searched.
+        """
+        deadline = time.monotonic() + (time_left() - player.TIMER_THRESHOLD) / 1000.
+        moves = game.get_legal_moves()
+        if game.hash() != self._root:
+            self._root, self._values = game.hash(), {}
+        previous = self._values
+        moves.sort(key=lambda m: previous.get(m, float("-inf")), reverse=True)
+
+        self._generation += 1
+        with self._shared.get_lock():
+            self._shared[0] = self._generation
+            self._shared[1] = float("-inf")
+        board = game.replace_players(1, 2)
+        tt = player.tt
+        if tt is None:
+            tt_spec = None
+        else:
+            tt_spec = (tt.size, tt.policy, getattr(tt, "name", None))
+        options = (player.ordering, player.pvs, tt_spec)
+        results = [self._pool.apply_async(_search_root_move, ((
+            board, m, depth, deadline, self._generation, self._epoch,
+            player.score, options),)) for m in moves]
+
+        stats = player._stats
+        best_move, best = (-1, -1), None
+        values = {}
+        for move, result in zip(moves, results):
+            try:
+                outcome = result.get(max(0., deadline - time.monotonic()))
+            except multiprocessing.TimeoutError:
+                outcome = None
+            if outcome is None:
+                raise SearchTimeout()
+            value, alpha, nodes = outcome
+            player.nodes += nodes
+            if stats is not None:
+                stats.nodes += nodes
+            # values at or below the alpha bound are only upper bounds, so
+            # on a tie the exact value wins
+            rank = (value, value > alpha)
+            if best is None or rank > best:
+                best_move, best = move, rank
+            values[move] = value
+        self._values = values
+        return best_move, best[0]
+
+    def speedup(self, player, game, depth):
+        """Time the serial `alphabeta()` search of `player` and this search on
+        `game` at the same depth. Both runs start cold: the transposition
+        tables and move ordering statistics are cleared before each.
+
+        Returns
+        -------
+        (float, float, float, int, int)
+            The serial and parallel times in milliseconds, the speedup and
+            the nodes searched by each run.
+        """
+        time_left = player.time_left
+        player.time_left = lambda: 1e9
+        runs = []
+        try:
+            for search in (lambda: player.alphabeta(game.copy(), depth),
+                           lambda: self.search(player, game, depth,
+                                               player.time_left)):
+                player.reset()
+                self.clear()
+                player.nodes = 0
+                start = time.perf_counter()
+                search()
+                runs.append((1000 * (time.perf_counter() - start),
+                             player.nodes))
+        finally:
+            player.time_left = time_left
+        (serial, serial_nodes), (parallel, parallel_nodes) = runs
+        return (serial, parallel, serial / parallel, serial_nodes,
+                parallel_nodes)
@@ -2,10 +2,14 @@
 test your agent's strength against a set of known agents using tournament.py
 and include the results in your report.
 """
+import heapq
 import random
+from array import array
 from math import *
 
 ITER_NUM = 10000
+NULL_WINDOW = 1e-6  # width of the zero window used by principal variation search
+REROOT_MS_PER_NODE = 0.002  # assumed cost of NodePool.reroot until one is timed
 
 class SearchTimeout(Exception):
     """Subclass base exception for code clarity. """
@@ -32,29 +36,227 @@ def movecount(m, game):
                    if game.move_is_legal((r + dr, c + dc))])
 
 class Node:
-    def __init__(self, game, parent = None):
+    #nodes do not point to their parent, so that a subtree that is no longer
+    #reachable is freed by reference counting rather than by the cyclic
+    #garbage collector; `size` counts the nodes of the subtree
+    def __init__(self, game):
         self.move = game.get_player_location(game.inactive_player)
-        self.parent = parent
+        self.player = game.inactive_player
         self.wincount = 0.
         self.visitcount = 0
+        self.size = 1
         self.child = []
         self.notvisit = game.get_legal_moves()
         
     def selectchild(self):
-        #use UCB1, apply a constant UCTK.
-        return sorted(self.child, key = lambda n: n.wincount / n.visitcount 
-                      + sqrt(2 * log(self.visitcount) / n.visitcount))[-1]
-        
+        #use UCB1, apply a constant UCTK. max() over the reversed list keeps
+        #the last of equal children, as sorting did
+        return max(reversed(self.child), key = lambda n: n.wincount / n.visitcount 
+                   + sqrt(2 * log(self.visitcount) / n.visitcount))
+
     def addchild(self, game):
-        n = Node(game, self)
+        n = Node(game)
         self.notvisit.remove(game.get_player_location(game.inactive_player))
         self.child.append(n)
         return n
     
-    def updatevalue(self, v):
-        self.visitcount = self.visitcount + 1
+    def updatevalue(self, v, n = 1):
+        self.visitcount = self.visitcount + n
         self.wincount = self.wincount + v
 
+class NodePool:
+    """Preallocated structure-of-arrays store for the search trees of
+    `MCTSPlayer`, as a lighter alternative to `Node` objects.
+
+    Node i is described by `visits[i]`, `wins[i]` (counted for the player who
+    made the move leading to it), `parent[i]` and `move[i]` (the cell index
+    of that move, as in `isolation.Board`). Its children are stored
+    contiguously, `count[i]` nodes from `first[i]`; `first[i]` is -1 until
+    the node is expanded. Node 0 is the root. `amaf_visits[i]` and
+    `amaf_wins[i]` are the all-moves-as-first statistics of `move[i]`: the
+    playouts through the parent in which the same player occupied that cell
+    at any later point, and how many of them it won.
+
+    The pool never holds more than `capacity` nodes: `expand()` fails when it
+    is full, and `reroot()` compacts the tree, dropping the children of its
+    least visited nodes when the tree does not fit in the given limit.
+
+    Parameters
+    ----------
+    capacity : int (optional)
+        Maximum number of nodes.
+    """
+
+    def __init__(self, capacity=2 ** 18):
+        self.capacity = capacity
+        self.visits = array("l", [0]) * capacity
+        self.wins = array("d", [0.]) * capacity
+        self.parent = array("l", [-1]) * capacity
+        self.first = array("l", [-1]) * capacity
+        self.count = array("H", [0]) * capacity
+        self.move = array("h", [-1]) * capacity
+        self.amaf_visits = array("l", [0]) * capacity
+        self.amaf_wins = array("d", [0.]) * capacity
+        self.reset()
+
+    def reset(self):
+        """Discard every node and create a new root. """
+        self.size = 1
+        self.__init_node(0, -1, -1)
+
+    def __init_node(self, node, parent, move):
+        self.visits[node] = 0
+        self.wins[node] = 0.
+        self.parent[node] = parent
+        self.first[node] = -1
+        self.count[node] = 0
+        self.move[node] = move
+        self.amaf_visits[node] = 0
+        self.amaf_wins[node] = 0.
+
+    def expand(self, node, moves):
+        """Add a child of `node` for each cell index in `moves`. Returns False,
+        leaving the node unexpanded, if the pool has no room for them.
+        """
+        start = self.size
+        if start + len(moves) > self.capacity:
+            return False
+        for child, move in enumerate(moves, start):
+            self.__init_node(child, node, move)
+        self.first[node] = start
+        self.count[node] = len(moves)
+        self.size = start + len(moves)
+        return True
+
+    def select(self, node, rave=None):
+        """Return the child of an expanded node with the highest UCB1 value,
+        or its first unvisited child.
+
+        With `rave`, the equivalence parameter k of RAVE, the value of each
+        child is blended with its AMAF value, weighted by
+        beta = sqrt(k / (3 n + k)) for a child visited n times, and the
+        unvisited child with the best AMAF value is returned first.
+        """
+        visits, wins = self.visits, self.wins
+        amaf_visits, amaf_wins = self.amaf_visits, self.amaf_wins
+        first = self.first[node]
+        children = range(first, first + self.count[node])
+        if rave is not None:
+            unvisited = [child for child in children if not visits[child]]
+            if unvisited:
+                return max(unvisited, key=lambda child: (
+                    amaf_wins[child] / amaf_visits[child]
+                    if amaf_visits[child] else 0.5))
+        log_n = 2 * log(visits[node])
+        best, best_value = first, -1.
+        for child in children:
+            n = visits[child]
+            if not n:
+                return child
+            value = wins[child] / n
+            if rave is not None and amaf_visits[child]:
+                beta = sqrt(rave / (3 * n + rave))
+                value = ((1 - beta) * value +
+                         beta * amaf_wins[child] / amaf_visits[child])
+            value += sqrt(log_n / n)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+    def backpropagate(self, node, value, playouts=1, amaf=None):
+        """Count playouts through `node` and its ancestors; `value` is the
+        number of them won by the player who moved to `node`.
+
+        `amaf` is an optional pair of {cell index: (wins, playouts)} dicts,
+        for the cells occupied during the playouts by the player who moved
+        to `node` and by its opponent. The AMAF statistics of the children of
+        `node` and of its ancestors are then updated with the cells occupied
+        after them by the player choosing among them; the dicts are extended
+        with the moves of the path.
+        """
+        visits, wins, parent = self.visits, self.wins, self.parent
+        if amaf is not None:
+            own, other = amaf
+        while node >= 0:
+            visits[node] += playouts
+            wins[node] += value
+            if amaf is not None:
+                self.__update_amaf(node, other)
+                if parent[node] >= 0:
+                    own[self.move[node]] = (value, playouts)
+                own, other = other, own
+            value = playouts - value
+            node = parent[node]
+
+    def __update_amaf(self, node, later):
+        first = self.first[node]
+        if first < 0:
+            return
+        for child in range(first, first + self.count[node]):
+            seen = later.get(self.move[child])
+            if seen:
+                self.amaf_wins[child] += seen[0]
+                self.amaf_visits[child] += seen[1]
+
+    def find_child(self, node, move):
+        """Return the child of `node` reached by a cell index, or -1. """
+        first = self.first[node]
+        for child in range(first, first + self.count[node]):
+            if self.move[child] == move:
+                return child
+        return -1
+
+    def best_child(self, node):
+        """Return the most visited child of `node`, or -1 if it has none. """
+        first = self.first[node]
+        if first < 0 or not self.count[node]:
+            return -1
+        visits = self.visits
+        return max(range(first, first + self.count[node]),
+                   key=lambda child: visits[child])
+
+    def reroot(self, node, limit=None):
+        """Make `node` the root, discarding every node outside its subtree.
+
+        The subtree is copied to the front of the pool breadth-first by
+        decreasing visit count; once `limit` nodes (half the capacity by
+        default) have been copied, the remaining nodes are kept as
+        unexpanded leaves with their statistics, but without children.
+        """
+        if limit is None:
+            limit = self.capacity // 2
+        size = self.size
+        visits, wins = self.visits[:size], self.wins[:size]
+        first, count = self.first[:size], self.count[:size]
+        move = self.move[:size]
+        amaf_visits = self.amaf_visits[:size]
+        amaf_wins = self.amaf_wins[:size]
+
+        self.size = 1
+        self.__init_node(0, -1, move[node])
+        self.visits[0] = visits[node]
+        self.wins[0] = wins[node]
+        heap = [(-visits[node], node, 0)] if first[node] >= 0 else []
+        while heap:
+            _, old, new = heapq.heappop(heap)
+            k = count[old]
+            start = self.size
+            if start + k > limit:
+                continue
+            for j in range(k):
+                child = start + j
+                self.__init_node(child, new, move[first[old] + j])
+                self.visits[child] = visits[first[old] + j]
+                self.wins[child] = wins[first[old] + j]
+                self.amaf_visits[child] = amaf_visits[first[old] + j]
+                self.amaf_wins[child] = amaf_wins[first[old] + j]
+                if first[first[old] + j] >= 0:
+                    heapq.heappush(heap, (-visits[child], first[old] + j,
+                                          child))
+            self.first[new] = start
+            self.count[new] = k
+            self.size = start + k
+
 def mctsucb1(player, game, iternum = 100):
     rn = Node(game)
 
@@ -66,6 +268,7 @@ def mctsucb1(player, game, iternum = 100):
             raise SearchTimeout()
             
         n = rn
+        path = [n]
         g = game.copy()
         
         #select
@@ -74,11 +277,13 @@ def mctsucb1(player, game, iternum = 100):
                 raise SearchTimeout()
             n = n.selectchild()
             g.apply_move(n.move)
+            path.append(n)
             
         if n.notvisit:
             m = random.choice(n.notvisit)
             g.apply_move(m)
             n = n.addchild(g)
+            path.append(n)
         
         while g.get_legal_moves(): #random.choice(g.get_legal_moves()))
             if player.time_left() < player.TIMER_THRESHOLD:
@@ -88,11 +293,10 @@ def mctsucb1(player, game, iternum = 100):
         v = 0.
         if g.inactive_player == player:
             v = 1.
-        while n:
+        for n in reversed(path):
             if player.time_left() < player.TIMER_THRESHOLD:
                 raise SearchTimeout()            
             n.updatevalue(v)
-            n = n.parent
 
     return sorted(rn.child, key = lambda n: n.visitcount)[-1].visitcount
 
@@ -216,6 +420,435 @@ def custom_score_3(game, player):
     
     return float(own_moves - opp_moves + cornerpenalty(game, player))
 
+# Transposition table bound types: the stored value is exact, a lower bound
+# (the search failed high) or an upper bound (the search failed low)
+EXACT, LOWER, UPPER = 0, 1, 2
+
+class TranspositionTable:
+    """Fixed-size cache of search results keyed by the Zobrist hash of a
+    position (see `isolation.Board.hash()`).
+
+    Each slot holds the key plus a (depth, value, bound, move, generation)
+    record. The number of slots is fixed when the table is built, so its
+    memory use does not grow during a game. Records written during earlier
+    turns (older generations) are always replaceable, which ages out stale
+    results across calls to `new_search()`.
+
+    Parameters
+    ----------
+    size : int (optional)
+        Number of entries in the table; rounded up to a power of two.
+
+    policy : str (optional)
+        Replacement policy when two positions share a slot:
+        "depth" keeps the result of the deeper search, "always" keeps the
+        most recent result, and "two-tier" uses buckets of two slots -- one
+        depth-preferred and one always-replace.
+    """
+    POLICIES = ("depth", "always", "two-tier")
+
+    def __init__(self, size=2 ** 16, policy="depth"):
+        if policy not in TranspositionTable.POLICIES:
+            raise ValueError("Unknown replacement policy: {}".format(policy))
+        self.size = 2
+        while self.size < size:
+            self.size <<= 1
+        self.policy = policy
+        self.generation = 0
+        self._mask = self.size - 1
+        if policy == "two-tier":
+            self._mask &= ~1
+        self._keys = [None] * self.size
+        self._entries = [None] * self.size
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+
+    def new_search(self):
+        """Start a new generation; call once per move searched. """
+        self.generation += 1
+
+    def clear(self):
+        """Remove every entry and reset the hit counters. """
+        self._keys = [None] * self.size
+        self._entries = [None] * self.size
+        self.probes = self.hits = self.stores = 0
+
+    def hit_rate(self):
+        """Return the fraction of probes that found a matching entry. """
+        return self.hits / self.probes if self.probes else 0.
+
+    def probe(self, key):
+        """Return the (depth, value, bound, move) stored for a position key,
+        or None if the position is not in the table.
+        """
+        self.probes += 1
+        idx = key & self._mask
+        if self._keys[idx] != key and self.policy == "two-tier":
+            idx += 1
+        if self._keys[idx] != key:
+            return None
+        self.hits += 1
+        return self._entries[idx][:4]
+
+    def store(self, key, depth, value, bound, move):
+        """Record the result of searching a position to `depth` plies. """
+        idx = key & self._mask
+        if self.policy != "always" and not self.__replaceable(idx, key, depth):
+            if self.policy == "depth":
+                return
+            idx += 1
+        elif self.policy == "two-tier" and self._keys[idx] != key:
+            # demote the entry evicted from the depth-preferred slot
+            self._keys[idx + 1] = self._keys[idx]
+            self._entries[idx + 1] = self._entries[idx]
+        self.stores += 1
+        self._keys[idx] = key
+        self._entries[idx] = (depth, value, bound, move, self.generation)
+
+    def __replaceable(self, idx, key, depth):
+        entry = self._entries[idx]
+        return (entry is None or self._keys[idx] == key or
+                entry[4] != self.generation or depth >= entry[0])
+
+class TimeManager:
+    """Budget the time of an iterative-deepening search.
+
+    The manager replaces the clock check at every node with a node countdown:
+    the clock is read once every `interval` nodes, and the interval is
+    recalibrated at each reading so that the time between two readings stays
+    below `check_fraction` of the timer threshold. It also records the node
+    count and duration of every completed iteration, declines to start an
+    iteration that the effective branching factor predicts will not finish,
+    and can stop early once the best move has been stable for a number of
+    iterations.
+
+    Parameters
+    ----------
+    check_fraction : float (optional)
+        Fraction of the timer threshold allowed to elapse between two clock
+        readings.
+
+    stable_iterations : int (optional)
+        Stop the search after the best move has been unchanged for this many
+        consecutive iterations. None disables early stopping.
+
+    max_interval : int (optional)
+        Upper bound on the number of nodes between two clock readings.
+    """
+
+    def __init__(self, check_fraction=0.25, stable_iterations=None,
+                 max_interval=4096):
+        self.check_fraction = check_fraction
+        self.stable_iterations = stable_iterations
+        self.max_interval = max_interval
+        self.threshold = 0.
+        self.interval = 1
+        self.countdown = 1
+        self.iterations = []
+        self._window = 1
+        self._polled = 0
+        self._last_poll = 0.
+        self._iteration_start = 0.
+        self._iteration_nodes = 0
+        self._best_move = None
+        self._stable = 0
+
+    def start(self, time_left, threshold):
+        """Begin timing the search for a new move.
+
+        Parameters
+        ----------
+        time_left : callable
+            A function that returns the number of milliseconds left in the
+            current turn.
+
+        threshold : float
+            Time remaining (in milliseconds) when search is aborted.
+        """
+        self.threshold = threshold
+        self.iterations = []
+        self._window = self.countdown = self.interval
+        self._polled = 0
+        self._last_poll = self._iteration_start = time_left()
+        self._iteration_nodes = 0
+        self._best_move = None
+        self._stable = 0
+
+    def nodes(self):
+        """Return the number of nodes counted since `start()`. """
+        return self._polled + self._window - self.countdown
+
+    def poll(self, time_left):
+        """Read the clock, raise SearchTimeout if the remaining time is below
+        the threshold and recalibrate the number of nodes until the next read.
+        Searches call this when `countdown` reaches zero.
+        """
+        remaining = time_left()
+        if remaining < self.threshold:
+            raise SearchTimeout()
+        elapsed = self._last_poll - remaining
+        budget = self.check_fraction * self.threshold
+        if elapsed > 0:
+            interval = int(self._window * budget / elapsed)
+        else:
+            interval = self.max_interval
+        self.interval = max(1, min(interval, 2 * self._window, self.max_interval))
+        self._polled += self._window
+        self._last_poll = remaining
+        self._window = self.countdown = self.interval
+
+    def branching_factor(self):
+        """Return the effective branching factor between the last two
+        completed iterations, or None before two iterations have completed.
+        """
+        if len(self.iterations) < 2 or not self.iterations[-2][1]:
+            return None
+        return self.iterations[-1][1] / self.iterations[-2][1]
+
+    def should_start(self, time_left):
+        """Return False if the next iteration is predicted to run past the
+        timer threshold, given the duration of the last iteration and the
+        effective branching factor.
+        """
+        ebf = self.branching_factor()
+        if ebf is None:
+            return True
+        predicted = self.iterations[-1][2] * max(ebf, 1.)
+        return predicted < time_left() - self.threshold
+
+    def end_iteration(self, time_left, depth, best_move):
+        """Record a completed iteration as a (depth, nodes, milliseconds)
+        tuple in `iterations`. Returns True if the best move has now been
+        stable for `stable_iterations` iterations and the search can stop.
+        """
+        now = time_left()
+        nodes = self.nodes()
+        self.iterations.append((depth, nodes - self._iteration_nodes,
+                                self._iteration_start - now))
+        self._iteration_start = now
+        self._iteration_nodes = nodes
+        if best_move == self._best_move:
+            self._stable += 1
+        else:
+            self._best_move = best_move
+            self._stable = 0
+        return (self.stable_iterations is not None and
+                self._stable >= self.stable_iterations)
+
+class SearchStats:
+    """Opt-in record of what a search agent did on each move.
+
+    Agents update the counters while they search; `end_move()` then turns
+    them into a per-move record, available as `last` and appended to `moves`.
+    Each record is a dict with the keys:
+
+        move            the move returned
+        nodes           nodes visited
+        leaves          leaf (heuristic or terminal) evaluations
+        cutoffs         list of beta cutoffs indexed by ply
+        depth           deepest fully completed iteration (None if none)
+        iteration_ms    list of the duration of each completed iteration
+        elapsed_ms      time spent on the move
+        nps             nodes per second
+        cache_hit_rate  fraction of cache probes that hit (None if unused)
+        margin_ms       time left on the clock when the move was returned
+    """
+
+    def __init__(self):
+        self.moves = []
+        self.last = None
+        self.begin_move(lambda: 0.)
+
+    def begin_move(self, time_left):
+        """Reset the counters at the start of a call to get_move(). """
+        self.nodes = 0
+        self.leaves = 0
+        self.cutoffs = []
+        self.cache_probes = 0
+        self.cache_hits = 0
+        self.depth = None
+        self.iteration_ms = []
+        self.last = None
+        self._start = self._iteration_start = time_left()
+
+    def cutoff(self, ply):
+        """Count a beta cutoff at the given ply. """
+        while len(self.cutoffs) <= ply:
+            self.cutoffs.append(0)
+        self.cutoffs[ply] += 1
+
+    def end_iteration(self, time_left, depth):
+        """Record that an iteration to `depth` plies completed. """
+        now = time_left()
+        self.depth = depth
+        self.iteration_ms.append(self._iteration_start - now)
+        self._iteration_start = now
+
+    def end_move(self, time_left, move):
+        """Close the record for the current move and return it. """
+        margin = time_left()
+        elapsed = self._start - margin
+        self.last = {
+            "move": move,
+            "nodes": self.nodes,
+            "leaves": self.leaves,
+            "cutoffs": self.cutoffs,
+            "depth": self.depth,
+            "iteration_ms": self.iteration_ms,
+            "elapsed_ms": elapsed,
+            "nps": 1000. * self.nodes / elapsed if elapsed > 0 else 0.,
+            "cache_hit_rate": (self.cache_hits / self.cache_probes
+                               if self.cache_probes else None),
+            "margin_ms": margin,
+        }
+        self.moves.append(self.last)
+        return self.last
+
+def _flood(moves, start, free):
+    """Return the bitmask of cells in `free` reachable by knight moves from
+    any cell in the bitmask `start` (the start cells themselves excluded).
+    """
+    seen = 0
+    frontier = start
+    while frontier:
+        reached = 0
+        while frontier:
+            low = frontier & -frontier
+            reached |= moves[low.bit_length() - 1]
+            frontier ^= low
+        frontier = reached & free & ~seen
+        seen |= frontier
+    return seen
+
+def is_partitioned(game):
+    """Return True if the two players can no longer reach a common cell, so
+    that each one plays alone in its own region for the rest of the game.
+    """
+    p1, p2 = game._p1_loc, game._p2_loc
+    if p1 is None or p2 is None:
+        return False
+    geometry = game._geometry
+    free = geometry.full & ~game._blocked
+    own = _flood(geometry.moves, 1 << p1, free)
+    return not own & _flood(geometry.moves, 1 << p2, free)
+
+class EndgameSolver:
+    """Exact solver for positions where `is_partitioned()` is True.
+
+    Once the players are separated each one simply makes as many moves as it
+    can in its own region, and the player to move wins if and only if its
+    longest knight path is longer than the opponent's. The solver computes
+    longest paths by depth-first search, memoized on (cell, region bitmask)
+    and pruned by an upper bound on the path length: the number of cells in
+    the region, tightened by the fact that knight moves alternate between
+    light and dark cells. The memo is kept across calls, so once a region has
+    been solved the following moves are answered from the table.
+
+    Parameters
+    ----------
+    max_entries : int (optional)
+        The memo is cleared when it grows past this many entries.
+    """
+
+    def __init__(self, max_entries=2 ** 20):
+        self.max_entries = max_entries
+        self.memo = {}
+        self._colors = {}
+
+    def longest_path(self, game, player, check=None):
+        """Return the number of moves the player can still make, assuming
+        its region is not shared with the opponent.
+        """
+        geometry = game._geometry
+        idx = game._location_index(player)
+        region = _flood(geometry.moves, 1 << idx, geometry.full & ~game._blocked)
+        return self.__search(geometry, idx, region, check)
+
+    def best_move(self, game, check=None):
+        """Return the (move, length) pair that starts the longest path for
+        the active player, or ((-1, -1), 0) if it has no legal moves.
+
+        Parameters
+        ----------
+        check : callable (optional)
+            Called once per new node; may raise SearchTimeout to abort.
+        """
+        if len(self.memo) > self.max_entries:
+            self.memo.clear()
+        geometry = game._geometry
+        free = geometry.full & ~game._blocked
+        best_move, best_length = (-1, -1), 0
+        for move in game.get_legal_moves():
+            bit = 1 << (move[0] + move[1] * game.height)
+            region = _flood(geometry.moves, bit, free & ~bit)
+            length = 1 + self.__search(geometry, bit.bit_length() - 1,
+                                       region, check)
+            if length > best_length:
+                best_move, best_length = move, length
+        return best_move, best_length
+
+    def __search(self, geometry, idx, region, check):
+        key = (idx, region)
+        best = self.memo.get(key)
+        if best is not None:
+            return best
+        if check is not None:
+            check()
+
+        bound = self.__bound(geometry, idx, region)
+        options = []
+        bits = geometry.moves[idx] & region
+        while bits:
+            low = bits & -bits
+            bits ^= low
+            nxt = low.bit_length() - 1
+            options.append((bin(geometry.moves[nxt] & region).count("1"), nxt))
+
+        # Try the cells with the fewest onward moves first (Warnsdorff's
+        # rule), which finds long paths early so the bound stops the search
+        options.sort()
+        best = 0
+        for _, nxt in options:
+            if best >= bound:
+                break
+            rest = region & ~(1 << nxt)
+            length = 1 + self.__search(geometry, nxt,
+                                       _flood(geometry.moves, 1 << nxt, rest),
+                                       check)
+            if length > best:
+                best = length
+        self.memo[key] = best
+        return best
+
+    def __bound(self, geometry, idx, region):
+        # Each knight move changes the color of the cell, so a path from idx
+        # alternates between cells of the other color and cells of its own
+        colors = self._colors.get((geometry.width, geometry.height))
+        if colors is None:
+            colors = sum(1 << i for i, (r, c) in enumerate(geometry.cells)
+                         if (r + c) % 2)
+            self._colors[geometry.width, geometry.height] = colors
+        same_mask = colors if (colors >> idx) & 1 else geometry.full & ~colors
+        same = bin(region & same_mask).count("1")
+        other = bin(region).count("1") - same
+        bound = 2 * same + 1 if other > same else 2 * other
+
+        # A cell with a single neighbor can only end the path, so at most one
+        # of them is visited
+        dead_ends = 0
+        cells = region
+        area = region | (1 << idx)
+        while cells:
+            low = cells & -cells
+            cells ^= low
+            neighbors = geometry.moves[low.bit_length() - 1] & area
+            if not neighbors & (neighbors - 1):
+                dead_ends += 1
+        if dead_ends > 1:
+            bound = min(bound, other + same - dead_ends + 1)
+        return bound
+
 class IsolationPlayer:
     """Base class for minimax and alphabeta agents -- this class is never
     constructed or tested directly.
@@ -249,7 +882,17 @@ class MinimaxPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using depth-limited minimax
     search. You must finish and test this player to make sure it properly uses
     minimax to return a good move before the search time limit expires.
+
+    Parameters
+    ----------
+    stats : SearchStats (optional)
+        Collects per-move search statistics when given.
     """
+
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 stats=None):
+        super().__init__(search_depth, score_fn, timeout)
+        self.stats = stats
     
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -280,6 +923,9 @@ class MinimaxPlayer(IsolationPlayer):
             (-1, -1) if there are no available legal moves.
         """
         self.time_left = time_left
+        stats = self.stats
+        if stats is not None:
+            stats.begin_move(time_left)
 
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
@@ -288,14 +934,17 @@ class MinimaxPlayer(IsolationPlayer):
         try:
             # The try/except block will automatically catch the exception
             # raised when the timer is about to expire.
-            return self.minimax(game, self.search_depth)
+            best_move = self.minimax(game, self.search_depth)
+            if stats is not None:
+                stats.end_iteration(time_left, self.search_depth)
 
         except SearchTimeout:
             # Handle any actions required after timeout as needed
             if game.get_legal_moves():
-                return random.choice(game.get_legal_moves())
-            else:
-                return best_move
+                best_move = random.choice(game.get_legal_moves())
+
+        if stats is not None:
+            stats.end_move(time_left, best_move)
 
         # Return the best move from the last completed search iteration
         return best_move
@@ -347,7 +996,16 @@ class MinimaxPlayer(IsolationPlayer):
             return (-1, -1)
         
         return max(game.get_legal_moves(),
-                   key=lambda m: self.__min_value(game.forecast_move(m), depth - 1)) 
+                   key=lambda m: self.__child_value(game, m, self.__min_value, depth - 1))
+
+    def __child_value(self, game, move, value_fn, depth):
+        # Apply the move in-place and always revert it, so that the whole
+        # search shares a single board even when the search times out
+        game.apply_move(move)
+        try:
+            return value_fn(game, depth)
+        finally:
+            game.undo_move()
 
     def __terminal_test(self, game, depth):
         if depth > 0 and game.get_legal_moves(): #or reach the depth limit
@@ -356,35 +1014,136 @@ class MinimaxPlayer(IsolationPlayer):
 
     def __min_value(self, game, depth):
         if self.time_left() < self.TIMER_THRESHOLD:
-            raise SearchTimeout()  
-            
+            raise SearchTimeout()
+        stats = self.stats
+        if stats is not None:
+            stats.nodes += 1
+
         state = []
         if self.__terminal_test(game, depth):
+            if stats is not None:
+                stats.leaves += 1
             return self.score(game, self)
         
         for m in game.get_legal_moves():
-            gs = game.forecast_move(m)
-            state.append(self.__max_value(gs, depth - 1))       
+            state.append(self.__child_value(game, m, self.__max_value, depth - 1))
         return min(state)
     
     def __max_value(self, game, depth):
         if self.time_left() < self.TIMER_THRESHOLD:
-            raise SearchTimeout() 
-            
+            raise SearchTimeout()
+        stats = self.stats
+        if stats is not None:
+            stats.nodes += 1
+
         state = []
         if self.__terminal_test(game, depth):
+            if stats is not None:
+                stats.leaves += 1
             return self.score(game, self)
   
         for m in game.get_legal_moves():
-            gs = game.forecast_move(m)
-            state.append(self.__min_value(gs, depth - 1))
+            state.append(self.__child_value(game, m, self.__min_value, depth - 1))
         return max(state)
 
 class AlphaBetaPlayer(IsolationPlayer):
     """Game-playing agent that chooses a move using iterative deepening minimax
     search with alpha-beta pruning. You must finish and test this player to
     make sure it returns a good move before the search time limit expires.
-    """    
+
+    Parameters
+    ----------
+    tt : TranspositionTable (optional)
+        Cache of search results shared by every iteration and every turn of
+        this player. The search does not use a cache when None.
+
+    ordering : bool (optional)
+        Search the previous iteration's principal variation first, then the
+        killer moves of each ply, then the remaining moves by history score.
+        When False, moves are searched in the order `get_legal_moves()`
+        returns them. The `nodes` attribute counts the nodes searched either
+        way, so the two settings can be compared at a fixed depth.
+
+    pvs : bool (optional)
+        Use principal variation search: after the first move at each node,
+        the remaining moves are searched with a null window and re-searched
+        only if they fail high, with the window narrowed by the bound the
+        null-window search returned.
+
+    aspiration : sequence of float (optional)
+        Half-widths of the successive windows, centered on the previous
+        iteration's score, that each iteration of `get_move()` tries before
+        falling back to a full window (e.g., `(1., 4.)`). None disables
+        aspiration windows. A window that fails is searched again wider, so
+        the windows save nodes only with a `tt` that keeps the work of the
+        failed tries. The depth of the last completed iteration is kept
+        in `completed_depth` so that modes can be compared under the time
+        limit.
+
+    time_manager : TimeManager (optional)
+        Controls when iterative deepening stops and how often the clock is
+        read. When None, every node reads the clock and iterations continue
+        until the search times out.
+
+    stats : SearchStats (optional)
+        Collects per-move search statistics when given.
+
+    endgame : EndgameSolver (optional)
+        When given, positions where the players' regions are separated are
+        played by the exact longest-path solver instead of the search.
+
+    ponder : concurrent_search.Ponderer (optional)
+        When given, the player keeps searching while the opponent thinks: the
+        position after its move and the reply predicted by the principal
+        variation (or the transposition table) is pondered until the next
+        call to `get_move()`.
+
+    parallel : concurrent_search.ParallelSearch (optional)
+        When given, iterations from `parallel.min_depth` plies on split the
+        root moves across its worker processes.
+
+    book : opening_book.OpeningBook or solver.SolutionDatabase (optional)
+        When given, positions found in the book are answered with the book
+        move without searching. A solution database answers every position
+        of the board size it was solved for, so the player plays perfectly.
+    """
+
+    def __init__(self, search_depth=3, score_fn=custom_score, timeout=10.,
+                 tt=None, ordering=False, pvs=False, aspiration=None,
+                 time_manager=None, stats=None, endgame=None, ponder=None,
+                 parallel=None, book=None):
+        super().__init__(search_depth, score_fn, timeout)
+        self.tt = tt
+        self.time_manager = time_manager
+        self.stats = stats
+        self.endgame = endgame
+        self.ponder = ponder
+        self.parallel = parallel
+        self.book = book
+        self.ordering = ordering
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.completed_depth = 0
+        self.nodes = 0
+        self._pv = []
+        self._pv_table = []
+        self._killers = []
+        self._history = {}
+        # the time manager and statistics used by the running search; both
+        # are None while pondering
+        self._tm = None
+        self._stats = None
+
+    def reset(self):
+        """Forget the earlier searches: clear the transposition table and the
+        principal variation, killer and history moves.
+        """
+        if self.tt is not None:
+            self.tt.clear()
+        self._pv = []
+        self._pv_table = []
+        self._killers = []
+        self._history = {}
 
     def get_move(self, game, time_left):
         """Search for the best move from the available legal moves and return a
@@ -416,27 +1175,88 @@ class AlphaBetaPlayer(IsolationPlayer):
             Board coordinates corresponding to a legal move; may return
             (-1, -1) if there are no available legal moves.
         """
+        pondered = None
+        if self.ponder is not None:
+            pondered = self.ponder.stop(game)
         self.time_left = time_left
+        stats = self._stats = self.stats
+        if stats is not None:
+            stats.begin_move(time_left)
         
         # Initialize the best move so that this function returns something
         # in case the search fails due to timeout
         m = (-1, -1)
         lm = game.get_legal_moves()
         if not lm:
+            if stats is not None:
+                stats.end_move(time_left, m)
             return m
+
+        if self.book is not None:
+            m = self.book.lookup(game)
+            if m is not None:
+                if stats is not None:
+                    stats.end_move(time_left, m)
+                return m
+            m = (-1, -1)
         
         self.search_depth = 100
+        if self.tt is not None:
+            self.tt.new_search()
+        self.nodes = 0
+        self.completed_depth = 0
+        self._history = {k: v // 2 for k, v in self._history.items()}
+        score = None
+        start = 0
+        if pondered is not None:
+            # the opponent played the predicted reply: resume iterative
+            # deepening after the deepest iteration completed while pondering
+            self.completed_depth, m, score = pondered
+            start = self.completed_depth + 1
+        else:
+            self._pv = []
+            self._killers = []
+        tm = self._tm = self.time_manager
+        if tm is not None:
+            tm.start(time_left, self.TIMER_THRESHOLD)
+
+        if self.endgame is not None and is_partitioned(game):
+            try:
+                m, _ = self.endgame.best_move(game, self.__check_time)
+                if stats is not None:
+                    stats.end_move(time_left, m)
+                return m
+            except SearchTimeout:
+                # fall back to the search; the solver memo keeps the work
+                # done so far for the next move
+                pass
 
         try:
             # The try/except block will automatically catch the exception
             # raised when the timer is about to expire.
-            for i in range(0, self.search_depth): 
-                m = self.alphabeta(game, i)
+            for i in range(start, self.search_depth): 
+                if tm is not None and not tm.should_start(time_left):
+                    break
+                if self.parallel is not None and i >= self.parallel.min_depth:
+                    m, score = self.parallel.search(self, game, i, time_left)
+                else:
+                    m, score = self.__aspiration_search(game, i, score)
+                self.completed_depth = i
+                if stats is not None:
+                    stats.end_iteration(time_left, i)
+                if self.ordering:
+                    self._pv = self._pv_table[0]
+                if tm is not None and tm.end_iteration(time_left, i, m):
+                    break
 
         except SearchTimeout:
              # Handle any actions required after timeout as needed
             if m == (-1, -1):
                 m = random.choice(lm)
+        if stats is not None:
+            stats.end_move(time_left, m)
+        if self.ponder is not None:
+            self.__start_pondering(game, m)
         return m
 
     def alphabeta(self, game, depth, alpha=float("-inf"), beta=float("inf")):
@@ -486,43 +1306,538 @@ class AlphaBetaPlayer(IsolationPlayer):
         """
         m, _ = self.__ab(game, depth, alpha, beta)
         return m
-        
-    def __ab(self, game, depth, alpha, beta):
-        if self.time_left() < self.TIMER_THRESHOLD:
-            raise SearchTimeout()
+
+    def move_value(self, game, move, depth, alpha=float("-inf"),
+                   beta=float("inf")):
+        """Return the value for this player of making `move` in `game`,
+        searched with alpha-beta to `depth` plies including the move itself.
+        As in `alphabeta()`, values outside (alpha, beta) are only bounds.
+        """
+        game.apply_move(move)
+        try:
+            _, value = self.__ab(game, depth - 1, alpha, beta)
+        finally:
+            game.undo_move()
+        return value
+
+    def __start_pondering(self, game, move):
+        """Predict the opponent's reply to `move` and ponder the resulting
+        position (or the position after `move` if there is no prediction).
+        """
+        board = game.copy()
+        board.apply_move(move)
+        reply = None
+        if len(self._pv) > 1 and self._pv[0] == move:
+            reply = self._pv[1]
+        elif self.tt is not None:
+            entry = self.tt.probe(self.__tt_key(board))
+            if entry is not None:
+                reply = entry[3]
+        if reply is not None and board.move_is_legal(reply):
+            board.apply_move(reply)
+        self.ponder.start(board, self.__ponder_search)
+
+    def __ponder_search(self, board, ponderer):
+        """Iterative deepening on `board` in the pondering thread, recording
+        each completed iteration with the ponderer.
+        """
+        self.time_left = ponderer.time_left
+        self._tm = None
+        self._stats = None
+        self._pv = []
+        self._killers = []
+        if not board.get_legal_moves():
+            return
+        score = None
+        for i in range(0, self.search_depth):
+            m, score = self.__aspiration_search(board, i, score)
+            ponderer.record(i, m, score)
+            if self.ordering:
+                self._pv = self._pv_table[0]
+
+    def __check_time(self):
+        tm = self._tm
+        if tm is None:
+            if self.time_left() < self.TIMER_THRESHOLD:
+                raise SearchTimeout()
+        else:
+            tm.countdown -= 1
+            if tm.countdown <= 0:
+                tm.poll(self.time_left)
+
+    def __aspiration_search(self, game, depth, guess):
+        """Search the root with windows centered on the score of the previous
+        iteration, widening them on failure, and return (move, score).
+        """
+        if self.aspiration and guess is not None and abs(guess) != float("inf"):
+            for delta in self.aspiration:
+                alpha, beta = guess - delta, guess + delta
+                m, v = self.__ab(game, depth, alpha, beta)
+                if alpha < v < beta:
+                    return m, v
+        return self.__ab(game, depth, float("-inf"), float("inf"))
+
+    def __ab(self, game, depth, alpha, beta, ply=0, on_pv=True):
+        tm = self._tm
+        if tm is None:
+            if self.time_left() < self.TIMER_THRESHOLD:
+                raise SearchTimeout()
+        else:
+            tm.countdown -= 1
+            if tm.countdown <= 0:
+                tm.poll(self.time_left)
+        self.nodes += 1
+        stats = self._stats
+        if stats is not None:
+            stats.nodes += 1
 
         # TODO: finish this function!
         best_move = (-1, -1)
         ml = game.get_legal_moves(game.active_player)
-        
+
+        ordering = self.ordering
+        if ordering:
+            if ply >= len(self._killers):
+                self._killers.append([None, None])
+                self._pv_table.append([])
+            self._pv_table[ply] = []
+
+        hint = None
+        tt = self.tt
+        if tt is not None and depth and ml:
+            key = self.__tt_key(game)
+            entry = tt.probe(key)
+            if stats is not None:
+                stats.cache_probes += 1
+                stats.cache_hits += entry is not None
+            if entry is not None:
+                hint = entry[3]
+                if entry[0] >= depth:
+                    _, value, bound, move = entry
+                    if bound == EXACT:
+                        return move, value
+                    if bound == LOWER:
+                        alpha = max(alpha, value)
+                    else:
+                        beta = min(beta, value)
+                    if beta <= alpha:
+                        return move, value
+            alpha_orig, beta_orig = alpha, beta
+
+        pvs = self.pvs
+        if ordering and depth and ml:
+            on_pv = on_pv and ply < len(self._pv)
+            if on_pv:
+                hint = self._pv[ply]
+            self.__order_moves(ml, ply, hint)
+
         if game.active_player == self:
             if not depth or not ml:
+                if stats is not None:
+                    stats.leaves += 1
                 return best_move, self.score(game, self)
             best_move = random.choice(ml)
             v = float("-inf")
+            first = True
             for m in ml:
-                _, x = self.__ab(game.forecast_move(m), depth - 1, alpha, beta)
+                game.apply_move(m)
+                try:
+                    if pvs and not first and alpha != float("-inf"):
+                        _, x = self.__ab(game, depth - 1, alpha,
+                                         alpha + NULL_WINDOW, ply + 1, False)
+                        if alpha < x < beta:
+                            _, x = self.__ab(game, depth - 1, x, beta,
+                                             ply + 1, on_pv and m == hint)
+                    else:
+                        _, x = self.__ab(game, depth - 1, alpha, beta,
+                                         ply + 1, on_pv and m == hint)
+                finally:
+                    game.undo_move()
+                first = False
                 if x > v:
                     v = x
                     best_move = m
+                    if ordering:
+                        self.__update_pv(ply, m)
                 if v > alpha:
                     alpha = v
                     best_move = m
                 if beta <= alpha:
+                    if ordering:
+                        self.__record_cutoff(ply, depth, m)
+                    if stats is not None:
+                        stats.cutoff(ply)
                     break            
         else:
             if not depth or not ml:
+                if stats is not None:
+                    stats.leaves += 1
                 return best_move, self.score(game, game.inactive_player) 
             best_move = random.choice(ml)
             v = float("inf")        
+            first = True
             for m in ml:
-                _, x = self.__ab(game.forecast_move(m), depth - 1, alpha, beta)
+                game.apply_move(m)
+                try:
+                    if pvs and not first and beta != float("inf"):
+                        _, x = self.__ab(game, depth - 1, beta - NULL_WINDOW,
+                                         beta, ply + 1, False)
+                        if alpha < x < beta:
+                            _, x = self.__ab(game, depth - 1, alpha, x,
+                                             ply + 1, on_pv and m == hint)
+                    else:
+                        _, x = self.__ab(game, depth - 1, alpha, beta,
+                                         ply + 1, on_pv and m == hint)
+                finally:
+                    game.undo_move()
+                first = False
                 if x < v:
                     v = x
                     best_move = m
+                    if ordering:
+                        self.__update_pv(ply, m)
                 if v < beta:
                     beta = v
                     best_move = m
                 if beta <= alpha:
+                    if ordering:
+                        self.__record_cutoff(ply, depth, m)
+                    if stats is not None:
+                        stats.cutoff(ply)
                     break
-        return best_move, v        
\ No newline at end of file
+
+        if tt is not None:
+            if v <= alpha_orig:
+                bound = UPPER
+            elif v >= beta_orig:
+                bound = LOWER
+            else:
+                bound = EXACT
+            tt.store(key, depth, v, bound, best_move)
+        return best_move, v
+
+    def __tt_key(self, game):
+        """Return the transposition table key of `game`: its Zobrist key,
+        offset by `Board.SEAT_KEY` when this player has the second seat.
+        """
+        key = game.hash()
+        if (game.active_player == self) == bool(game.move_count & 1):
+            key ^= game.SEAT_KEY
+        return key
+
+    def __order_moves(self, ml, ply, hint):
+        """Sort moves in-place: the principal variation (or transposition
+        table) move first, then the killer moves for this ply, then the rest
+        by history score. The sort is stable, so ties keep the random order
+        from `get_legal_moves()`.
+        """
+        killers = self._killers[ply]
+        history = self._history
+
+        def rank(m):
+            if m == hint:
+                return float("inf")
+            if m == killers[0]:
+                return 2e9
+            if m == killers[1]:
+                return 1e9
+            return history.get(m, 0)
+        ml.sort(key=rank, reverse=True)
+
+    def __update_pv(self, ply, move):
+        child_pv = self._pv_table[ply + 1] if ply + 1 < len(self._pv_table) else []
+        self._pv_table[ply] = [move] + child_pv
+
+    def __record_cutoff(self, ply, depth, move):
+        killers = self._killers[ply]
+        if move != killers[0]:
+            killers[1] = killers[0]
+            killers[0] = move
+        self._history[move] = self._history.get(move, 0) + depth * depth
+
+
+class MCTSPlayer(IsolationPlayer):
+    """Game-playing agent that chooses a move with Monte Carlo tree search:
+    UCB1 selection over `Node` trees, one random playout per iteration and as
+    many iterations as the time limit allows. The move played is the most
+    visited child of the root.
+
+    The tree is kept between turns: on the next call the node reached by the
+    player's move and the opponent's reply becomes the new root, so the
+    playouts already spent on that position are reused.
+
+    Each node counts wins for the player who made the move leading to it, so
+    that UCB1 at every level prefers the moves that are good for the player
+    choosing them.
+
+    Parameters
+    ----------
+    timeout : float (optional)
+        Time remaining (in milliseconds) when search is aborted.
+
+    iterations : int (optional)
+        Maximum number of iterations per move; None searches until the timer
+        threshold is reached.
+
+    stats : SearchStats (optional)
+        Collects per-move search statistics when given; each iteration is
+        counted as a node and each playout as a leaf.
+
+    max_nodes : int (optional)
+        Maximum number of `Node` objects in the tree; once it is reached,
+        iterations run their playout from the leaf they select without
+        expanding it, until moving on to a subtree makes room.
+
+    pool : NodePool (optional)
+        Store the tree in a preallocated NodePool instead of `Node` objects.
+        When the pool fills up, the children of the least visited nodes are
+        dropped to free half of it. The copy takes time in proportion to the
+        pool size, so when it would not finish before the timer threshold the
+        search stops instead, and the pool is compacted on the next move; if
+        there is no time for that either, the next move starts a new tree.
+
+    rollout : rollout.BatchRollout (optional)
+        Back each expansion by a batch of vectorized playouts (see
+        `rollout.py`, which needs NumPy) instead of a single one.
+
+    rave : float (optional)
+        Enable RAVE with this equivalence parameter k. Every node then also
+        keeps all-moves-as-first (AMAF) statistics for its moves, crediting a
+        move with each playout through the node in which the same player
+        occupied that cell at any later point, and selection blends them into
+        UCB1 with weight beta = sqrt(k / (3 n + k)) for a child visited n
+        times: a larger k trusts the AMAF values for longer. Unvisited moves
+        are tried in order of their AMAF values. The statistics are kept in
+        the flat arrays of a NodePool, so that they add no objects for the
+        garbage collector to scan; a default NodePool is used when `pool` is
+        None.
+    """
+
+    def __init__(self, timeout=10., iterations=None, stats=None, pool=None,
+                 rollout=None, rave=None, max_nodes=2 ** 14):
+        super().__init__(timeout=timeout)
+        if rave is not None and rave <= 0:
+            raise ValueError("The RAVE equivalence parameter must be positive")
+        self.iterations = iterations
+        self.stats = stats
+        if rave is not None and pool is None:
+            pool = NodePool()
+        self.pool = pool
+        self.max_nodes = max_nodes
+        self.rollout = rollout
+        self.rave = rave
+        self.root = None
+        self._board = None
+        self._move = None
+        self._reroot_ms = REROOT_MS_PER_NODE
+
+    def get_move(self, game, time_left):
+        """Search for the best move from the available legal moves and return a
+        result before the time limit expires.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            An instance of `isolation.Board` encoding the current state of the
+            game (e.g., player locations and blocked cells).
+
+        time_left : callable
+            A function that returns the number of milliseconds left in the
+            current turn. Returning with any less than 0 ms remaining forfeits
+            the game.
+
+        Returns
+        -------
+        (int, int)
+            Board coordinates corresponding to a legal move; may return
+            (-1, -1) if there are no available legal moves.
+        """
+        self.time_left = time_left
+        stats = self.stats
+        if stats is not None:
+            stats.begin_move(time_left)
+
+        best_move = (-1, -1)
+        lm = game.get_legal_moves()
+        if lm:
+            if self.pool is None:
+                best_move = self.__search_nodes(game)
+            else:
+                best_move = self.__search_pool(game)
+            if best_move is None:
+                best_move = random.choice(lm)
+            self._board = game.copy()
+            self._move = best_move
+
+        if stats is not None:
+            stats.end_move(time_left, best_move)
+        return best_move
+
+    def __searching(self, count):
+        return ((self.iterations is None or count < self.iterations) and
+                self.time_left() >= self.TIMER_THRESHOLD)
+
+    def __search_nodes(self, game):
+        root = self.__reuse(game)
+        count = 0
+        while self.__searching(count):
+            self.__iterate(root, game.copy())
+            count += 1
+        # the whole tree is kept until the next call, so that the nodes that
+        # are not reused are freed on the next move's clock rather than after
+        # the last reading of this one
+        self.root = root
+        if not root.child:
+            return None
+        return max(root.child, key=lambda n: n.visitcount).move
+
+    def __search_pool(self, game):
+        pool = self.pool
+        self.__reuse_pool(game)
+        count = 0
+        while self.__searching(count):
+            full = self.__iterate_pool(game.copy())
+            count += 1
+            if full and not self.__reroot_pool(0):
+                break
+        best = pool.best_child(0)
+        if best < 0:
+            return None
+        return game._geometry.cells[pool.move[best]]
+
+    def __reuse_pool(self, game):
+        """Reroot the pool on the node for `game`, or reset it if the node is
+        not in the pool or there is no time to reroot.
+        """
+        pool = self.pool
+        if self._board is not None and pool.size > 1:
+            board = self._board.forecast_move(self._move)
+            reply = game.get_player_location(game.inactive_player)
+            if reply is not None and board.forecast_move(reply) == game:
+                node = 0
+                for r, c in (self._move, reply):
+                    if node >= 0:
+                        node = pool.find_child(node, r + c * game.height)
+                if node >= 0 and self.__reroot_pool(node):
+                    return
+        pool.reset()
+
+    def __iterate_pool(self, g):
+        """Run one iteration on the pool tree; `g` starts at the root.
+        Returns True if the pool was too full to expand the selected node.
+        """
+        pool = self.pool
+        cells = g._geometry.cells
+        first, moves = pool.first, pool.move
+        n = 0
+
+        #select
+        while first[n] >= 0 and pool.count[n]:
+            n = pool.select(n, self.rave)
+            g.apply_move(cells[moves[n]])
+
+        full = False
+        if first[n] < 0:
+            ml = g.get_legal_moves()
+            if pool.expand(n, [r + c * g.height for r, c in ml]):
+                if ml:
+                    n = first[n]
+                    g.apply_move(cells[moves[n]])
+            else:
+                full = True
+
+        pool.backpropagate(n, *self.__playout(g))
+        return full
+
+    def __reroot_pool(self, node):
+        """Reroot the pool on `node`, freeing at least half of it, and return
+        True, unless the copy is expected to run past the timer threshold.
+        """
+        pool = self.pool
+        size = pool.size
+        before = self.time_left()
+        if before - self._reroot_ms * size < self.TIMER_THRESHOLD:
+            return False
+        pool.reroot(node)
+        self._reroot_ms = (before - self.time_left()) / size
+        return True
+
+    def __reuse(self, game):
+        """Return the node of the kept tree for `game`, or a new root. """
+        root, self.root = self.root, None
+        if root is not None:
+            board = self._board.forecast_move(self._move)
+            reply = game.get_player_location(game.inactive_player)
+            for child in root.child:
+                if child.move != self._move:
+                    continue
+                for n in child.child:
+                    if n.move == reply and board.forecast_move(reply) == game:
+                        return n
+        return Node(game)
+
+    def __iterate(self, root, g):
+        """Run one select-expand-playout-backpropagate iteration on the
+        board `g`, which starts at the root position and is modified.
+        """
+        n = root
+        path = [n]
+
+        #select
+        while not n.notvisit and n.child:
+            n = n.selectchild()
+            g.apply_move(n.move)
+            path.append(n)
+
+        if n.notvisit and root.size < self.max_nodes:
+            g.apply_move(random.choice(n.notvisit))
+            n = n.addchild(g)
+            for node in path:
+                node.size += 1
+            path.append(n)
+
+        mover = n.player
+        wins, playouts, _ = self.__playout(g)
+        for n in reversed(path):
+            n.updatevalue(wins if n.player == mover else playouts - wins,
+                          playouts)
+
+    def __playout(self, g):
+        """Play the game on `g` to the end and return (wins, playouts, amaf)
+        for the player who made the last move on `g`. With a batch rollout the
+        board is left unchanged and the batch is counted.
+
+        `amaf` is None unless RAVE is enabled; it is then a pair of
+        {cell index: (wins, playouts)} dicts for the cells occupied during
+        the playouts by that player and by its opponent.
+        """
+        mover = g.inactive_player
+        stats = self.stats
+        amaf = None
+        if self.rollout is not None:
+            playouts = self.rollout.batch
+            if self.rave is None:
+                wins = self.rollout.playout(g, mover, playouts)
+            else:
+                wins, amaf = self.rollout.playout(g, mover, playouts,
+                                                  amaf=True)
+        else:
+            playouts = 1
+            moves = []
+            ml = g.get_legal_moves()
+            while ml:
+                m = random.choice(ml)
+                moves.append(m)
+                g.apply_move(m)
+                ml = g.get_legal_moves()
+            wins = 1. if g.inactive_player == mover else 0.
+            if self.rave is not None:
+                # the opponent of the mover plays the odd plies
+                amaf = ({}, {})
+                for i, (r, c) in enumerate(moves):
+                    amaf[(i + 1) & 1][r + c * g.height] = (
+                        wins if i & 1 else 1. - wins, 1)
+        if stats is not None:
+            stats.nodes += 1
+            stats.leaves += playouts
+        return wins, playouts, amaf
\ No newline at end of file
@@ -1,341 +1,661 @@
-"""
-This file contains the `Board` class, which implements the rules for the
-game Isolation as described in lecture, modified so that the players move
-like knights in chess rather than queens.
-
-You MAY use and modify this class, however ALL function signatures must
-remain compatible with the defaults provided, and none of your changes will
-be available to project reviewers.
-"""
-import random
-import timeit
-from copy import copy
-
-TIME_LIMIT_MILLIS = 150
-
-class Board(object):
-    """Implement a model for the game Isolation assuming each player moves like
-    a knight in chess.
-
-    Parameters
-    ----------
-    player_1 : object
-        An object with a get_move() function. This is the only function
-        directly called by the Board class for each player.
-
-    player_2 : object
-        An object with a get_move() function. This is the only function
-        directly called by the Board class for each player.
-
-    width : int (optional)
-        The number of columns that the board should have.
-
-    height : int (optional)
-        The number of rows that the board should have.
-    """
-    BLANK = 0
-    NOT_MOVED = None
-
-    def __init__(self, player_1, player_2, width=7, height=7):
-        self.width = width
-        self.height = height
-        self.move_count = 0
-        self._player_1 = player_1
-        self._player_2 = player_2
-        self._active_player = player_1
-        self._inactive_player = player_2
-
-        # The last 3 entries of the board state includes initiative (0 for
-        # player 1, 1 for player 2) player 2 last move, and player 1 last move
-        self._board_state = [Board.BLANK] * (width * height + 3)
-        self._board_state[-1] = Board.NOT_MOVED
-        self._board_state[-2] = Board.NOT_MOVED
-
-    def hash(self):
-        return str(self._board_state).__hash__()
-
-    @property
-    def active_player(self):
-        """The object registered as the player holding initiative in the
-        current game state.
-        """
-        return self._active_player
-
-    @property
-    def inactive_player(self):
-        """The object registered as the player in waiting for the current
-        game state.
-        """
-        return self._inactive_player
-
-    def get_opponent(self, player):
-        """Return the opponent of the supplied player.
-
-        Parameters
-        ----------
-        player : object
-            An object registered as a player in the current game. Raises an
-            error if the supplied object is not registered as a player in
-            this game.
-
-        Returns
-        -------
-        object
-            The opponent of the input player object.
-        """
-        if player == self._active_player:
-            return self._inactive_player
-        elif player == self._inactive_player:
-            return self._active_player
-        raise RuntimeError("`player` must be an object registered as a player in the current game.")
-
-    def copy(self):
-        """ Return a deep copy of the current board. """
-        new_board = Board(self._player_1, self._player_2, width=self.width, height=self.height)
-        new_board.move_count = self.move_count
-        new_board._active_player = self._active_player
-        new_board._inactive_player = self._inactive_player
-        new_board._board_state = copy(self._board_state)
-        return new_board
-
-    def forecast_move(self, move):
-        """Return a deep copy of the current game with an input move applied to
-        advance the game one ply.
-
-        Parameters
-        ----------
-        move : (int, int)
-            A coordinate pair (row, column) indicating the next position for
-            the active player on the board.
-
-        Returns
-        -------
-        isolation.Board
-            A deep copy of the board with the input move applied.
-        """
-        new_board = self.copy()
-        new_board.apply_move(move)
-        return new_board
-
-    def move_is_legal(self, move):
-        """Test whether a move is legal in the current game state.
-
-        Parameters
-        ----------
-        move : (int, int)
-            A coordinate pair (row, column) indicating the next position for
-            the active player on the board.
-
-        Returns
-        -------
-        bool
-            Returns True if the move is legal, False otherwise
-        """
-        idx = move[0] + move[1] * self.height
-        return (0 <= move[0] < self.height and 0 <= move[1] < self.width and
-                self._board_state[idx] == Board.BLANK)
-
-    def get_blank_spaces(self):
-        """Return a list of the locations that are still available on the board.
-        """
-        return [(i, j) for j in range(self.width) for i in range(self.height)
-                if self._board_state[i + j * self.height] == Board.BLANK]
-
-    def get_player_location(self, player):
-        """Find the current location of the specified player on the board.
-
-        Parameters
-        ----------
-        player : object
-            An object registered as a player in the current game.
-
-        Returns
-        -------
-        (int, int) or None
-            The coordinate pair (row, column) of the input player, or None
-            if the player has not moved.
-        """
-        if player == self._player_1:
-            if self._board_state[-1] == Board.NOT_MOVED:
-                return Board.NOT_MOVED
-            idx = self._board_state[-1]
-        elif player == self._player_2:
-            if self._board_state[-2] == Board.NOT_MOVED:
-                return Board.NOT_MOVED
-            idx = self._board_state[-2]
-        else:
-            raise RuntimeError(
-                "Invalid player in get_player_location: {}".format(player))
-        w = idx // self.height
-        h = idx % self.height
-        return (h, w)
-
-    def get_legal_moves(self, player=None):
-        """Return the list of all legal moves for the specified player.
-
-        Parameters
-        ----------
-        player : object (optional)
-            An object registered as a player in the current game. If None,
-            return the legal moves for the active player on the board.
-
-        Returns
-        -------
-        list<(int, int)>
-            The list of coordinate pairs (row, column) of all legal moves
-            for the player constrained by the current game state.
-        """
-        if player is None:
-            player = self.active_player
-        return self.__get_moves(self.get_player_location(player))
-
-    def apply_move(self, move):
-        """Move the active player to a specified location.
-
-        Parameters
-        ----------
-        move : (int, int)
-            A coordinate pair (row, column) indicating the next position for
-            the active player on the board.
-        """
-        idx = move[0] + move[1] * self.height
-        last_move_idx = int(self.active_player == self._player_2) + 1
-        self._board_state[-last_move_idx] = idx
-        self._board_state[idx] = 1
-        self._board_state[-3] ^= 1
-        self._active_player, self._inactive_player = self._inactive_player, self._active_player
-        self.move_count += 1
-
-    def is_winner(self, player):
-        """ Test whether the specified player has won the game. """
-        return player == self._inactive_player and not self.get_legal_moves(self._active_player)
-
-    def is_loser(self, player):
-        """ Test whether the specified player has lost the game. """
-        return player == self._active_player and not self.get_legal_moves(self._active_player)
-
-    def utility(self, player):
-        """Returns the utility of the current game state from the perspective
-        of the specified player.
-
-                    /  +infinity,   "player" wins
-        utility =  |   -infinity,   "player" loses
-                    \          0,    otherwise
-
-        Parameters
-        ----------
-        player : object (optional)
-            An object registered as a player in the current game. If None,
-            return the utility for the active player on the board.
-
-        Returns
-        ----------
-        float
-            The utility value of the current game state for the specified
-            player. The game has a utility of +inf if the player has won,
-            a value of -inf if the player has lost, and a value of 0
-            otherwise.
-        """
-        if not self.get_legal_moves(self._active_player):
-
-            if player == self._inactive_player:
-                return float("inf")
-
-            if player == self._active_player:
-                return float("-inf")
-
-        return 0.
-
-    def __get_moves(self, loc):
-        """Generate the list of possible moves for an L-shaped motion (like a
-        knight in chess).
-        """
-        if loc == Board.NOT_MOVED:
-            return self.get_blank_spaces()
-
-        r, c = loc
-        directions = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                      (1, -2), (1, 2), (2, -1), (2, 1)]
-        valid_moves = [(r + dr, c + dc) for dr, dc in directions
-                       if self.move_is_legal((r + dr, c + dc))]
-        random.shuffle(valid_moves)
-        return valid_moves
-
-    def print_board(self):
-        """DEPRECATED - use Board.to_string()"""
-        return self.to_string()
-
-    def to_string(self, symbols=['1', '2']):
-        """Generate a string representation of the current game state, marking
-        the location of each player and indicating which cells have been
-        blocked, and which remain open.
-        """
-        p1_loc = self._board_state[-1]
-        p2_loc = self._board_state[-2]
-
-        col_margin = len(str(self.height - 1)) + 1
-        prefix = "{:<" + "{}".format(col_margin) + "}"
-        offset = " " * (col_margin + 3)
-        out = offset + '   '.join(map(str, range(self.width))) + '\n\r'
-        for i in range(self.height):
-            out += prefix.format(i) + ' | '
-            for j in range(self.width):
-                idx = i + j * self.height
-                if not self._board_state[idx]:
-                    out += ' '
-                elif p1_loc == idx:
-                    out += symbols[0]
-                elif p2_loc == idx:
-                    out += symbols[1]
-                else:
-                    out += '-'
-                out += ' | '
-            out += '\n\r'
-
-        return out
-
-    def play(self, time_limit=TIME_LIMIT_MILLIS):
-        """Execute a match between the players by alternately soliciting them
-        to select a move and applying it in the game.
-
-        Parameters
-        ----------
-        time_limit : numeric (optional)
-            The maximum number of milliseconds to allow before timeout
-            during each turn.
-
-        Returns
-        ----------
-        (player, list<[(int, int),]>, str)
-            Return multiple including the winning player, the complete game
-            move history, and a string indicating the reason for losing
-            (e.g., timeout or invalid move).
-        """
-        move_history = []
-
-        time_millis = lambda: 1000 * timeit.default_timer()
-
-        while True:
-
-            legal_player_moves = self.get_legal_moves()
-            game_copy = self.copy()
-            move_start = time_millis()            
-            time_left = lambda : time_limit - (time_millis() - move_start)
-            
-            curr_move = self._active_player.get_move(game_copy, time_left)
-            move_end = time_left()
-
-            if curr_move is None:
-                curr_move = Board.NOT_MOVED
-
-            if move_end < 0:
-                return self._inactive_player, move_history, "timeout"
-
-            if curr_move not in legal_player_moves:
-                if len(legal_player_moves) > 0:
-                    return self._inactive_player, move_history, "forfeit"
-                return self._inactive_player, move_history, "illegal move"
-
-            move_history.append(list(curr_move))
-
-            self.apply_move(curr_move)
+"""
+This file contains the `Board` class, which implements the rules for the
+game Isolation as described in lecture, modified so that the players move
+like knights in chess rather than queens.
+
+You MAY use and modify this class, however ALL function signatures must
+remain compatible with the defaults provided, and none of your changes will
+be available to project reviewers.
+"""
+import random
+import time
+import timeit
+
+from collections import namedtuple
+from contextlib import contextmanager
+
+TIME_LIMIT_MILLIS = 150
+
+# clocks that Board.play() can charge the players' moves against
+CLOCKS = {"wall": timeit.default_timer,
+          "thread": time.thread_time,
+          "process": time.process_time}
+
+KNIGHT_DIRECTIONS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                     (1, -2), (1, 2), (2, -1), (2, 1)]
+
+Geometry = namedtuple("Geometry", ["width", "height", "full", "cells",
+                                   "moves", "decoded", "zobrist_cells",
+                                   "zobrist_p1", "zobrist_p2", "zobrist_side",
+                                   "symmetries"])
+
+_GEOMETRIES = {}
+
+
+def board_geometry(width, height):
+    """Return the move tables shared by every board with the given size.
+
+    Cells are numbered column-major (``idx = row + col * height``) to match
+    the layout of the legacy ``_board_state`` list, and bit ``idx`` of a
+    bitboard corresponds to cell ``idx``. The tables are built once per
+    `(width, height)` and cached for the life of the process.
+
+    Parameters
+    ----------
+    width : int
+        The number of columns on the board.
+
+    height : int
+        The number of rows on the board.
+
+    Returns
+    -------
+    Geometry
+        A namedtuple holding the bitmask of all cells (`full`), the
+        coordinate pair of each cell index (`cells`), the knight-move mask of
+        each cell index (`moves`) and a lazily filled cache mapping subsets
+        of those masks to their lists of coordinate pairs (`decoded`); with
+        at most 8 moves per cell, it holds at most 256 masks per cell. It
+        also holds the 64-bit Zobrist keys for blocked cells, for the
+        location of each player and for player 2 holding the initiative; the
+        keys are drawn from a generator seeded by the board size, so they
+        are identical in every process. Finally `symmetries` lists the
+        symmetries of the board (8 on a square board, 4 otherwise) as tuples
+        mapping each cell index to the index of its image; the first one is
+        the identity.
+    """
+    key = (width, height)
+    geometry = _GEOMETRIES.get(key)
+    if geometry is None:
+        cells = [(idx % height, idx // height) for idx in range(width * height)]
+        moves = []
+        for r, c in cells:
+            mask = 0
+            for dr, dc in KNIGHT_DIRECTIONS:
+                if 0 <= r + dr < height and 0 <= c + dc < width:
+                    mask |= 1 << (r + dr + (c + dc) * height)
+            moves.append(mask)
+        rng = random.Random("zobrist-{}x{}".format(width, height))
+        keys = [[rng.getrandbits(64) for _ in cells] for _ in range(3)]
+        symmetries = []
+        for transpose in (False, True):
+            if transpose and width != height:
+                continue
+            for flip_rows in (False, True):
+                for flip_cols in (False, True):
+                    image = []
+                    for r, c in cells:
+                        if transpose:
+                            r, c = c, r
+                        if flip_rows:
+                            r = height - 1 - r
+                        if flip_cols:
+                            c = width - 1 - c
+                        image.append(r + c * height)
+                    symmetries.append(tuple(image))
+        geometry = Geometry(width, height, (1 << (width * height)) - 1,
+                            cells, moves, {}, keys[0], keys[1], keys[2],
+                            rng.getrandbits(64), symmetries)
+        _GEOMETRIES[key] = geometry
+    return geometry
+
+
+def decode_cells(geometry, mask):
+    """Return a new list of the (row, column) pairs set in a bitmask. """
+    cells = []
+    while mask:
+        low = mask & -mask
+        cells.append(geometry.cells[low.bit_length() - 1])
+        mask ^= low
+    return cells
+
+
+def decode_moves(geometry, mask):
+    """Return a new list of the (row, column) pairs set in a bitmask of
+    knight moves from one cell, cached in `geometry.decoded`. Other masks,
+    whose number is not bounded, must be decoded with `decode_cells()`.
+    """
+    moves = geometry.decoded.get(mask)
+    if moves is None:
+        moves = geometry.decoded[mask] = decode_cells(geometry, mask)
+    return list(moves)
+
+
+class Board(object):
+    """Implement a model for the game Isolation assuming each player moves like
+    a knight in chess.
+
+    Parameters
+    ----------
+    player_1 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    player_2 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    width : int (optional)
+        The number of columns that the board should have.
+
+    height : int (optional)
+        The number of rows that the board should have.
+    """
+    BLANK = 0
+    NOT_MOVED = None
+    # Zobrist key that search agents XOR into `hash()` for the positions they
+    # search from the second seat, since their cached values are from the
+    # other player's point of view
+    SEAT_KEY = 0x9e3779b97f4a7c15
+
+    def __init__(self, player_1, player_2, width=7, height=7):
+        self.width = width
+        self.height = height
+        self.move_count = 0
+        self._player_1 = player_1
+        self._player_2 = player_2
+        self._active_player = player_1
+        self._inactive_player = player_2
+        self._geometry = board_geometry(width, height)
+
+        # The board state is a bitmask of blocked cells plus the cell index
+        # of each player's last move; initiative is the parity of move_count
+        self._blocked = 0
+        self._p1_loc = Board.NOT_MOVED
+        self._p2_loc = Board.NOT_MOVED
+
+        # Previous location of the mover for each applied move, so that
+        # undo_move() can restore the state in place
+        self._history = []
+
+        # Zobrist key of the position, updated incrementally by apply_move()
+        # and undo_move()
+        self._key = 0
+
+    @property
+    def _board_state(self):
+        """Legacy list view of the board: one entry per cell (1 if blocked)
+        followed by initiative (0 for player 1, 1 for player 2), player 2
+        last move and player 1 last move.
+        """
+        state = [(self._blocked >> idx) & 1
+                 for idx in range(self.width * self.height)]
+        state.extend([self.move_count & 1, self._p2_loc, self._p1_loc])
+        return state
+
+    def hash(self):
+        """Return the 64-bit Zobrist key of the current state. The key covers
+        blocked cells, both player locations and which player has initiative,
+        and is maintained incrementally so this call is constant time.
+        """
+        return self._key
+
+    def __hash__(self):
+        return self._key
+
+    def symmetric_keys(self):
+        """Return the Zobrist keys of the images of the current state under
+        each symmetry in `board_geometry(width, height).symmetries`, in the
+        same order; the first key is `hash()`. Equivalent positions (e.g.
+        mirrored openings) share the same set of keys.
+        """
+        geometry = self._geometry
+        blocked = []
+        bits = self._blocked
+        while bits:
+            low = bits & -bits
+            blocked.append(low.bit_length() - 1)
+            bits ^= low
+        base = geometry.zobrist_side if self.move_count & 1 else 0
+        keys = []
+        for image in geometry.symmetries:
+            key = base
+            for idx in blocked:
+                key ^= geometry.zobrist_cells[image[idx]]
+            if self._p1_loc is not None:
+                key ^= geometry.zobrist_p1[image[self._p1_loc]]
+            if self._p2_loc is not None:
+                key ^= geometry.zobrist_p2[image[self._p2_loc]]
+            keys.append(key)
+        return keys
+
+    def canonical_key(self):
+        """Return `(key, symmetry)`: the smallest of `symmetric_keys()`,
+        which identifies the state up to the symmetries of the board, and the
+        index of the symmetry that maps the state to it.
+        """
+        keys = self.symmetric_keys()
+        key = min(keys)
+        return key, keys.index(key)
+
+    def __eq__(self, other):
+        if not isinstance(other, Board):
+            return NotImplemented
+        return (self._key == other._key and
+                self._blocked == other._blocked and
+                self._p1_loc == other._p1_loc and
+                self._p2_loc == other._p2_loc and
+                (self.move_count & 1) == (other.move_count & 1) and
+                self._geometry is other._geometry)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    @property
+    def active_player(self):
+        """The object registered as the player holding initiative in the
+        current game state.
+        """
+        return self._active_player
+
+    @property
+    def inactive_player(self):
+        """The object registered as the player in waiting for the current
+        game state.
+        """
+        return self._inactive_player
+
+    def get_opponent(self, player):
+        """Return the opponent of the supplied player.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game. Raises an
+            error if the supplied object is not registered as a player in
+            this game.
+
+        Returns
+        -------
+        object
+            The opponent of the input player object.
+        """
+        if player == self._active_player:
+            return self._inactive_player
+        elif player == self._inactive_player:
+            return self._active_player
+        raise RuntimeError("`player` must be an object registered as a player in the current game.")
+
+    def copy(self):
+        """ Return a deep copy of the current board. """
+        new_board = self.__class__.__new__(self.__class__)
+        new_board.width = self.width
+        new_board.height = self.height
+        new_board.move_count = self.move_count
+        new_board._player_1 = self._player_1
+        new_board._player_2 = self._player_2
+        new_board._active_player = self._active_player
+        new_board._inactive_player = self._inactive_player
+        new_board._geometry = self._geometry
+        new_board._blocked = self._blocked
+        new_board._p1_loc = self._p1_loc
+        new_board._p2_loc = self._p2_loc
+        new_board._history = []
+        new_board._key = self._key
+        return new_board
+
+    def replace_players(self, player_1, player_2):
+        """Return a copy of the board with new objects registered as the
+        players, e.g. to search the position with another agent or to send it
+        to another process (boards can be pickled when their players can).
+
+        Parameters
+        ----------
+        player_1 : object
+            The object that takes the place of the first player.
+
+        player_2 : object
+            The object that takes the place of the second player.
+
+        Returns
+        -------
+        isolation.Board
+            A copy of the board in which the same seat holds the initiative.
+        """
+        new_board = self.copy()
+        new_board._player_1 = player_1
+        new_board._player_2 = player_2
+        if self.move_count & 1:
+            new_board._active_player = player_2
+            new_board._inactive_player = player_1
+        else:
+            new_board._active_player = player_1
+            new_board._inactive_player = player_2
+        return new_board
+
+    def __getstate__(self):
+        # the move tables are rebuilt (or found in the cache) on unpickling
+        state = self.__dict__.copy()
+        del state["_geometry"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._geometry = board_geometry(self.width, self.height)
+
+    def forecast_move(self, move):
+        """Return a deep copy of the current game with an input move applied to
+        advance the game one ply.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+
+        Returns
+        -------
+        isolation.Board
+            A deep copy of the board with the input move applied.
+        """
+        new_board = self.copy()
+        new_board.apply_move(move)
+        return new_board
+
+    def move_is_legal(self, move):
+        """Test whether a move is legal in the current game state.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+
+        Returns
+        -------
+        bool
+            Returns True if the move is legal, False otherwise
+        """
+        idx = move[0] + move[1] * self.height
+        return (0 <= move[0] < self.height and 0 <= move[1] < self.width and
+                not (self._blocked >> idx) & 1)
+
+    def get_blank_spaces(self):
+        """Return a list of the locations that are still available on the board.
+        """
+        return decode_cells(self._geometry, self._geometry.full & ~self._blocked)
+
+    def get_player_location(self, player):
+        """Find the current location of the specified player on the board.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        -------
+        (int, int) or None
+            The coordinate pair (row, column) of the input player, or None
+            if the player has not moved.
+        """
+        idx = self._location_index(player)
+        if idx == Board.NOT_MOVED:
+            return Board.NOT_MOVED
+        return self._geometry.cells[idx]
+
+    def _location_index(self, player):
+        """Return the cell index of the player, or None if it has not moved.
+        """
+        if player == self._player_1:
+            return self._p1_loc
+        elif player == self._player_2:
+            return self._p2_loc
+        raise RuntimeError(
+            "Invalid player in get_player_location: {}".format(player))
+
+    def _move_mask(self, idx):
+        """Return the bitmask of open cells reachable from cell `idx`. """
+        if idx == Board.NOT_MOVED:
+            return self._geometry.full & ~self._blocked
+        return self._geometry.moves[idx] & ~self._blocked
+
+    def get_legal_moves(self, player=None):
+        """Return the list of all legal moves for the specified player.
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            return the legal moves for the active player on the board.
+
+        Returns
+        -------
+        list<(int, int)>
+            The list of coordinate pairs (row, column) of all legal moves
+            for the player constrained by the current game state.
+        """
+        if player is None:
+            player = self._active_player
+        idx = self._location_index(player)
+        if idx == Board.NOT_MOVED:
+            return self.get_blank_spaces()
+        moves = decode_moves(self._geometry, self._move_mask(idx))
+        random.shuffle(moves)
+        return moves
+
+    def apply_move(self, move):
+        """Move the active player to a specified location.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+        """
+        idx = move[0] + move[1] * self.height
+        geometry = self._geometry
+        if self.move_count & 1:
+            prev_idx, positions = self._p2_loc, geometry.zobrist_p2
+            self._p2_loc = idx
+        else:
+            prev_idx, positions = self._p1_loc, geometry.zobrist_p1
+            self._p1_loc = idx
+        key = self._key ^ geometry.zobrist_cells[idx] ^ positions[idx] ^ geometry.zobrist_side
+        if prev_idx != Board.NOT_MOVED:
+            key ^= positions[prev_idx]
+        self._key = key
+        self._history.append(prev_idx)
+        self._blocked |= 1 << idx
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        self.move_count += 1
+
+    def undo_move(self):
+        """Revert the most recent call to apply_move() on this board in-place,
+        restoring the active player, move count and player locations.
+
+        Only moves applied to this object can be reverted; a board returned
+        by copy() or forecast_move() starts with an empty move history.
+        """
+        prev_idx = self._history.pop()
+        geometry = self._geometry
+        self.move_count -= 1
+        self._active_player, self._inactive_player = self._inactive_player, self._active_player
+        if self.move_count & 1:
+            idx, positions = self._p2_loc, geometry.zobrist_p2
+            self._p2_loc = prev_idx
+        else:
+            idx, positions = self._p1_loc, geometry.zobrist_p1
+            self._p1_loc = prev_idx
+        key = self._key ^ geometry.zobrist_cells[idx] ^ positions[idx] ^ geometry.zobrist_side
+        if prev_idx != Board.NOT_MOVED:
+            key ^= positions[prev_idx]
+        self._key = key
+        self._blocked &= ~(1 << idx)
+
+    @contextmanager
+    def pushed(self, move):
+        """Context manager that applies a move in-place on entry and reverts
+        it on exit, even if the body raises (e.g., on search timeout).
+
+        Example
+        -------
+            with game.pushed(move):
+                value = search(game, depth - 1)
+        """
+        self.apply_move(move)
+        try:
+            yield self
+        finally:
+            self.undo_move()
+
+    def _active_has_moves(self):
+        """Test whether the active player has at least one legal move. """
+        if self.move_count & 1:
+            return bool(self._move_mask(self._p2_loc))
+        return bool(self._move_mask(self._p1_loc))
+
+    def is_winner(self, player):
+        """ Test whether the specified player has won the game. """
+        return player == self._inactive_player and not self._active_has_moves()
+
+    def is_loser(self, player):
+        """ Test whether the specified player has lost the game. """
+        return player == self._active_player and not self._active_has_moves()
+
+    def utility(self, player):
+        """Returns the utility of the current game state from the perspective
+        of the specified player.
+
+                    /  +infinity,   "player" wins
+        utility =  |   -infinity,   "player" loses
+                    \          0,    otherwise
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            return the utility for the active player on the board.
+
+        Returns
+        ----------
+        float
+            The utility value of the current game state for the specified
+            player. The game has a utility of +inf if the player has won,
+            a value of -inf if the player has lost, and a value of 0
+            otherwise.
+        """
+        if not self._active_has_moves():
+
+            if player == self._inactive_player:
+                return float("inf")
+
+            if player == self._active_player:
+                return float("-inf")
+
+        return 0.
+
+    def print_board(self):
+        """DEPRECATED - use Board.to_string()"""
+        return self.to_string()
+
+    def to_string(self, symbols=['1', '2']):
+        """Generate a string representation of the current game state, marking
+        the location of each player and indicating which cells have been
+        blocked, and which remain open.
+        """
+        p1_loc = self._p1_loc
+        p2_loc = self._p2_loc
+
+        col_margin = len(str(self.height - 1)) + 1
+        prefix = "{:<" + "{}".format(col_margin) + "}"
+        offset = " " * (col_margin + 3)
+        out = offset + '   '.join(map(str, range(self.width))) + '\n\r'
+        for i in range(self.height):
+            out += prefix.format(i) + ' | '
+            for j in range(self.width):
+                idx = i + j * self.height
+                if not (self._blocked >> idx) & 1:
+                    out += ' '
+                elif p1_loc == idx:
+                    out += symbols[0]
+                elif p2_loc == idx:
+                    out += symbols[1]
+                else:
+                    out += '-'
+                out += ' | '
+            out += '\n\r'
+
+        return out
+
+    def play(self, time_limit=TIME_LIMIT_MILLIS, move_log=None, clock="wall"):
+        """Execute a match between the players by alternately soliciting them
+        to select a move and applying it in the game.
+
+        Parameters
+        ----------
+        time_limit : numeric (optional)
+            The maximum number of milliseconds to allow before timeout
+            during each turn.
+
+        move_log : list (optional)
+            If given, a dict is appended for every move requested, holding
+            the seat of the player (1 or 2), the move returned, the time it
+            was charged on `clock` (`time_ms`), the elapsed wall-clock time
+            (`wall_ms`) and CPU time of the process (`cpu_ms`), all in
+            milliseconds, and -- when the player has a `stats` attribute
+            (e.g., `game_agent.SearchStats`) -- its `last` record.
+
+        clock : str (optional)
+            The clock that each move is timed on: "wall" for elapsed time,
+            "thread" for the CPU time of the thread calling `play()`, or
+            "process" for the CPU time of the whole process (including e.g.
+            a background pondering thread). The CPU clocks do not advance
+            while the process waits for a core, so games that share
+            overloaded cores do not lose on time because of it.
+
+        Returns
+        ----------
+        (player, list<[(int, int),]>, str)
+            Return multiple including the winning player, the complete game
+            move history, and a string indicating the reason for losing
+            (e.g., timeout or invalid move).
+        """
+        if clock not in CLOCKS:
+            raise ValueError("Unknown clock: {}".format(clock))
+        move_history = []
+
+        timer = CLOCKS[clock]
+        time_millis = lambda: 1000 * timer()
+
+        while True:
+
+            legal_player_moves = self.get_legal_moves()
+            game_copy = self.copy()
+            wall_start = timeit.default_timer()
+            cpu_start = time.process_time()
+            move_start = time_millis()            
+            time_left = lambda : time_limit - (time_millis() - move_start)
+            
+            curr_move = self._active_player.get_move(game_copy, time_left)
+            move_end = time_left()
+
+            if move_log is not None:
+                entry = {"seat": (self.move_count & 1) + 1,
+                         "move": curr_move,
+                         "time_ms": time_limit - move_end,
+                         "wall_ms": 1000 * (timeit.default_timer() -
+                                            wall_start),
+                         "cpu_ms": 1000 * (time.process_time() - cpu_start)}
+                stats = getattr(self._active_player, "stats", None)
+                if stats is not None:
+                    entry["stats"] = stats.last
+                move_log.append(entry)
+
+            if curr_move is None:
+                curr_move = Board.NOT_MOVED
+
+            if move_end < 0:
+                return self._inactive_player, move_history, "timeout"
+
+            if curr_move not in legal_player_moves:
+                if len(legal_player_moves) > 0:
+                    return self._inactive_player, move_history, "forfeit"
+                return self._inactive_player, move_history, "illegal move"
+
+            move_history.append(list(curr_move))
+
+            self.apply_move(curr_move)
@@ -0,0 +1,250 @@
+"""Symmetry-reduced opening book for the Isolation agents.
+
+`build_book()` runs a deep search on every position of the first few plies,
+once per class of positions that are equivalent under the symmetries of the
+board, and writes the chosen moves to a compact binary file. `OpeningBook`
+maps that file into memory and answers a position with a binary search:
+
+    python opening_book.py --plies 3 --time 2000 book.bin
+
+    from game_agent import AlphaBetaPlayer
+    from opening_book import OpeningBook
+
+    player = AlphaBetaPlayer(book=OpeningBook("book.bin"))
+
+The file holds a 16-byte header (magic string, board width and height,
+maximum ply and number of entries) followed by one 10-byte record per
+position, sorted by key: the canonical Zobrist key of the position (see
+`isolation.Board.canonical_key`), the cell index of the book move in the
+canonical orientation and the depth of the search that chose it.
+"""
+import argparse
+import mmap
+import multiprocessing
+import struct
+import time
+
+from isolation import Board
+from isolation.isolation import board_geometry
+
+from game_agent import AlphaBetaPlayer, TranspositionTable
+
+HEADER = struct.Struct("<8sBBBxI")
+RECORD = struct.Struct("<QBB")
+
+
+class OpeningBook:
+    """Read-only, memory-mapped view of a book written by `build_book()`.
+
+    Opening a book costs the same for any size: only the pages holding the
+    records visited by the binary search are read from disk. A book pickles
+    as its path, so it can be handed to worker processes.
+
+    Parameters
+    ----------
+    path : str
+        The book file.
+    """
+    MAGIC = b"ISOBOOK1"
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            self._map.close()
+            raise ValueError("Not an opening book: {}".format(path))
+        magic, self.width, self.height, self.max_ply, self._count = (
+            HEADER.unpack_from(self._map))
+        if (magic != self.MAGIC or
+                len(self._map) != HEADER.size + self._count * RECORD.size):
+            self._map.close()
+            raise ValueError("Not an opening book: {}".format(path))
+        # inverse of each symmetry, to map the stored moves back
+        self._inverse = []
+        for image in board_geometry(self.width, self.height).symmetries:
+            inverse = [0] * len(image)
+            for idx, target in enumerate(image):
+                inverse[target] = idx
+            self._inverse.append(inverse)
+
+    def __len__(self):
+        return self._count
+
+    def __reduce__(self):
+        return OpeningBook, (self.path,)
+
+    def close(self):
+        """Unmap the book file. """
+        self._map.close()
+
+    def probe(self, key):
+        """Return the (cell index, depth) record of a canonical key, or None.
+        """
+        data, unpack = self._map, RECORD.unpack_from
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = unpack(data, HEADER.size + mid * RECORD.size)
+            if entry[0] < key:
+                lo = mid + 1
+            elif entry[0] > key:
+                hi = mid
+            else:
+                return entry[1], entry[2]
+        return None
+
+    def lookup(self, game):
+        """Return the book move for `game`, or None if the position is not in
+        the book.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            The position to look up.
+
+        Returns
+        -------
+        (int, int) or None
+            A legal move for the active player of `game`.
+        """
+        if (game.move_count > self.max_ply or game.width != self.width or
+                game.height != self.height):
+            return None
+        key, symmetry = game.canonical_key()
+        entry = self.probe(key)
+        if entry is None:
+            return None
+        move = game._geometry.cells[self._inverse[symmetry][entry[0]]]
+        return move if game.move_is_legal(move) else None
+
+
+def opening_positions(plies, width=7, height=7):
+    """Return one board for each class of equivalent positions reached after
+    0 to `plies` moves from the empty board, by increasing move count.
+    """
+    board = Board("player 1", "player 2", width, height)
+    level = {board.canonical_key()[0]: board}
+    positions = []
+    for ply in range(plies + 1):
+        positions.extend(level.values())
+        if ply == plies:
+            break
+        children = {}
+        for board in level.values():
+            for move in board.get_legal_moves():
+                child = board.forecast_move(move)
+                children.setdefault(child.canonical_key()[0], child)
+        level = children
+    return positions
+
+
+_worker_player = None
+
+
+def _init_worker(player):
+    global _worker_player
+    _worker_player = player
+
+
+def _search_position(task):
+    """Search one opening position with the worker's player and return its
+    (canonical key, canonical cell index, depth) record, or None.
+    """
+    board, time_limit = task
+    player = _worker_player
+    if not board.get_legal_moves():
+        return None
+    # each position is searched from scratch, so that the book does not
+    # depend on the order in which the positions reach the worker
+    reset = getattr(player, "reset", None)
+    if reset is not None:
+        reset()
+    if board.move_count & 1:
+        game = board.replace_players("opponent", player)
+    else:
+        game = board.replace_players(player, "opponent")
+    deadline = time.perf_counter() + time_limit / 1000.
+    move = player.get_move(game, lambda: 1000. * (deadline -
+                                                 time.perf_counter()))
+    if not game.move_is_legal(move):
+        return None
+    key, symmetry = board.canonical_key()
+    image = board._geometry.symmetries[symmetry]
+    depth = getattr(player, "completed_depth", 0)
+    return key, image[move[0] + move[1] * board.height], min(depth, 255)
+
+
+def build_book(path, plies=3, time_limit=1000., player=None, width=7,
+               height=7, processes=1):
+    """Search the opening positions and write the book to `path`.
+
+    Parameters
+    ----------
+    path : str
+        The book file to write.
+
+    plies : int (optional)
+        Positions with up to this many moves played are included.
+
+    time_limit : float (optional)
+        Search time (in milliseconds) for each position.
+
+    player : object (optional)
+        The agent that chooses the book moves; by default an
+        `AlphaBetaPlayer` with a transposition table, move ordering and PVS.
+        Its `completed_depth` attribute, if any, is stored with each move,
+        and its `reset()` method, if any, is called before each position.
+
+    width, height : int (optional)
+        The board size.
+
+    processes : int (optional)
+        Number of worker processes searching positions in parallel (each
+        with its own copy of `player`); None uses every CPU.
+
+    Returns
+    -------
+    int
+        The number of positions in the book.
+    """
+    if player is None:
+        player = AlphaBetaPlayer(tt=TranspositionTable(), ordering=True,
+                                 pvs=True)
+    tasks = [(board, time_limit) for board in opening_positions(
+        plies, width, height)]
+    if processes == 1:
+        _init_worker(player)
+        entries = [_search_position(task) for task in tasks]
+    else:
+        with multiprocessing.Pool(processes, _init_worker, (player,)) as pool:
+            entries = pool.map(_search_position, tasks, chunksize=1)
+    entries = sorted(entry for entry in entries if entry is not None)
+
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(OpeningBook.MAGIC, width, height, plies,
+                            len(entries)))
+        for entry in entries:
+            f.write(RECORD.pack(*entry))
+    return len(entries)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build a symmetry-reduced Isolation opening book.")
+    parser.add_argument("path", help="book file to write")
+    parser.add_argument("--plies", type=int, default=3,
+                        help="include positions with up to PLIES moves")
+    parser.add_argument("--time", type=float, default=1000.,
+                        help="search time per position in milliseconds")
+    parser.add_argument("--size", type=int, nargs=2, default=(7, 7),
+                        metavar=("WIDTH", "HEIGHT"), help="board size")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    count = build_book(args.path, args.plies, args.time,
+                       width=args.size[0], height=args.size[1],
+                       processes=args.processes)
+    print("Wrote {} positions to {} in {:.0f} s".format(
+        count, args.path, time.perf_counter() - start))
@@ -0,0 +1,149 @@
+"""Vectorized batch playouts for Monte Carlo tree search.
+
+`BatchRollout` plays a whole batch of games from one `isolation.Board`
+position at once with NumPy, so that each expansion of `MCTSPlayer` can be
+backed by many playouts for roughly the cost of one pure-Python playout:
+
+    from game_agent import MCTSPlayer
+    from rollout import BatchRollout
+
+    player = MCTSPlayer(rollout=BatchRollout(batch=128))
+"""
+import numpy as np
+
+from isolation.isolation import board_geometry
+
+
+class BatchRollout:
+    """Random (or lightly guided) playouts of a batch of games at once.
+
+    Each game of the batch is a row of a boolean array of blocked cells,
+    with cells numbered as in `isolation.Board` plus one sentinel cell that
+    is always blocked, and the players' locations are a pair of cell indices
+    per row. A precomputed table lists the knight neighbors of every cell,
+    padded with the sentinel, so that every ply of every game in the batch
+    is played with a few array operations.
+
+    Parameters
+    ----------
+    batch : int (optional)
+        Number of games played by each call to `playout()`.
+
+    policy : str (optional)
+        "random" plays uniformly random legal moves; "mobility" plays the
+        legal move with the most onward moves, breaking ties at random.
+
+    seed : int (optional)
+        Seed of the random generator, for reproducible playouts.
+    """
+    POLICIES = ("random", "mobility")
+
+    def __init__(self, batch=256, policy="random", seed=None):
+        if policy not in BatchRollout.POLICIES:
+            raise ValueError("Unknown playout policy: {}".format(policy))
+        self.batch = batch
+        self.policy = policy
+        self._rng = np.random.default_rng(seed)
+        self._tables = {}
+
+    def neighbors(self, width, height):
+        """Return the (cells + 1, 8) array of the knight neighbors of each
+        cell index, padded with the sentinel index `cells = width * height`.
+        """
+        table = self._tables.get((width, height))
+        if table is None:
+            cells = width * height
+            table = np.full((cells + 1, 8), cells, dtype=np.intp)
+            for idx, mask in enumerate(board_geometry(width, height).moves):
+                targets = [i for i in range(cells) if (mask >> i) & 1]
+                table[idx, :len(targets)] = targets
+            self._tables[width, height] = table
+        return table
+
+    def playout(self, game, player, n=None, amaf=False):
+        """Play `n` games (by default `batch`) from `game` to the end and
+        return the number of them won by `player`.
+
+        With `amaf`, return (wins, (own, other)) instead, where `own` and
+        `other` map the cell indices occupied by `player` and by its
+        opponent during the playouts to (wins, playouts): the number of
+        games in which that player moved to the cell, and how many of those
+        it won.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            The position to play from; it is not modified.
+
+        player : object
+            One of the players registered on the board.
+
+        n : int (optional)
+            Number of games to play.
+
+        amaf : bool (optional)
+            Also return the all-moves-as-first statistics of the cells.
+        """
+        n = self.batch if n is None else n
+        cells = game.width * game.height
+        table = self.neighbors(game.width, game.height)
+        rng = self._rng
+
+        bits = [(game._blocked >> i) & 1 for i in range(cells)] + [1]
+        blocked = np.tile(np.array(bits, dtype=bool), (n, 1))
+        first = game._location_index(game.active_player)
+        second = game._location_index(game.inactive_player)
+        loc = np.array([[cells if first is None else first,
+                         cells if second is None else second]] * n,
+                       dtype=np.intp)
+        placed = [first is not None, second is not None]
+
+        # column 0 holds the player to move at `game`, column 1 its opponent
+        alive = np.ones(n, dtype=bool)
+        loser = np.zeros(n, dtype=np.int8)
+        if amaf:
+            occupied = np.zeros((2, n, cells + 1), dtype=bool)
+        side = 0
+        while True:
+            rows = np.flatnonzero(alive)
+            if not len(rows):
+                break
+            if placed[side]:
+                targets = table[loc[rows, side]]
+                legal = ~blocked[rows[:, None], targets]
+                keys = rng.random(targets.shape)
+                if self.policy == "mobility":
+                    onward = ~blocked[rows[:, None, None], table[targets]]
+                    keys += onward.sum(axis=2)
+            else:
+                # a player that has not moved yet may take any open cell
+                placed[side] = True
+                targets = np.broadcast_to(np.arange(cells), (len(rows), cells))
+                legal = ~blocked[rows, :cells]
+                keys = rng.random(targets.shape)
+            keys[~legal] = -1.
+            choice = keys.argmax(axis=1)
+            moved = legal.any(axis=1)
+
+            stuck = rows[~moved]
+            alive[stuck] = False
+            loser[stuck] = side
+            rows = rows[moved]
+            moves = targets[moved, choice[moved]]
+            loc[rows, side] = moves
+            blocked[rows, moves] = True
+            if amaf:
+                occupied[side, rows, moves] = True
+            side ^= 1
+
+        side = 0 if player == game.active_player else 1
+        wins = n - int(np.count_nonzero(loser == side))
+        if not amaf:
+            return wins
+        cell_stats = []
+        for s in (side, side ^ 1):
+            games = occupied[s, :, :cells].sum(axis=0)
+            won = occupied[s, loser != s, :cells].sum(axis=0)
+            cell_stats.append({int(i): (float(won[i]), int(games[i]))
+                               for i in np.flatnonzero(games)})
+        return wins, tuple(cell_stats)
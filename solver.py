@@ -0,0 +1,232 @@
+"""Complete solver for Isolation on small boards.
+
+`solve()` computes the exact value of every position reachable from the
+empty board: whether the player to move wins, and in how many plies the game
+ends when the winner hurries and the loser holds out as long as possible.
+The positions a few plies deep are solved by a pool of worker processes,
+each memoizing its own subtree, and the results are merged into a database
+in the same format as an opening book (see `opening_book.py`), keyed by the
+canonical Zobrist key so that symmetric positions are stored once:
+
+    python solver.py --size 4 4 solved_4x4.bin
+
+    from game_agent import AlphaBetaPlayer
+    from solver import SolutionDatabase
+
+    database = SolutionDatabase("solved_4x4.bin")
+    database.value(game)                     # (True, 7): wins in 7 plies
+    player = AlphaBetaPlayer(book=database)  # plays perfectly on 4x4
+
+Each record holds the key, 1 or 0 for a win or a loss of the player to move,
+and the distance to the end of the game. Positions where the player to move
+has no legal move are not stored.
+"""
+import argparse
+import heapq
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from isolation import Board
+
+from opening_book import HEADER, RECORD, OpeningBook, opening_positions
+
+
+class SolutionDatabase(OpeningBook):
+    """Memory-mapped, read-only view of a database written by `solve()`.
+
+    `lookup()` returns an optimal move, so the database can be passed as the
+    `book` of an agent to play perfectly on the board size it was solved for.
+
+    Parameters
+    ----------
+    path : str
+        The database file.
+    """
+    MAGIC = b"ISOSOLV1"
+
+    def value(self, game):
+        """Return `(win, distance)` for the player to move in `game`, or None
+        if the position is not in the database.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            The position to look up.
+
+        Returns
+        -------
+        (bool, int) or None
+            Whether the player to move wins with perfect play, and the number
+            of plies left until the end of the game.
+        """
+        if game.width != self.width or game.height != self.height:
+            return None
+        if not game.get_legal_moves():
+            return False, 0
+        entry = self.probe(game.canonical_key()[0])
+        if entry is None:
+            return None
+        return bool(entry[0]), entry[1]
+
+    def lookup(self, game):
+        """Return an optimal move for the player to move in `game`: the
+        fastest win or, in a lost position, the longest resistance. Returns
+        None if the position is not in the database.
+        """
+        if game.width != self.width or game.height != self.height:
+            return None
+        best, best_rank = None, None
+        # equally good moves are broken by coordinates, for repeatable play
+        for move in sorted(game.get_legal_moves()):
+            with game.pushed(move):
+                value = self.value(game)
+            if value is None:
+                return None
+            rank = _rank((not value[0], value[1] + 1))
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+
+def _rank(value):
+    # wins beat losses; the sooner the win, the later the loss, the better
+    win, distance = value
+    return (win, -distance if win else distance)
+
+
+def _solve(board, memo, records, split=None, roots=None):
+    """Return the (win, distance) value of `board` for its player to move,
+    memoizing the value of each non-terminal position by Zobrist key and
+    appending its (canonical key, win, distance) record to `records`.
+
+    When `roots` is given, the positions reached after `split` moves are not
+    searched: their values are looked up in `roots` by canonical key.
+    """
+    if roots is not None and board.move_count == split:
+        return roots[board.canonical_key()[0]]
+    key = board.hash()
+    value = memo.get(key)
+    if value is not None:
+        return value
+    value = False, 0
+    best_rank = None
+    for move in board.get_legal_moves():
+        board.apply_move(move)
+        try:
+            win, distance = _solve(board, memo, records, split, roots)
+        finally:
+            board.undo_move()
+        child = (not win, distance + 1)
+        rank = _rank(child)
+        if best_rank is None or rank > best_rank:
+            value, best_rank = child, rank
+    if best_rank is not None:
+        memo[key] = value
+        records.append((board.canonical_key()[0], int(value[0]), value[1]))
+    return value
+
+
+def _solve_subtree(task):
+    """Solve the subtree of one position and write its sorted records to a
+    file. Returns the canonical key and the value of the position.
+    """
+    board, path = task
+    records = []
+    value = _solve(board, {}, records)
+    records.sort()
+    with open(path, "wb") as f:
+        for record in records:
+            f.write(RECORD.pack(*record))
+    return board.canonical_key()[0], value
+
+
+def _read_records(path):
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(RECORD.size * 4096)
+            if not chunk:
+                return
+            yield from RECORD.iter_unpack(chunk)
+
+
+def solve(path, width=4, height=4, split=2, processes=None):
+    """Solve every position reachable on an empty `width` x `height` board
+    and write the database to `path`.
+
+    Parameters
+    ----------
+    path : str
+        The database file to write.
+
+    width, height : int (optional)
+        The board size.
+
+    split : int (optional)
+        The positions reached after `split` moves (one per symmetry class)
+        are the tasks of the worker processes.
+
+    processes : int (optional)
+        Number of worker processes; None uses every CPU, and 1 solves every
+        subtree in this process.
+
+    Returns
+    -------
+    (bool, int)
+        The value of the empty board for the first player.
+    """
+    tmpdir = tempfile.mkdtemp()
+    try:
+        tasks = [(board, os.path.join(tmpdir, "part-{}".format(i)))
+                 for i, board in enumerate(
+                     b for b in opening_positions(split, width, height)
+                     if b.move_count == split)]
+        if processes == 1:
+            results = [_solve_subtree(task) for task in tasks]
+        else:
+            with multiprocessing.Pool(processes) as pool:
+                results = pool.map(_solve_subtree, tasks, chunksize=1)
+
+        records = []
+        value = _solve(Board("player 1", "player 2", width, height), {},
+                       records, split, dict(results))
+        records.sort()
+
+        # merge the sorted parts, keeping one record per canonical key
+        parts = [records] + [_read_records(p) for _, p in tasks]
+        count = 0
+        last = None
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(SolutionDatabase.MAGIC, width, height,
+                                min(width * height, 255), 0))
+            for record in heapq.merge(*parts):
+                if record[0] != last:
+                    f.write(RECORD.pack(*record))
+                    last = record[0]
+                    count += 1
+            f.seek(0)
+            f.write(HEADER.pack(SolutionDatabase.MAGIC, width, height,
+                                min(width * height, 255), count))
+    finally:
+        shutil.rmtree(tmpdir)
+    return value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Solve Isolation on a small board.")
+    parser.add_argument("path", help="database file to write")
+    parser.add_argument("--size", type=int, nargs=2, default=(4, 4),
+                        metavar=("WIDTH", "HEIGHT"), help="board size")
+    parser.add_argument("--split", type=int, default=2,
+                        help="ply of the positions solved by the workers")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    win, distance = solve(args.path, args.size[0], args.size[1], args.split,
+                          args.processes)
+    print("The first player {} in {} plies ({:.0f} s)".format(
+        "wins" if win else "loses", distance, time.perf_counter() - start))
@@ -0,0 +1,60 @@
+"""Unit tests for the competition agent"""
+
+import timeit
+import unittest
+
+import isolation
+import game_agent
+
+from competition_agent import CustomPlayer, symmetry_tables
+
+
+class CustomPlayerTest(unittest.TestCase):
+    """Unit tests for the symmetry-aware position cache of CustomPlayer"""
+
+    def setUp(self):
+        self.player = CustomPlayer()
+        self.player.time_left = lambda: 1000.
+
+    def test_symmetry_tables(self):
+        tables = symmetry_tables(7, 7)
+        self.assertIs(tables, symmetry_tables(7, 7))
+        self.assertEqual(len(tables.enter[0][0]), 8)
+        for image, inverse in zip(isolation.Board(1, 2)._geometry.symmetries,
+                                  tables.inverse):
+            self.assertEqual([inverse[idx] for idx in image],
+                             list(range(49)))
+
+    def test_mirrored_hit(self):
+        game = isolation.Board(self.player, "opponent")
+        mirror = isolation.Board(self.player, "opponent")
+        for r, c in [(3, 3), (2, 4)]:
+            game.apply_move((r, c))
+            # reflect across the vertical axis of the 7x7 board
+            mirror.apply_move((r, 6 - c))
+        r, c = self.player.alphabeta(game, 3)
+        hits = self.player.mirrortable.hits
+        # the root of the mirrored search is answered from the cache
+        self.assertEqual(self.player.alphabeta(mirror, 3), (r, 6 - c))
+        self.assertEqual(self.player.mirrortable.hits, hits + 1)
+
+    def test_cache_kept_across_iterations(self):
+        stats = game_agent.SearchStats()
+        self.player.stats = stats
+        game = isolation.Board("opponent", self.player)
+        game.apply_move((3, 3))
+        game.apply_move((2, 4))
+        game.apply_move((1, 1))
+        deadline = timeit.default_timer() + .05
+        move = self.player.get_move(
+            game, lambda: 1000 * (deadline - timeit.default_timer()))
+        depth = stats.moves[-1]["depth"]
+        # a shallower search of the same position is a single cache hit
+        self.player.time_left = lambda: 1000.
+        self.player._stats = stats = game_agent.SearchStats()
+        stats.begin_move(lambda: 1000.)
+        self.assertEqual(self.player.alphabeta(game, depth - 1), move)
+        self.assertEqual(stats.nodes, 1)
+
+if __name__ == '__main__':
+    unittest.main()
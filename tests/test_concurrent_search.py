@@ -0,0 +1,155 @@
+"""Unit tests for the searches that run concurrently with an agent"""
+
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+import time
+import timeit
+import unittest
+
+import isolation
+import concurrent_search
+import game_agent
+
+# stores an entry from the worker of a pool forked before the table, and so
+# before the resource tracker of the main process, was created
+ATTACH_SCRIPT = """
+import multiprocessing
+import concurrent_search
+import game_agent
+
+def store(tt):
+    tt.store(5, 3, 1.5, game_agent.EXACT, (1, 2))
+    tt.close()
+
+if __name__ == "__main__":
+    with multiprocessing.get_context("fork").Pool(1) as pool:
+        tt = concurrent_search.SharedTranspositionTable(size=16)
+        pool.map(store, [tt])
+    print(tt.probe(5))
+    tt.unlink()
+"""
+
+
+class PondererTest(unittest.TestCase):
+    """Unit tests for searching on the opponent's time"""
+
+    def setUp(self):
+        self.ponder = concurrent_search.Ponderer()
+        self.player = game_agent.AlphaBetaPlayer(ordering=True,
+                                                 ponder=self.ponder)
+        self.game = isolation.Board(self.player, "opponent")
+        self.game.apply_move((3, 3))
+        self.game.apply_move((2, 4))
+
+    def tearDown(self):
+        self.ponder.stop()
+
+    def get_move(self, game):
+        deadline = timeit.default_timer() + .05
+        return self.player.get_move(
+            game, lambda: 1000 * (deadline - timeit.default_timer()))
+
+    def test_hit(self):
+        move = self.get_move(self.game)
+        predicted = self.ponder.board.copy()
+        self.assertEqual(predicted.get_player_location(self.player), move)
+        self.assertIs(predicted.active_player, self.player)
+        time.sleep(.05)
+        self.assertIn(self.get_move(predicted), predicted.get_legal_moves())
+        self.assertEqual((self.ponder.hits, self.ponder.misses), (1, 0))
+
+    def test_miss(self):
+        move = self.get_move(self.game)
+        predicted = self.ponder.board.get_player_location("opponent")
+        board = self.game.forecast_move(move)
+        board.apply_move([m for m in board.get_legal_moves()
+                          if m != predicted][0])
+        self.assertIn(self.get_move(board), board.get_legal_moves())
+        self.assertEqual((self.ponder.hits, self.ponder.misses), (0, 1))
+
+
+class ParallelSearchTest(unittest.TestCase):
+    """Unit tests for the root-split parallel search"""
+
+    def setUp(self):
+        self.parallel = concurrent_search.ParallelSearch(processes=2)
+        self.player = game_agent.AlphaBetaPlayer(parallel=self.parallel)
+        self.game = isolation.Board(self.player, "opponent")
+        self.game.apply_move((3, 3))
+        self.game.apply_move((2, 4))
+
+    def tearDown(self):
+        self.parallel.close()
+
+    def test_matches_serial(self):
+        self.player.time_left = lambda: 1e9
+        move, value = self.parallel.search(self.player, self.game, 3,
+                                           self.player.time_left)
+        values = [self.player.move_value(self.game, m, 3)
+                  for m in self.game.get_legal_moves()]
+        self.assertEqual(value, max(values))
+        self.assertEqual(self.player.move_value(self.game, move, 3), value)
+
+    def test_speedup_starts_cold(self):
+        self.player.tt = game_agent.TranspositionTable(2 ** 12)
+        for _ in range(2):
+            serial, parallel, speedup, serial_nodes, parallel_nodes = (
+                self.parallel.speedup(self.player, self.game, 3))
+            self.assertAlmostEqual(speedup, serial / parallel)
+            # without warm tables both runs search the whole tree
+            self.assertLess(parallel_nodes, 4 * serial_nodes)
+            self.assertLess(serial_nodes, 4 * parallel_nodes)
+
+    def test_get_move(self):
+        deadline = timeit.default_timer() + .1
+        time_left = lambda: 1000 * (deadline - timeit.default_timer())
+        move = self.player.get_move(self.game, time_left)
+        self.assertIn(move, self.game.get_legal_moves())
+        self.assertGreater(time_left(), 0)
+
+
+class SharedTranspositionTableTest(unittest.TestCase):
+    """Unit tests for the shared-memory transposition table"""
+
+    def setUp(self):
+        self.tt = concurrent_search.SharedTranspositionTable(size=16)
+
+    def tearDown(self):
+        self.tt.unlink()
+
+    def test_store_and_attach(self):
+        self.tt.store(5, 3, float("-inf"), game_agent.UPPER, (6, 2))
+        self.tt.store(21, 2, 1.5, game_agent.EXACT, (0, 0))
+        other = pickle.loads(pickle.dumps(self.tt))
+        self.assertEqual(other.name, self.tt.name)
+        self.assertEqual(other.probe(5),
+                         (3, float("-inf"), game_agent.UPPER, (6, 2)))
+        self.assertIsNone(other.probe(21))
+        other.new_search()
+        self.assertEqual(self.tt.generation, 1)
+        other.close()
+
+    @unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(),
+                         "needs the fork start method")
+    def test_worker_exit_keeps_block(self):
+        # a worker with its own resource tracker must not destroy the block
+        # when it exits; only the creator's unlink() does
+        result = subprocess.run(
+            [sys.executable, "-c", ATTACH_SCRIPT], capture_output=True,
+            text=True, timeout=60,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(result.stderr, "")
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout.strip(), "(3, 1.5, 0, (1, 2))")
+
+    def test_torn_entry_is_ignored(self):
+        self.tt.store(7, 4, 2., game_agent.LOWER, (1, 1))
+        self.tt._words[1 + 3 * 7 + 2] ^= 1
+        self.assertIsNone(self.tt.probe(7))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,14 +3,77 @@ tests to run and debug your minimax and alphabeta agents locally.  The test
 cases used by the project assistant are not public.
 """
 
+import random
+import timeit
 import unittest
 
 import isolation
 import game_agent
 
+from sample_players import improved_score
+
 from importlib import reload
 
 
+class FixedDepth(game_agent.TimeManager):
+    """Time manager that ends iterative deepening after `depth` plies, so that
+    search modes can be compared on the same tree.
+    """
+
+    def __init__(self, depth):
+        super().__init__()
+        self.depth = depth
+
+    def end_iteration(self, time_left, depth, best_move):
+        super().end_iteration(time_left, depth, best_move)
+        return depth >= self.depth
+
+
+def seeded_positions(count):
+    """Return `count` positions reached by 4 to 6 random moves, one per seed;
+    the searcher has the first seat in some and the second in others.
+    """
+    positions = []
+    for seed in range(count):
+        rng = random.Random(seed)
+        board = isolation.Board("p1", "p2")
+        for _ in range(4 + seed % 3):
+            board.apply_move(rng.choice(sorted(board.get_legal_moves())))
+        positions.append(board)
+    return positions
+
+
+def seat(board, player):
+    """Return a copy of `board` with `player` to move. """
+    if board.move_count & 1:
+        return board.replace_players("opponent", player)
+    return board.replace_players(player, "opponent")
+
+
+def fixed_depth_search(board, depth, **options):
+    """Search `board` to `depth` plies with get_move() and return the move
+    and the SearchStats record of the search.
+    """
+    player = game_agent.AlphaBetaPlayer(
+        score_fn=improved_score, time_manager=FixedDepth(depth),
+        stats=game_agent.SearchStats(), **options)
+    game = seat(board, player)
+    random.seed(0)
+    move = player.get_move(game, lambda: 1e9)
+    return move, player.stats.last
+
+
+def root_values(board, depth):
+    """Return the value of each legal move of `board` searched by plain
+    alpha-beta to `depth` plies.
+    """
+    plain = game_agent.AlphaBetaPlayer(score_fn=improved_score)
+    plain.time_left = lambda: 1e9
+    game = seat(board, plain)
+    return {move: plain.move_value(game, move, depth)
+            for move in game.get_legal_moves()}
+
+
 class IsolationTest(unittest.TestCase):
     """Unit tests for isolation agents"""
 
@@ -25,5 +88,352 @@ class IsolationTest(unittest.TestCase):
         self.fail("Hello, World!")
 
 
+class TranspositionTableTest(unittest.TestCase):
+    """Unit tests for the alpha-beta transposition table"""
+
+    def test_depth_preferred(self):
+        tt = game_agent.TranspositionTable(4, "depth")
+        tt.store(1, 5, 1., game_agent.EXACT, (0, 0))
+        tt.store(5, 2, 2., game_agent.EXACT, (1, 1))
+        self.assertEqual(tt.probe(1), (5, 1., game_agent.EXACT, (0, 0)))
+        self.assertIsNone(tt.probe(5))
+        tt.new_search()
+        tt.store(5, 2, 2., game_agent.LOWER, (1, 1))
+        self.assertEqual(tt.probe(5), (2, 2., game_agent.LOWER, (1, 1)))
+        self.assertEqual(tt.hit_rate(), 2 / 3)
+
+    def test_two_tier(self):
+        tt = game_agent.TranspositionTable(4, "two-tier")
+        tt.store(0, 5, 1., game_agent.EXACT, (0, 0))
+        tt.store(4, 2, 2., game_agent.UPPER, (1, 1))
+        tt.store(8, 1, 3., game_agent.EXACT, (2, 2))
+        self.assertIsNotNone(tt.probe(0))
+        self.assertIsNone(tt.probe(4))
+        self.assertEqual(tt.probe(8), (1, 3., game_agent.EXACT, (2, 2)))
+
+    def test_alphabeta_with_table(self):
+        player = game_agent.AlphaBetaPlayer(
+            tt=game_agent.TranspositionTable(2 ** 12))
+        game = isolation.Board(player, self.__class__)
+        game.apply_move((3, 3))
+        game.apply_move((0, 0))
+        deadline = timeit.default_timer() + 0.1
+        move = player.get_move(
+            game, lambda: 1000 * (deadline - timeit.default_timer()))
+        self.assertIn(move, game.get_legal_moves())
+        self.assertGreater(player.tt.hit_rate(), 0)
+
+    def test_both_seats_share_table(self):
+        # values are cached from the player's point of view, so a table
+        # reused from the other seat must not return values of the wrong sign
+        player = game_agent.AlphaBetaPlayer(
+            score_fn=improved_score, tt=game_agent.TranspositionTable(2 ** 12))
+        plain = game_agent.AlphaBetaPlayer(score_fn=improved_score)
+        player.time_left = plain.time_left = lambda: 1e9
+        for moves in ([(3, 3), (2, 1)], [(0, 0), (6, 6), (1, 2), (5, 4)]):
+            for seat in (1, 2):
+                values = {}
+                for searcher in (player, plain):
+                    if seat == 1:
+                        game = isolation.Board(searcher, "opponent")
+                    else:
+                        game = isolation.Board("opponent", searcher)
+                    for move in moves:
+                        game.apply_move(move)
+                    values[searcher] = [
+                        searcher.move_value(game, move, 4)
+                        for move in sorted(game.get_legal_moves())]
+                self.assertEqual(values[player], values[plain])
+
+
+class MoveOrderingTest(unittest.TestCase):
+    """Unit tests for PV, killer and history move ordering"""
+
+    def test_fixed_depth(self):
+        # ordering may change which of several equal moves is chosen, but not
+        # the root value, and must not search more nodes than the plain order
+        for board in seeded_positions(6):
+            values = root_values(board, 5)
+            plain_move, plain = fixed_depth_search(board, 5)
+            move, ordered = fixed_depth_search(board, 5, ordering=True)
+            self.assertIn(move, board.get_legal_moves())
+            self.assertEqual(values[move], max(values.values()))
+            self.assertEqual(values[plain_move], max(values.values()))
+            self.assertEqual(ordered["depth"], 5)
+            self.assertLessEqual(ordered["nodes"], plain["nodes"])
+
+
+class PrincipalVariationSearchTest(unittest.TestCase):
+    """Unit tests for principal variation search and aspiration windows"""
+
+    def test_fixed_depth(self):
+        # zero and aspiration windows only cause re-searches, so the root
+        # value is unchanged; a single position can need more nodes, but
+        # over all of them each mode must not search more than the one it
+        # refines (aspiration windows need a table to keep failed tries)
+        modes = {
+            "ordering": dict(ordering=True),
+            "pvs": dict(ordering=True, pvs=True),
+            "ordering+tt": dict(ordering=True, tt=True),
+            "pvs+tt": dict(ordering=True, pvs=True, tt=True),
+            "aspiration+tt": dict(ordering=True, pvs=True, tt=True,
+                                  aspiration=(1., 4.)),
+        }
+        nodes = dict.fromkeys(modes, 0)
+        for board in seeded_positions(10):
+            values = root_values(board, 6)
+            _, plain = fixed_depth_search(board, 6)
+            for name, options in modes.items():
+                if options.get("tt"):
+                    options = dict(options, tt=game_agent.TranspositionTable())
+                move, record = fixed_depth_search(board, 6, **options)
+                self.assertIn(move, board.get_legal_moves())
+                self.assertEqual(values[move], max(values.values()))
+                self.assertLessEqual(record["nodes"], plain["nodes"])
+                nodes[name] += record["nodes"]
+        self.assertLessEqual(nodes["pvs"], nodes["ordering"])
+        self.assertLessEqual(nodes["pvs+tt"], nodes["ordering+tt"])
+        self.assertLessEqual(nodes["aspiration+tt"], nodes["pvs+tt"])
+
+
+class TimeManagerTest(unittest.TestCase):
+    """Unit tests for the iterative-deepening time manager"""
+
+    def test_poll_and_prediction(self):
+        clock = [100.]
+        time_left = lambda: clock[0]
+        tm = game_agent.TimeManager(stable_iterations=2)
+        tm.start(time_left, 10.)
+        for nodes, cost in [(10, 1.), (80, 8.)]:
+            for _ in range(nodes):
+                clock[0] -= cost / nodes
+                tm.countdown -= 1
+                if tm.countdown <= 0:
+                    tm.poll(time_left)
+            self.assertFalse(tm.end_iteration(time_left, 1, (0, 0)))
+        self.assertEqual(tm.nodes(), 90)
+        self.assertAlmostEqual(tm.branching_factor(), 8.)
+        # the next iteration needs about 64ms but only 81ms remain
+        self.assertTrue(tm.should_start(time_left))
+        clock[0] = 50.
+        self.assertFalse(tm.should_start(time_left))
+        self.assertTrue(tm.end_iteration(time_left, 3, (0, 0)))
+        clock[0] = 5.
+        tm.countdown = 1
+        with self.assertRaises(game_agent.SearchTimeout):
+            tm.countdown -= 1
+            tm.poll(time_left)
+
+
+class SearchStatsTest(unittest.TestCase):
+    """Unit tests for per-move search statistics"""
+
+    def test_play_collects_stats(self):
+        player1 = game_agent.AlphaBetaPlayer(stats=game_agent.SearchStats())
+        player2 = game_agent.MinimaxPlayer(search_depth=1)
+        game = isolation.Board(player1, player2, 5, 5)
+        move_log = []
+        game.play(time_limit=50, move_log=move_log)
+        own = [entry for entry in move_log if entry["seat"] == 1]
+        self.assertTrue(all("stats" not in entry for entry in move_log
+                            if entry["seat"] == 2))
+        record = own[0]["stats"]
+        self.assertEqual(record["move"], own[0]["move"])
+        self.assertGreater(record["nodes"], record["leaves"])
+        self.assertGreaterEqual(record["depth"], 1)
+        self.assertEqual(len(player1.stats.moves), len(own))
+
+
+class EndgameSolverTest(unittest.TestCase):
+    """Unit tests for the separated-regions endgame solver"""
+
+    def setUp(self):
+        self.solver = game_agent.EndgameSolver()
+        self.player = game_agent.AlphaBetaPlayer(endgame=self.solver)
+        self.game = isolation.Board(self.player, "opponent", 5, 5)
+        for move in [(4, 0), (3, 1), (3, 2), (2, 3), (1, 1)]:
+            self.game.apply_move(move)
+
+    def test_partition(self):
+        self.assertFalse(game_agent.is_partitioned(self.game))
+        self.game.apply_move((4, 4))
+        self.assertTrue(game_agent.is_partitioned(self.game))
+        self.assertEqual(self.solver.longest_path(self.game, self.player), 18)
+        self.assertEqual(self.solver.longest_path(self.game, "opponent"), 0)
+
+    def test_plays_longest_path(self):
+        self.game.apply_move((4, 4))
+        move = self.player.get_move(self.game, lambda: 1000.)
+        self.assertEqual(self.solver.best_move(self.game)[1], 18)
+        board = self.game.forecast_move(move)
+        self.assertEqual(self.solver.longest_path(board, self.player), 17)
+
+
+class MCTSPlayerTest(unittest.TestCase):
+    """Unit tests for the Monte Carlo tree search agent"""
+
+    def test_tree_reuse(self):
+        player = game_agent.MCTSPlayer(iterations=300)
+        game = isolation.Board(player, "opponent", 5, 5)
+        game.apply_move((2, 2))
+        game.apply_move((0, 0))
+        move = player.get_move(game, lambda: 1000.)
+        self.assertIn(move, game.get_legal_moves())
+        self.assertEqual(player.root.visitcount, 300)
+        self.assertEqual(move, max(player.root.child,
+                                   key=lambda n: n.visitcount).move)
+
+        node = [n for n in player.root.child if n.move == move][0]
+        reply = max(node.child, key=lambda n: n.visitcount)
+        game.apply_move(move)
+        game.apply_move(reply.move)
+        visits = reply.visitcount
+        self.assertGreater(visits, 0)
+        self.assertIn(player.get_move(game, lambda: 1000.),
+                      game.get_legal_moves())
+        self.assertIs(player.root, reply)
+        self.assertEqual(reply.visitcount, visits + 300)
+
+    def test_tree_size_cap(self):
+        player = game_agent.MCTSPlayer(iterations=500, max_nodes=100)
+        game = isolation.Board(player, "opponent")
+        game.apply_move((3, 3))
+        game.apply_move((2, 4))
+        player.get_move(game, lambda: 1000.)
+        self.assertEqual(player.root.visitcount, 500)
+        self.assertEqual(player.root.size, 100)
+        nodes, stack = 0, [player.root]
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            self.assertEqual(node.size, 1 + sum(n.size for n in node.child))
+            stack.extend(node.child)
+        self.assertEqual(nodes, 100)
+
+    def test_full_game_in_time(self):
+        # the tree kept between moves, and its AMAF statistics with RAVE,
+        # must not make the garbage collector pause a move past the limit
+        for player in (game_agent.MCTSPlayer(),
+                       game_agent.MCTSPlayer(rave=300)):
+            game = isolation.Board(
+                player, game_agent.AlphaBetaPlayer(score_fn=improved_score))
+            move_log = []
+            game.play(move_log=move_log)
+            for entry in move_log:
+                if entry["seat"] == 1:
+                    self.assertLess(entry["time_ms"],
+                                    isolation.isolation.TIME_LIMIT_MILLIS)
+
+    def test_rave(self):
+        for pool in (None, game_agent.NodePool(capacity=5000)):
+            player = game_agent.MCTSPlayer(iterations=300, pool=pool, rave=300)
+            game = isolation.Board(player, "opponent", 5, 5)
+            game.apply_move((2, 2))
+            game.apply_move((0, 0))
+            self.assertIn(player.get_move(game, lambda: 1000.),
+                          game.get_legal_moves())
+            # RAVE always searches a pool; every playout through a child also
+            # counts for its AMAF value
+            pool = player.pool
+            self.assertIsNotNone(pool)
+            self.assertIsNone(player.root)
+            for child in range(pool.first[0], pool.first[0] + pool.count[0]):
+                self.assertGreaterEqual(pool.amaf_visits[child],
+                                        pool.visits[child])
+        with self.assertRaises(ValueError):
+            game_agent.MCTSPlayer(rave=0)
+
+
+class NodePoolTest(unittest.TestCase):
+    """Unit tests for the array-backed MCTS node store"""
+
+    def test_reroot_keeps_most_visited(self):
+        pool = game_agent.NodePool(capacity=16)
+        self.assertTrue(pool.expand(0, [10, 11, 12]))
+        for child in (1, 2):
+            self.assertTrue(pool.expand(child, [20, 21, 22]))
+        self.assertFalse(pool.expand(3, list(range(10))))
+        self.assertEqual(pool.size, 10)
+        for node, result in [(4, 1.), (4, 0.), (7, 1.), (3, 0.)]:
+            pool.backpropagate(node, result)
+        # UCB1 values: 1/2 + sqrt(2 ln 4 / 2) for node 1, sqrt(2 ln 4) for 2, 3
+        self.assertEqual(pool.select(0), 1)
+        self.assertEqual(pool.best_child(0), 1)
+        self.assertEqual((pool.visits[0], pool.wins[0], pool.wins[1]),
+                         (4, 3., 1.))
+
+        pool.reroot(0, limit=7)
+        self.assertEqual(pool.size, 7)
+        self.assertEqual(pool.find_child(pool.find_child(0, 10), 20), 4)
+        self.assertEqual(pool.first[pool.find_child(0, 11)], -1)
+        self.assertEqual(pool.visits[pool.find_child(0, 11)], 1)
+
+    def test_amaf_backpropagation(self):
+        pool = game_agent.NodePool(capacity=16)
+        pool.expand(0, [10, 11, 12])
+        pool.expand(1, [20, 21])
+        # the player who moved to node 5 won, and its opponent had moved to
+        # cell 12 in the playout
+        pool.backpropagate(5, 1., 1, ({}, {12: (0., 1)}))
+        self.assertEqual(list(pool.amaf_visits[:6]), [0, 1, 0, 1, 0, 1])
+        self.assertEqual(list(pool.amaf_wins[:6]), [0., 0., 0., 0., 0., 1.])
+        # unvisited children come first, by AMAF value
+        self.assertEqual(pool.select(0, rave=100), 2)
+
+    def test_wide_node(self):
+        # the first move of a 16x16 board has 256 children
+        pool = game_agent.NodePool(capacity=512)
+        self.assertTrue(pool.expand(0, list(range(256))))
+        self.assertEqual(pool.count[0], 256)
+        self.assertEqual(pool.find_child(0, 255), 256)
+        pool.backpropagate(256, 1.)
+        self.assertEqual(pool.best_child(0), 256)
+
+    def test_player_within_capacity(self):
+        pool = game_agent.NodePool(capacity=500)
+        player = game_agent.MCTSPlayer(iterations=2000, pool=pool)
+        game = isolation.Board(player, "opponent")
+        game.apply_move((3, 3))
+        game.apply_move((2, 4))
+        move = player.get_move(game, lambda: 1000.)
+        self.assertIn(move, game.get_legal_moves())
+        self.assertLessEqual(pool.size, 500)
+        game.apply_move(move)
+        game.apply_move(game.get_legal_moves()[0])
+        player.iterations = 1
+        player.get_move(game, lambda: 1000.)
+        self.assertGreaterEqual(pool.visits[0], 1)
+
+    def test_full_pool_near_threshold(self):
+        # compacting 300 nodes is first assumed to take 0.6ms, more than the
+        # time left above the threshold
+        pool = game_agent.NodePool(capacity=300)
+        player = game_agent.MCTSPlayer(iterations=2000, pool=pool,
+                                       stats=game_agent.SearchStats())
+        game = isolation.Board(player, "opponent")
+        game.apply_move((3, 3))
+        game.apply_move((2, 4))
+        clock = player.TIMER_THRESHOLD + 0.5
+        move = player.get_move(game, lambda: clock)
+        self.assertIn(move, game.get_legal_moves())
+        self.assertLess(player.stats.last["nodes"], 2000)
+        self.assertGreater(pool.size, 150)
+        # the tree is not reused when there is no time to reroot it
+        node = pool.best_child(pool.find_child(0, move[0] + move[1] * 7))
+        self.assertGreater(node, 0)
+        reply = game._geometry.cells[pool.move[node]]
+        game.apply_move(move)
+        game.apply_move(reply)
+        move = player.get_move(game, lambda: clock)
+        self.assertEqual(pool.visits[0], player.stats.last["nodes"])
+        # with time to spare the pool is compacted and the search goes on
+        game.apply_move(move)
+        game.apply_move(game.get_legal_moves()[0])
+        player.get_move(game, lambda: 1000.)
+        self.assertEqual(player.stats.last["nodes"], 2000)
+        self.assertGreater(pool.visits[0], 2000)
+        self.assertLessEqual(pool.size, 300)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,157 @@
+"""Unit tests for the bitboard implementation of isolation.Board"""
+
+import pickle
+import random
+import time
+import unittest
+
+import isolation
+
+from isolation.isolation import board_geometry
+
+
+class SleepingPlayer:
+    """Takes 30 ms of wall-clock time, but no CPU time, for every move"""
+
+    def get_move(self, game, time_left):
+        time.sleep(.03)
+        moves = sorted(game.get_legal_moves())
+        return moves[0] if moves else (-1, -1)
+
+
+class BoardTest(unittest.TestCase):
+    """Unit tests for the isolation game board"""
+
+    def setUp(self):
+        self.player1 = "Player1"
+        self.player2 = "Player2"
+        self.game = isolation.Board(self.player1, self.player2)
+
+    def test_knight_masks(self):
+        geometry = board_geometry(7, 7)
+        self.assertIs(geometry, board_geometry(7, 7))
+        self.assertEqual(bin(geometry.moves[0]).count("1"), 2)
+        self.assertEqual(bin(geometry.moves[3 + 3 * 7]).count("1"), 8)
+
+    def test_legal_moves(self):
+        self.assertEqual(len(self.game.get_legal_moves()), 49)
+        self.game.apply_move((3, 3))
+        self.game.apply_move((0, 0))
+        self.assertEqual(sorted(self.game.get_legal_moves()),
+                         [(1, 2), (1, 4), (2, 1), (2, 5),
+                          (4, 1), (4, 5), (5, 2), (5, 4)])
+        self.game.apply_move((1, 2))
+        self.assertEqual(self.game.get_legal_moves(), [(2, 1)])
+        self.assertFalse(self.game.move_is_legal((1, 2)))
+
+    def test_decoded_cache_is_bounded(self):
+        # only knight-move masks are cached, never blank-space masks
+        geometry = board_geometry(5, 6)
+        for seed in range(50):
+            rng = random.Random(seed)
+            game = isolation.Board(self.player1, self.player2, 5, 6)
+            moves = game.get_legal_moves()
+            while moves:
+                size = len(geometry.decoded)
+                self.assertEqual(len(game.get_blank_spaces()),
+                                 30 - game.move_count)
+                self.assertEqual(len(geometry.decoded), size)
+                game.apply_move(rng.choice(sorted(moves)))
+                moves = game.get_legal_moves()
+        self.assertLessEqual(len(geometry.decoded), 256 * 30)
+        for mask in geometry.decoded:
+            self.assertTrue(any(mask & ~moves == 0
+                                for moves in geometry.moves))
+
+    def test_copy_is_independent(self):
+        self.game.apply_move((3, 3))
+        board = self.game.forecast_move((0, 0))
+        self.assertEqual(self.game.get_player_location(self.player2), None)
+        self.assertEqual(board.get_player_location(self.player2), (0, 0))
+        self.assertEqual(board.move_count, 2)
+        self.assertEqual(board.active_player, self.player1)
+
+    def test_undo_move(self):
+        self.game.apply_move((3, 3))
+        before = (self.game._board_state, self.game.active_player,
+                  self.game.move_count)
+        with self.game.pushed((0, 0)):
+            self.game.apply_move((1, 5))
+            self.assertEqual(self.game.move_count, 3)
+            self.game.undo_move()
+        self.assertEqual((self.game._board_state, self.game.active_player,
+                          self.game.move_count), before)
+
+    def test_zobrist_hash(self):
+        empty = self.game.hash()
+        opponent = [(6, 6), (4, 5), (6, 4), (5, 6)]
+        boards = []
+        for path in ([(0, 0), (2, 1), (3, 3), (1, 2)],
+                     [(3, 3), (2, 1), (0, 0), (1, 2)]):
+            board = self.game.copy()
+            for move, reply in zip(path, opponent):
+                board.apply_move(move)
+                board.apply_move(reply)
+            boards.append(board)
+        self.assertEqual(boards[0], boards[1])
+        self.assertEqual(hash(boards[0]), hash(boards[1]))
+        boards[0].undo_move()
+        self.assertNotEqual(boards[0], boards[1])
+        self.assertNotEqual(boards[0].hash(), boards[1].hash())
+        for _ in range(7):
+            boards[0].undo_move()
+        self.assertEqual(boards[0].hash(), empty)
+
+    def test_replace_players_and_pickle(self):
+        self.game.apply_move((3, 3))
+        board = pickle.loads(pickle.dumps(self.game.replace_players(1, 2)))
+        self.assertEqual(board, self.game)
+        self.assertEqual(board.active_player, 2)
+        self.assertEqual(board.get_player_location(1), (3, 3))
+        board.apply_move((0, 0))
+        self.assertEqual(sorted(board.get_legal_moves()), sorted(
+            self.game.forecast_move((0, 0)).get_legal_moves()))
+
+    def test_symmetric_keys(self):
+        game = self.game
+        mirror = isolation.Board(self.player1, self.player2)
+        for move in [(0, 1), (2, 3), (1, 3)]:
+            game.apply_move(move)
+            # reflect across the anti-diagonal of the 7x7 board
+            mirror.apply_move((6 - move[1], 6 - move[0]))
+        keys = game.symmetric_keys()
+        self.assertEqual(len(keys), 8)
+        self.assertEqual(keys[0], game.hash())
+        self.assertEqual(sorted(keys), sorted(mirror.symmetric_keys()))
+        self.assertEqual(game.canonical_key()[0], mirror.canonical_key()[0])
+        self.assertNotEqual(game.hash(), mirror.hash())
+
+    def test_play_clocks(self):
+        players = SleepingPlayer(), SleepingPlayer()
+        game = isolation.Board(*players, width=4, height=4)
+        self.assertEqual(game.copy().play(time_limit=20),
+                         (players[1], [], "timeout"))
+        move_log = []
+        winner, history, termination = game.play(time_limit=20,
+                                                 move_log=move_log,
+                                                 clock="thread")
+        self.assertNotEqual(termination, "timeout")
+        self.assertEqual(len(move_log), len(history) + 1)
+        for entry in move_log:
+            self.assertLess(entry["time_ms"], 20)
+            self.assertGreaterEqual(entry["wall_ms"], 30)
+            self.assertLess(entry["cpu_ms"], 20)
+        with self.assertRaises(ValueError):
+            game.play(clock="sundial")
+
+    def test_utility(self):
+        game = isolation.Board(self.player1, self.player2, 3, 3)
+        game.apply_move((1, 1))
+        game.apply_move((0, 0))
+        self.assertTrue(game.is_loser(self.player1))
+        self.assertTrue(game.is_winner(self.player2))
+        self.assertEqual(game.utility(self.player2), float("inf"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""Unit tests for the symmetry-reduced opening book"""
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import isolation
+import game_agent
+import opening_book
+
+from competition_agent import CustomPlayer
+from sample_players import improved_score
+
+
+class FixedDepthPlayer(game_agent.AlphaBetaPlayer):
+    """Iterative deepening to a fixed depth, for repeatable book moves. As
+    in a timed search, later positions are searched less deeply, so the
+    entries they find in a shared table are deep enough to be used.
+    """
+
+    def __init__(self, tt=None):
+        super().__init__(score_fn=improved_score, tt=tt)
+
+    def depth(self, game):
+        return 4 - game.move_count
+
+    def get_move(self, game, time_left):
+        self.time_left = time_left
+        for depth in range(1, self.depth(game) + 1):
+            move = self.alphabeta(game, depth)
+        return move
+
+
+class OpeningBookTest(unittest.TestCase):
+    """Unit tests for opening_book.build_book and OpeningBook"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmpdir, "book.bin")
+        # the empty board and the 6 classes of first moves on a 5x5 board
+        cls.count = opening_book.build_book(cls.path, plies=1, time_limit=5.,
+                                            width=5, height=5)
+        cls.book = opening_book.OpeningBook(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.book.close()
+        shutil.rmtree(cls.tmpdir)
+
+    def test_positions(self):
+        positions = opening_book.opening_positions(1, 5, 5)
+        self.assertEqual(len(positions), 7)
+        self.assertEqual(self.count, 7)
+        self.assertEqual(len(self.book), 7)
+        self.assertEqual(os.path.getsize(self.path), 16 + 7 * 10)
+
+    def test_symmetric_lookup(self):
+        game = isolation.Board("p1", "p2", 5, 5)
+        game.apply_move((0, 1))
+        move = self.book.lookup(game)
+        self.assertIn(move, game.get_legal_moves())
+        # the mirrored position gets the mirrored move
+        mirror = isolation.Board("p1", "p2", 5, 5)
+        mirror.apply_move((1, 4))
+        self.assertEqual(self.book.lookup(mirror), (move[1], 4 - move[0]))
+
+        game.apply_move(move)
+        self.assertIsNone(self.book.lookup(game))
+        self.assertIsNone(self.book.lookup(isolation.Board("p1", "p2")))
+
+    def test_players(self):
+        book = pickle.loads(pickle.dumps(self.book))
+        for player in (game_agent.AlphaBetaPlayer(book=book),
+                       CustomPlayer(book=book)):
+            game = isolation.Board("opponent", player, 5, 5)
+            game.apply_move((2, 2))
+            self.assertEqual(player.get_move(game, lambda: 1000.),
+                             book.lookup(game))
+        book.close()
+
+    def test_shared_table(self):
+        # one table serves every position, from both seats; the book moves
+        # must be as good as those of a search without a table
+        player = FixedDepthPlayer(tt=game_agent.TranspositionTable())
+        plain = FixedDepthPlayer()
+        plain.time_left = lambda: 1000.
+        path = os.path.join(self.tmpdir, "shared.bin")
+        opening_book.build_book(path, plies=2, player=player, width=5,
+                                height=5)
+        book = opening_book.OpeningBook(path)
+        try:
+            for board in opening_book.opening_positions(2, 5, 5):
+                if board.move_count & 1:
+                    game = board.replace_players("opponent", plain)
+                else:
+                    game = board.replace_players(plain, "opponent")
+                depth = plain.depth(game)
+                values = {move: plain.move_value(game, move, depth)
+                          for move in game.get_legal_moves()}
+                self.assertEqual(values[book.lookup(game)],
+                                 max(values.values()))
+        finally:
+            book.close()
+
+    def test_positions_searched_from_scratch(self):
+        player = game_agent.AlphaBetaPlayer(
+            tt=game_agent.TranspositionTable(), ordering=True)
+        player._history[(9, 9)] = 10 ** 6
+        player.tt.store(1, 9, 0., game_agent.EXACT, (9, 9))
+        opening_book._init_worker(player)
+        board = isolation.Board("p1", "p2", 5, 5)
+        board.apply_move((2, 2))
+        self.assertIsNotNone(opening_book._search_position((board, 20.)))
+        self.assertNotIn((9, 9), player._history)
+        self.assertIsNone(player.tt.probe(1))
+
+    def test_invalid_file(self):
+        path = os.path.join(self.tmpdir, "invalid.bin")
+        with open(path, "wb") as f:
+            f.write(b"\0" * 26)
+        with self.assertRaises(ValueError):
+            opening_book.OpeningBook(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
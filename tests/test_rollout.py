@@ -0,0 +1,79 @@
+"""Unit tests for the vectorized batch playouts (requires NumPy)"""
+
+import unittest
+
+import isolation
+import game_agent
+
+try:
+    import rollout
+except ImportError:  # NumPy is not installed
+    rollout = None
+
+
+@unittest.skipIf(rollout is None, "NumPy is not installed")
+class BatchRolloutTest(unittest.TestCase):
+    """Unit tests for rollout.BatchRollout"""
+
+    def test_neighbors(self):
+        table = rollout.BatchRollout().neighbors(3, 3)
+        self.assertEqual(table.shape, (10, 8))
+        self.assertEqual(sorted(table[0][:2]), [5, 7])
+        self.assertTrue((table[4] == 9).all())
+
+    def test_forced_result(self):
+        # on a 3x3 board the center cell has no knight moves
+        game = isolation.Board("p1", "p2", 3, 3)
+        game.apply_move((1, 1))
+        game.apply_move((0, 0))
+        batch = rollout.BatchRollout(batch=50, seed=0)
+        self.assertEqual(batch.playout(game, "p1"), 0)
+        self.assertEqual(batch.playout(game, "p2"), 50)
+
+    def test_both_players_share_the_games(self):
+        game = isolation.Board("p1", "p2")
+        game.apply_move((3, 3))
+        for policy in rollout.BatchRollout.POLICIES:
+            wins = [rollout.BatchRollout(500, policy, seed=1).playout(game, p)
+                    for p in ("p1", "p2")]
+            self.assertEqual(sum(wins), 500)
+            self.assertTrue(0 < wins[0] < 500)
+
+    def test_mcts_player(self):
+        player = game_agent.MCTSPlayer(
+            iterations=50, rollout=rollout.BatchRollout(batch=16, seed=0))
+        game = isolation.Board(player, "opponent", 5, 5)
+        game.apply_move((2, 2))
+        game.apply_move((0, 0))
+        self.assertIn(player.get_move(game, lambda: 1000.),
+                      game.get_legal_moves())
+        self.assertEqual(player.root.visitcount, 50 * 16)
+
+    def test_amaf(self):
+        game = isolation.Board("p1", "p2")
+        game.apply_move((3, 3))
+        game.apply_move((2, 4))
+        wins = rollout.BatchRollout(200, seed=2).playout(game, "p1")
+        result = rollout.BatchRollout(200, seed=2).playout(game, "p1",
+                                                           amaf=True)
+        self.assertEqual(result[0], wins)
+        own, other = result[1]
+        # every game starts with a move by p1
+        self.assertGreaterEqual(sum(v for _, v in own.values()), 200)
+        for cell_stats in (own, other):
+            for cell, (w, v) in cell_stats.items():
+                self.assertTrue(0 <= w <= v <= 200)
+                self.assertNotIn(cell, (3 + 3 * 7, 2 + 4 * 7))
+
+        player = game_agent.MCTSPlayer(
+            iterations=20, rave=100,
+            rollout=rollout.BatchRollout(batch=16, seed=0))
+        game = isolation.Board(player, "opponent", 5, 5)
+        game.apply_move((2, 2))
+        game.apply_move((0, 0))
+        self.assertIn(player.get_move(game, lambda: 1000.),
+                      game.get_legal_moves())
+
+
+if __name__ == '__main__':
+    unittest.main()
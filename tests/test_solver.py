@@ -0,0 +1,71 @@
+"""Unit tests for the small-board solver and its database"""
+
+import filecmp
+import os
+import shutil
+import tempfile
+import unittest
+
+import isolation
+import game_agent
+import solver
+
+
+def negamax(game):
+    """Unmemoized reference search returning (win, distance). """
+    best = (False, 0)
+    for move in game.get_legal_moves():
+        win, distance = negamax(game.forecast_move(move))
+        child = (not win, distance + 1)
+        if best == (False, 0) or solver._rank(child) > solver._rank(best):
+            best = child
+    return best
+
+
+class SolverTest(unittest.TestCase):
+    """Unit tests for solver.solve and SolutionDatabase"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.path = os.path.join(cls.tmpdir, "4x4.bin")
+        cls.value = solver.solve(cls.path, 4, 4, processes=1)
+        cls.database = solver.SolutionDatabase(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.database.close()
+        shutil.rmtree(cls.tmpdir)
+
+    def test_matches_reference_search(self):
+        game = isolation.Board("p1", "p2", 4, 4)
+        self.assertEqual(self.database.value(game), self.value)
+        for move in [(0, 0), (1, 2), (2, 1), (3, 3)]:
+            game.apply_move(move)
+        self.assertEqual(self.database.value(game), negamax(game))
+        # the book move keeps the value of the position
+        win, distance = self.database.value(game)
+        child = self.database.value(
+            game.forecast_move(self.database.lookup(game)))
+        self.assertEqual((not child[0], child[1] + 1), (win, distance))
+        self.assertIsNone(self.database.value(isolation.Board("p1", "p2")))
+
+    def test_parallel_matches_serial(self):
+        serial = os.path.join(self.tmpdir, "serial.bin")
+        parallel = os.path.join(self.tmpdir, "parallel.bin")
+        self.assertEqual(solver.solve(serial, 3, 4, processes=1),
+                         solver.solve(parallel, 3, 4, processes=2))
+        self.assertTrue(filecmp.cmp(serial, parallel, shallow=False))
+
+    def test_player_oracle(self):
+        player = game_agent.AlphaBetaPlayer(book=self.database)
+        game = isolation.Board(player, "opponent", 4, 4)
+        game.apply_move((1, 1))
+        game.apply_move((2, 2))
+        self.assertEqual(player.get_move(game, lambda: 1000.),
+                         self.database.lookup(game))
+        self.assertEqual(player.nodes, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
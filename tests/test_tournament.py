@@ -0,0 +1,243 @@
+"""Unit tests for the tournament runner"""
+
+import io
+import math
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from contextlib import redirect_stdout
+
+import isolation
+import tournament
+
+from sample_players import GreedyPlayer, RandomPlayer, improved_score
+
+
+class TournamentTest(unittest.TestCase):
+    """Unit tests for the parallel tournament mode"""
+
+    def setUp(self):
+        self.cpu_agents = [tournament.Agent(RandomPlayer(), "Random")]
+        self.test_agents = [tournament.Agent(RandomPlayer(), "Random_1"),
+                            tournament.Agent(RandomPlayer(), "Random_2")]
+
+    def test_random_opening(self):
+        first, second = tournament.random_opening()
+        board = isolation.Board("p1", "p2")
+        self.assertTrue(board.move_is_legal(first))
+        board.apply_move(first)
+        self.assertTrue(board.move_is_legal(second))
+
+    def test_parallel_rounds(self):
+        records = []
+        rounds = list(tournament.play_rounds_parallel(
+            self.cpu_agents, self.test_agents, 3, records, processes=2))
+        self.assertEqual(len(rounds), 1)
+        wins, timeouts, forfeits = rounds[0]
+        self.assertEqual((timeouts, forfeits), (0, 0))
+        self.assertEqual(len(records), 12)
+        for name, won in zip(["Random_1", "Random_2"], wins):
+            games = [r for r in records if r["agent"] == name]
+            self.assertEqual(sorted(r["seat"] for r in games),
+                             [1, 1, 1, 2, 2, 2])
+            self.assertEqual(won, sum(r["winner"] == name for r in games))
+
+    def test_play_matches(self):
+        with redirect_stdout(io.StringIO()) as out:
+            records = tournament.play_matches(self.cpu_agents,
+                                              self.test_agents, 1,
+                                              processes=2)
+        self.assertEqual(len(records), 4)
+        self.assertIn("Win Rate:", out.getvalue())
+
+    def test_game_log_resume(self):
+        path = os.path.join(tempfile.mkdtemp(), "games.jsonl")
+        with tournament.GameLog(path) as log, redirect_stdout(io.StringIO()):
+            records = tournament.play_matches(self.cpu_agents,
+                                              self.test_agents, 2, log=log)
+        self.assertEqual(len(records), 8)
+        self.assertEqual(
+            [(r["agent"], r["match"], r["seat"]) for r in records[:4]],
+            [("Random_1", 0, 2), ("Random_1", 0, 1),
+             ("Random_2", 0, 2), ("Random_2", 0, 1)])
+        with open(path) as f:
+            lines = f.readlines()
+
+        for processes in (1, 2):
+            # a crash loses the last games, and cuts a line short
+            with open(path, "w") as f:
+                f.writelines(lines[:5])
+                f.write(lines[5][:20])
+            with tournament.GameLog(path) as log:
+                self.assertEqual(len(log), 5)
+                self.assertEqual(log.records[0], records[0])
+                with redirect_stdout(io.StringIO()):
+                    resumed = tournament.play_matches(
+                        self.cpu_agents, self.test_agents, 2,
+                        processes=processes, log=log)
+                self.assertEqual(len(log), 8)
+            self.assertEqual(resumed[:5], records[:5])
+            games = {(r["agent"], r["match"], r["seat"]) for r in resumed}
+            self.assertEqual(len(games), 8)
+            # the interrupted pair is completed from its opening
+            for r in resumed:
+                self.assertEqual(r["opening"],
+                                 log.opening("Random", r["agent"],
+                                             r["match"]))
+
+        # a complete log rebuilds the results without playing
+        with open(path) as f:
+            self.assertEqual(len(f.readlines()), 8)
+        with tournament.GameLog(path) as log:
+            log.append = None
+            with redirect_stdout(io.StringIO()) as out:
+                tournament.play_matches(self.cpu_agents, self.test_agents, 2,
+                                        log=log)
+        self.assertIn("Win Rate:", out.getvalue())
+
+
+class SPRTTest(unittest.TestCase):
+    """Unit tests for the sequential probability ratio test"""
+
+    def setUp(self):
+        self.cpu_agent = tournament.Agent(RandomPlayer(), "Random")
+        self.test_agents = [tournament.Agent(RandomPlayer(), "Random_1"),
+                            tournament.Agent(RandomPlayer(), "Random_2")]
+
+    def test_bounds(self):
+        with self.assertRaises(ValueError):
+            tournament.SPRT(elo0=10, elo1=0)
+        with self.assertRaises(ValueError):
+            tournament.SPRT(alpha=0.6, beta=0.6)
+        sprt = tournament.SPRT(alpha=0.05, beta=0.1)
+        self.assertAlmostEqual(sprt.upper, math.log(0.9 / 0.05))
+        self.assertAlmostEqual(sprt.lower, math.log(0.1 / 0.95))
+        self.assertEqual(sprt.llr(), 0.)
+
+    def test_decisions(self):
+        stronger = tournament.SPRT(0, 30)
+        while stronger.status is None:
+            stronger.add(2)
+        self.assertEqual(stronger.status, "pass")
+        self.assertLess(stronger.pairs, 50)
+        self.assertGreater(stronger.elo()[1], 0)
+
+        equal = tournament.SPRT(0, 30)
+        while equal.status is None:
+            equal.add(1)
+        self.assertEqual(equal.status, "fail")
+        elo, lower, upper = equal.elo()
+        self.assertAlmostEqual(elo, 0.)
+        self.assertLess(lower, 0)
+        self.assertGreater(upper, 0)
+
+        # the decision is kept when more pairs are added
+        pairs = equal.pairs
+        for _ in range(10):
+            equal.add(2)
+        self.assertEqual((equal.status, equal.pairs), ("fail", pairs + 10))
+        self.assertEqual(equal.wins, pairs + 20)
+
+    def test_play_round_sprt(self):
+        tests = [tournament.SPRT(), tournament.SPRT()]
+        tests[0].status = "pass"
+        records = []
+        counts = tournament.play_round_sprt(
+            self.cpu_agent, self.test_agents, tests, 3, records)
+        self.assertEqual(counts, (0, 0))
+        self.assertEqual(tests[0].pairs, 0)
+        self.assertEqual(tests[1].pairs, 3)
+        self.assertEqual(len(records), 6)
+        self.assertTrue(all(r["agent"] == "Random_2" for r in records))
+        self.assertEqual(tests[1].wins,
+                         sum(r["winner"] == "Random_2" for r in records))
+
+    def test_play_matches_sprt(self):
+        sprt = tournament.SPRT(0, 100)
+        with redirect_stdout(io.StringIO()) as out:
+            records = tournament.play_matches([self.cpu_agent],
+                                              self.test_agents, 2,
+                                              processes=2, sprt=sprt)
+        self.assertEqual(sprt.pairs, 0)
+        self.assertIn(len(records), range(4, 9))
+        self.assertIn("LLR", out.getvalue())
+
+
+class CoordinatorTest(unittest.TestCase):
+    """Unit tests for the distributed tournament mode"""
+
+    def setUp(self):
+        self.cpu_agents = [tournament.make_agent("Random", "RandomPlayer")]
+        self.test_agents = [
+            tournament.make_agent("Greedy", "GreedyPlayer",
+                                  score_fn="improved_score"),
+            tournament.make_agent("Random_2", "RandomPlayer")]
+
+    def test_make_agent(self):
+        agent = self.test_agents[0]
+        self.assertEqual(agent.name, "Greedy")
+        self.assertIsInstance(agent.player, GreedyPlayer)
+        self.assertIs(agent.player.score, improved_score)
+        self.assertEqual(tournament.agent_from_spec(agent.spec).spec,
+                         agent.spec)
+        with self.assertRaises(ValueError):
+            tournament.make_agent("Nobody", "NoSuchPlayer")
+        with self.assertRaises(ValueError):
+            tournament.make_agent("Score", "improved_score")
+
+    def test_parse_address(self):
+        self.assertEqual(tournament.parse_address("localhost:9000"),
+                         ("localhost", 9000))
+        self.assertEqual(tournament.parse_address("9000"), ("", 9000))
+
+    def test_remote_games(self):
+        with tournament.Coordinator(("127.0.0.1", 0)) as coordinator:
+            with self.assertRaises(ValueError):
+                coordinator.pool([tournament.Agent(RandomPlayer(), "R")],
+                                 self.test_agents)
+
+            workers = [threading.Thread(target=tournament.run_worker,
+                                        args=(coordinator.address, name))
+                       for name in ("worker_1", "worker_2")]
+            tasks = []
+
+            def lose_task():
+                # a worker that is lost with the first task
+                with socket.create_connection(coordinator.address) as conn:
+                    stream = conn.makefile("rwb")
+                    tournament._send(stream, {"type": "hello",
+                                              "name": "lost"})
+                    tasks.append(tournament._receive(stream))
+                for worker in workers:
+                    worker.start()
+
+            threading.Thread(target=lose_task).start()
+
+            with redirect_stdout(io.StringIO()) as out:
+                records = tournament.play_matches(
+                    self.cpu_agents, self.test_agents, 3,
+                    coordinator=coordinator)
+                tournament.play_matches(
+                    self.cpu_agents, self.test_agents, 3,
+                    coordinator=coordinator, sprt=tournament.SPRT())
+        for worker in workers:
+            worker.join(10)
+            self.assertFalse(worker.is_alive())
+
+        self.assertEqual(tasks[0]["agent"]["name"], "Greedy")
+        self.assertEqual(len(records), 12)
+        games = {(r["agent"], r["match"], r["seat"]) for r in records}
+        self.assertEqual(len(games), 12)
+        self.assertIsInstance(records[0]["opening"][0], tuple)
+        self.assertEqual(coordinator.workers["lost"]["lost"], 1)
+        self.assertEqual(sum(coordinator.workers[name]["games"]
+                             for name in ("worker_1", "worker_2")),
+                         24)
+        self.assertIn("Games/min", out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,14 +10,47 @@ The matches are fair because the board is initialized randomly for both
 players, and the players play each match twice -- once as the first player and
 once as the second player.  Randomizing the openings and switching the player
 order corrects for imbalances due to both starting position and initiative.
+
+With `--processes N` the games are played on a pool of N worker processes
+(each game is one task). The agents are timed on the wall clock unless
+`--clock thread` (or `process`) charges each move with the CPU time it used
+instead, which lets more games than cores run at once without spurious
+timeouts.
+
+With `--sprt ELO0 ELO1` the number of matches is not fixed: each test agent
+plays fair pairs against each opponent until a sequential probability ratio
+test (see `SPRT`) decides between the two Elo differences, or `--matches`
+pairs have been played. Clear results are reached after a few dozen games,
+and close ones get the games they need.
+
+With `--log PATH` every finished game is appended to a JSON lines log (see
+`GameLog`). Running the tournament again with the same log resumes it: the
+logged games are counted without being played again.
+
+With `--serve [HOST:]PORT` the games are handed out over TCP to workers
+started with `--worker HOST:PORT`, on this host or on others (see
+`Coordinator`); the agents are rebuilt by name on the workers.
 """
+import argparse
+import copy
+import importlib
 import itertools
+import json
+import math
+import multiprocessing
+import os
+import queue
 import random
+import socket
+import threading
+import time
+import traceback
 import warnings
 
 from collections import namedtuple
 
 from isolation import Board
+from isolation.isolation import CLOCKS
 from sample_players import (RandomPlayer, open_move_score,
                             improved_score, center_score)
 from game_agent import (MinimaxPlayer, AlphaBetaPlayer, custom_score,
@@ -25,6 +58,7 @@ from game_agent import (MinimaxPlayer, AlphaBetaPlayer, custom_score,
 from competition_agent import CustomPlayer
 
 NUM_MATCHES = 50  # number of matches against each opponent
+MAX_SPRT_MATCHES = 1000  # maximum number of matches of a sequential test
 TIME_LIMIT = 150  # number of milliseconds before timeout
 
 DESCRIPTION = """
@@ -35,40 +69,825 @@ ID and alpha-beta search with the custom_score functions defined in
 game_agent.py.
 """
 
-Agent = namedtuple("Agent", ["player", "name"])
+Agent = namedtuple("Agent", ["player", "name", "spec"], defaults=[None])
+
+AGENT_MODULES = ("game_agent", "competition_agent", "sample_players")
+
+
+def _agent_attribute(name):
+    for module in AGENT_MODULES:
+        value = getattr(importlib.import_module(module), name, None)
+        if value is not None:
+            return value
+    raise ValueError("{} is not defined in {}".format(
+        name, ", ".join(AGENT_MODULES)))
+
+
+def agent_from_spec(spec):
+    """Build the agent described by a spec (see `make_agent`)."""
+    player = _agent_attribute(spec["player"])
+    if not isinstance(player, type):
+        raise ValueError("{} is not a class".format(spec["player"]))
+    kwargs = {}
+    for key, value in spec["args"].items():
+        if isinstance(value, str):
+            try:
+                value = _agent_attribute(value)
+            except ValueError:
+                pass
+            else:
+                if not callable(value):
+                    raise ValueError("{} is not a function".format(value))
+        kwargs[key] = value
+    return Agent(player(**kwargs), spec["name"], spec)
+
+
+def make_agent(name, player, **kwargs):
+    """Return an agent that can be rebuilt by name, e.g., by the remote
+    workers of a `Coordinator`.
+
+    Parameters
+    ----------
+    name : str
+        The name of the agent.
+
+    player : str
+        The name of a player class defined in one of `AGENT_MODULES`.
+
+    **kwargs
+        JSON values passed to the class; a string that names a function of
+        `AGENT_MODULES` (e.g., "improved_score") is replaced by the function.
+
+    Returns
+    -------
+    Agent
+        The agent, with its spec: a dict of the name, the class name and the
+        arguments.
+    """
+    return agent_from_spec({"name": name, "player": player, "args": kwargs})
+
+
+def expected_score(elo):
+    """Return the expected score of a player `elo` points stronger than its
+    opponent.
+    """
+    return 1. / (1. + 10. ** (-elo / 400.))
 
 
-def play_round(cpu_agent, test_agents, win_counts, num_matches):
+class SPRT:
+    """Sequential probability ratio test of the Elo difference between a
+    test agent and its opponent, measured on fair pairs of games.
+
+    A fair pair (one game from each seat, from the same opening) scores 0,
+    0.5 or 1 for the test agent. The test weighs the hypothesis H0 that the
+    test agent is `elo0` points stronger against H1 that it is `elo1` points
+    stronger with the generalized log-likelihood ratio (LLR) of the mean pair
+    score, in its normal approximation. H1 is accepted ("pass") once the LLR
+    reaches log((1 - beta) / alpha), and H0 ("fail") once it falls to
+    log(beta / (1 - alpha)), so a false pass has probability at most `alpha`
+    and a false fail at most `beta`.
+
+    Parameters
+    ----------
+    elo0, elo1 : float (optional)
+        The Elo differences of H0 and H1, with elo0 < elo1.
+
+    alpha, beta : float (optional)
+        The probabilities of false pass and false fail.
+    """
+    def __init__(self, elo0=0., elo1=30., alpha=0.05, beta=0.05):
+        if not elo0 < elo1:
+            raise ValueError("elo0 must be smaller than elo1")
+        if not (0 < alpha < 1 and 0 < beta < 1 and alpha + beta < 1):
+            raise ValueError("alpha and beta must be probabilities with "
+                             "alpha + beta < 1")
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.alpha = alpha
+        self.beta = beta
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.counts = [0, 0, 0]  # pairs won 0, 1 and 2 games
+        self.status = None  # "pass" or "fail" once the test is decided
+
+    @property
+    def pairs(self):
+        """Number of fair pairs played."""
+        return sum(self.counts)
+
+    @property
+    def wins(self):
+        """Number of games won by the test agent."""
+        return self.counts[1] + 2 * self.counts[2]
+
+    def add(self, wins):
+        """Record a fair pair in which the test agent won `wins` (0, 1 or 2)
+        games, and decide the test if the LLR crosses a bound. Pairs added
+        after the decision are counted but do not change it.
+        """
+        self.counts[wins] += 1
+        if self.status is None:
+            llr = self.llr()
+            if llr >= self.upper:
+                self.status = "pass"
+            elif llr <= self.lower:
+                self.status = "fail"
+
+    def _moments(self):
+        # mean and variance of the pair score, with half a pseudo-pair of
+        # each outcome so that a run of equal pairs has a nonzero variance
+        counts = [c + 0.5 for c in self.counts]
+        total = sum(counts)
+        mean = (0.5 * counts[1] + counts[2]) / total
+        variance = (0.25 * counts[1] + counts[2]) / total - mean ** 2
+        return mean, variance
+
+    def llr(self):
+        """Return the log-likelihood ratio of H1 against H0."""
+        if not self.pairs:
+            return 0.
+        mean, variance = self._moments()
+        s0, s1 = expected_score(self.elo0), expected_score(self.elo1)
+        return (self.pairs * (s1 - s0) * (2 * mean - s0 - s1) /
+                (2 * variance))
+
+    def elo(self, z=1.96):
+        """Return the estimated Elo difference with the bounds of its
+        confidence interval (95% for the default `z`).
+
+        Returns
+        -------
+        (float, float, float)
+            The estimate and the lower and upper bounds.
+        """
+        mean, variance = self._moments()
+        margin = z * math.sqrt(variance / max(self.pairs, 1))
+
+        def to_elo(score):
+            score = min(max(score, 1e-6), 1 - 1e-6)
+            return -400. * math.log10(1. / score - 1.)
+
+        return to_elo(mean), to_elo(mean - margin), to_elo(mean + margin)
+
+
+def play_round(cpu_agent, test_agents, win_counts, num_matches, records=None,
+               clock="wall", log=None):
     """Compare the test agents to the cpu agent in "fair" matches.
 
     "Fair" matches use random starting locations and force the agents to
     play as both first and second player to control for advantages resulting
     from choosing better opening moves or having first initiative to move.
+
+    If `records` is a list, one dict per game is appended to it with the
+    agent names, the index of the match, the seat of the test agent, the
+    opening, the winner, the termination reason and the per-move log
+    produced by `Board.play`.
+
+    `clock` selects the clock the moves are timed on (see `Board.play`).
+
+    If `log` is a `GameLog`, every game played is appended to it, and the
+    games it already holds are counted without being played again.
+    """
+    counts = [0, 0]
+    for match in range(num_matches):
+        opening = _match_opening(cpu_agent, test_agents, match, log)
+        for agent in test_agents:
+            for seat in (2, 1):
+                won, record = _play_logged_game(cpu_agent, agent, match,
+                                                seat, opening, clock, log)
+                win_counts[agent.player if won else cpu_agent.player] += 1
+                _count_termination(record, counts)
+                if records is not None:
+                    records.append(record)
+    return tuple(counts)
+
+
+def play_game(cpu_agent, agent, match, seat, opening, clock="wall",
+              time_limit=TIME_LIMIT):
+    """Play one game between the cpu agent and the test agent, seated in
+    `seat`, from the moves in `opening`. Returns whether the test agent won
+    and the game record described in `play_round`.
+    """
+    if seat == 1:
+        game = Board(agent.player, cpu_agent.player)
+    else:
+        game = Board(cpu_agent.player, agent.player)
+    for move in opening:
+        game.apply_move(move)
+    move_log = []
+    winner, _, termination = game.play(time_limit=time_limit,
+                                       move_log=move_log, clock=clock)
+    won = winner == agent.player
+    return won, {
+        "opponent": cpu_agent.name,
+        "agent": agent.name,
+        "match": match,
+        "seat": seat,
+        "opening": list(opening),
+        "winner": agent.name if won else cpu_agent.name,
+        "termination": termination,
+        "moves": move_log,
+    }
+
+
+def _play_logged_game(cpu_agent, agent, match, seat, opening, clock, log):
+    """Return the result and record of a game from `log` if it holds the
+    game, or else play it and append it to `log`.
+    """
+    if log is not None:
+        record = log.get(cpu_agent.name, agent.name, match, seat)
+        if record is not None:
+            return record["winner"] == agent.name, record
+        # the other seat of an interrupted pair keeps its opening
+        opening = log.opening(cpu_agent.name, agent.name, match) or opening
+    won, record = play_game(cpu_agent, agent, match, seat, opening, clock)
+    if log is not None:
+        log.append(record)
+    return won, record
+
+
+def _match_opening(cpu_agent, test_agents, match, log):
+    # reuse the opening of a match that was started before a resume
+    if log is not None:
+        for agent in test_agents:
+            opening = log.opening(cpu_agent.name, agent.name, match)
+            if opening is not None:
+                return opening
+    return random_opening()
+
+
+def _count_termination(record, counts):
+    if record["termination"] == "timeout":
+        counts[0] += 1
+    elif record["termination"] == "forfeit":
+        counts[1] += 1
+
+
+def play_round_sprt(cpu_agent, test_agents, tests, max_matches, records=None,
+                    clock="wall", log=None):
+    """Play fair pairs between the cpu agent and each test agent until its
+    `SPRT` in `tests` is decided, or `max_matches` pairs have been played.
+
+    Each match draws one random opening that is played from both seats by
+    every test agent whose test is still undecided, and the pair is added to
+    its test. Game records are appended to `records`, and the games are
+    logged to and resumed from `log`, as in `play_round`.
+
+    Returns the number of timeouts and forfeits.
+    """
+    counts = [0, 0]
+    for match in range(max_matches):
+        playing = [(agent, test) for agent, test in zip(test_agents, tests)
+                   if test.status is None]
+        if not playing:
+            break
+        opening = _match_opening(cpu_agent, test_agents, match, log)
+        for agent, test in playing:
+            wins = 0
+            for seat in (2, 1):
+                won, record = _play_logged_game(cpu_agent, agent, match,
+                                                seat, opening, clock, log)
+                wins += won
+                _count_termination(record, counts)
+                if records is not None:
+                    records.append(record)
+            test.add(wins)
+    return tuple(counts)
+
+
+class GameLog:
+    """Append-only log of the games of a tournament, one JSON record per
+    line, as described in `play_round`.
+
+    Each game is written and flushed as soon as it ends, so a run that dies
+    loses at most the games in progress. Opening an existing log loads its
+    games: a tournament run with the same log counts them instead of playing
+    them again, plays only the missing ones (completing an interrupted pair
+    from its logged opening) and, once every game is logged, rebuilds its
+    tables without playing at all. A last line cut short by a crash is
+    dropped.
+
+    Parameters
+    ----------
+    path : str
+        The log file, created if it does not exist.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.records = []
+        self._games = {}
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b""
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._add(_decode_record(json.loads(line.decode("utf-8"))))
+        self._file = open(path, "ab")
+        self._file.truncate(end)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _add(self, record):
+        self.records.append(record)
+        self._games[record["opponent"], record["agent"], record["match"],
+                    record["seat"]] = record
+
+    def append(self, record):
+        """Write the record of a finished game to the log."""
+        self._file.write(json.dumps(record).encode("utf-8") + b"\n")
+        self._file.flush()
+        self._add(record)
+
+    def get(self, opponent, agent, match, seat):
+        """Return the logged record of a game, or None."""
+        return self._games.get((opponent, agent, match, seat))
+
+    def opening(self, opponent, agent, match):
+        """Return the logged opening of a match of the test agent, or None.
+        """
+        for seat in (2, 1):
+            record = self.get(opponent, agent, match, seat)
+            if record is not None:
+                return record["opening"]
+        return None
+
+    def close(self):
+        """Close the log file."""
+        self._file.close()
+
+
+def _decode_record(record):
+    # JSON turns the move tuples into lists
+    record["opening"] = [tuple(move) for move in record["opening"]]
+    for entry in record["moves"]:
+        if isinstance(entry["move"], list):
+            entry["move"] = tuple(entry["move"])
+    return record
+
+
+def random_opening():
+    """Return a random first move and response, as played by `play_round`.
+    """
+    board = Board("player 1", "player 2")
+    opening = []
+    for _ in range(2):
+        move = random.choice(board.get_legal_moves())
+        board.apply_move(move)
+        opening.append(move)
+    return opening
+
+
+_worker_agents = None
+
+
+def _init_worker(cpu_agents, test_agents):
+    # the agents are unpickled once per worker process
+    global _worker_agents
+    _worker_agents = cpu_agents, test_agents
+
+
+def _play_game(task):
+    """Play one game of a parallel tournament in a worker process. Returns
+    the indices of the agents, whether the test agent won and the game record
+    described in `play_round`.
+    """
+    cpu_idx, test_idx, match, seat, opening, clock = task
+    won, record = play_game(_worker_agents[0][cpu_idx],
+                            _worker_agents[1][test_idx], match, seat,
+                            opening, clock)
+    return cpu_idx, test_idx, won, record
+
+
+def _pool(processes, coordinator, cpu_agents, test_agents):
+    if coordinator is not None:
+        return coordinator.pool(cpu_agents, test_agents)
+    return multiprocessing.Pool(processes, _init_worker,
+                                (cpu_agents, test_agents))
+
+
+def play_rounds_parallel(cpu_agents, test_agents, num_matches, records=None,
+                         processes=None, clock="wall", log=None,
+                         coordinator=None):
+    """Play the rounds of `play_round` for every cpu agent on a pool of
+    worker processes, one game per task.
+
+    Every match draws one random opening that is played by each test agent
+    from both seats, as in `play_round`. The agents are sent to each worker
+    once, so they must be picklable. Results are collected as the games
+    finish, and the totals of each round are yielded, in the order of
+    `cpu_agents`, as soon as all its games are done. The games are logged
+    to and resumed from `log` as in `play_round`. With a `Coordinator` in
+    `coordinator`, its workers play the games instead of the pool.
+
+    Yields
+    ------
+    (list<int>, int, int)
+        The number of games won by each test agent, and the number of
+        timeouts and forfeits, for each cpu agent.
+    """
+    rounds = [[[0] * len(test_agents), 0, 0] for _ in cpu_agents]
+    pending = [0] * len(cpu_agents)
+    done = 0
+
+    def tally(cpu_idx, test_idx, won, record):
+        counts = rounds[cpu_idx]
+        counts[0][test_idx] += won
+        if record["termination"] == "timeout":
+            counts[1] += 1
+        elif record["termination"] == "forfeit":
+            counts[2] += 1
+        if records is not None:
+            records.append(record)
+
+    tasks = []
+    for cpu_idx, cpu_agent in enumerate(cpu_agents):
+        for match in range(num_matches):
+            opening = _match_opening(cpu_agent, test_agents, match, log)
+            for test_idx, agent in enumerate(test_agents):
+                for seat in (2, 1):
+                    record = None
+                    if log is not None:
+                        record = log.get(cpu_agent.name, agent.name, match,
+                                         seat)
+                    if record is not None:
+                        tally(cpu_idx, test_idx,
+                              record["winner"] == agent.name, record)
+                        continue
+                    game_opening = opening
+                    if log is not None:
+                        game_opening = log.opening(cpu_agent.name, agent.name,
+                                                   match) or opening
+                    tasks.append((cpu_idx, test_idx, match, seat,
+                                  game_opening, clock))
+                    pending[cpu_idx] += 1
+
+    if tasks:
+        with _pool(processes, coordinator, cpu_agents, test_agents) as pool:
+            for cpu_idx, test_idx, won, record in pool.imap_unordered(
+                    _play_game, tasks):
+                if log is not None:
+                    log.append(record)
+                tally(cpu_idx, test_idx, won, record)
+                pending[cpu_idx] -= 1
+                while done < len(cpu_agents) and not pending[done]:
+                    yield tuple(rounds[done])
+                    done += 1
+    for counts in rounds[done:]:
+        yield tuple(counts)
+
+
+def play_rounds_sprt_parallel(cpu_agents, test_agents, tests, max_matches,
+                              records=None, processes=None, clock="wall",
+                              log=None, coordinator=None):
+    """Play the rounds of `play_round_sprt` for every cpu agent, one after
+    the other, on a pool of worker processes.
+
+    `tests[i][j]` is the `SPRT` of test agent j against cpu agent i. New
+    pairs are started only for undecided tests, and only as workers become
+    free, so little is played beyond the decision: the pairs still running
+    when a test is decided are added to it without changing its result. The
+    games are logged to and resumed from `log`, and played by the workers of
+    `coordinator`, as in `play_rounds_parallel`.
+
+    Yields
+    ------
+    (int, int)
+        The number of timeouts and forfeits of each round.
+    """
+    workers = processes or multiprocessing.cpu_count()
+    results = queue.Queue()
+    with _pool(processes, coordinator, cpu_agents, test_agents) as pool:
+        for cpu_idx, (cpu_agent, round_tests) in enumerate(zip(cpu_agents,
+                                                               tests)):
+            counts = [0, 0]
+            started = [0] * len(test_agents)
+            pairs = {}
+            running = 0
+
+            def finish(test_idx, won, record):
+                _count_termination(record, counts)
+                if records is not None:
+                    records.append(record)
+                pair = test_idx, record["match"]
+                pairs[pair].append(won)
+                if len(pairs[pair]) == 2:
+                    round_tests[test_idx].add(sum(pairs.pop(pair)))
+
+            while True:
+                # keep the workers busy with the pairs of undecided tests
+                if coordinator is not None:
+                    workers = max(len(coordinator), 1)
+                while running < workers:
+                    playing = [i for i, test in enumerate(round_tests)
+                               if test.status is None and
+                               started[i] < max_matches]
+                    if not playing:
+                        break
+                    test_idx = min(playing, key=started.__getitem__)
+                    agent = test_agents[test_idx]
+                    match = started[test_idx]
+                    started[test_idx] += 1
+                    pairs[test_idx, match] = []
+                    opening = None
+                    if log is not None:
+                        opening = log.opening(cpu_agent.name, agent.name,
+                                              match)
+                    opening = opening or random_opening()
+                    for seat in (2, 1):
+                        record = None
+                        if log is not None:
+                            record = log.get(cpu_agent.name, agent.name,
+                                             match, seat)
+                        if record is not None:
+                            finish(test_idx, record["winner"] == agent.name,
+                                   record)
+                            continue
+                        pool.apply_async(
+                            _play_game,
+                            ((cpu_idx, test_idx, match, seat, opening,
+                              clock),),
+                            callback=results.put,
+                            error_callback=results.put)
+                        running += 1
+                if not running:
+                    break
+                result = results.get()
+                if isinstance(result, BaseException):
+                    raise result
+                running -= 1
+                _, test_idx, won, record = result
+                if log is not None:
+                    log.append(record)
+                finish(test_idx, won, record)
+            yield tuple(counts)
+
+
+class Coordinator:
+    """Serve the games of a tournament to worker processes over TCP.
+
+    Workers (see `run_worker`) connect to `address`, from this host or from
+    others, and play one game at a time: the coordinator sends a task with
+    the specs of the two agents (see `make_agent`), the match, the seat, the
+    opening, the time limit and the clock, and the worker answers with the
+    game record described in `play_round`. Every message is a JSON object on
+    one line. A task whose worker disconnects, or does not answer within
+    `task_timeout` seconds, is handed to the next worker, at most `retries`
+    times.
+
+    The coordinator stands in for the process pool of `play_rounds_parallel`
+    and `play_rounds_sprt_parallel` (see `play_matches`), so its agents must
+    have specs. Tasks wait in a queue until a worker is free, and workers
+    may join at any time.
+
+    Parameters
+    ----------
+    address : (str, int) (optional)
+        The host and port to listen on; port 0 picks a free port, which can
+        be read from the `address` attribute.
+
+    retries : int (optional)
+        The number of times a lost task is handed out again.
+
+    task_timeout : float (optional)
+        Seconds a worker may take to play one game.
+    """
+    def __init__(self, address=("", 0), retries=3, task_timeout=600.):
+        self.retries = retries
+        self.task_timeout = task_timeout
+        self._server = socket.create_server(address)
+        self.address = self._server.getsockname()[:2]
+        self._tasks = queue.Queue()
+        self._lock = threading.Lock()
+        self.workers = {}  # name -> dict of games, lost tasks and times
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def __len__(self):
+        """Number of connected workers."""
+        with self._lock:
+            return sum(stats["connected"] for stats in self.workers.values())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop accepting workers, and dismiss them as they become free."""
+        self._tasks.put(None)
+        self._server.close()
+
+    def submit(self, message, callback, error_callback):
+        """Queue a task message; `callback` is called with the reply of the
+        worker, or `error_callback` with an exception if the task fails.
+        """
+        self._tasks.put((message, callback, error_callback, 0))
+
+    def pool(self, cpu_agents, test_agents):
+        """Return a stand-in for a process pool playing the tasks of
+        `_play_game` on the workers.
+        """
+        return _RemotePool(self, cpu_agents, test_agents)
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,),
+                             daemon=True).start()
+
+    def _serve(self, conn):
+        """Hand out tasks to one worker until it is lost or dismissed."""
+        conn.settimeout(self.task_timeout)
+        stream = conn.makefile("rwb")
+        try:
+            name = _receive(stream)["name"]
+        except (OSError, ValueError, KeyError):
+            conn.close()
+            return
+        with self._lock:
+            stats = self.workers.setdefault(name, {
+                "games": 0, "lost": 0, "busy": 0., "start": time.perf_counter(),
+                "end": None, "connected": 0})
+            stats["connected"] += 1
+        try:
+            while True:
+                task = self._tasks.get()
+                if task is None:
+                    # wake the other connections too
+                    self._tasks.put(None)
+                    _send(stream, {"type": "done"})
+                    return
+                message, callback, error_callback, attempts = task
+                start = time.perf_counter()
+                try:
+                    _send(stream, message)
+                    reply = _receive(stream)
+                except (OSError, ValueError) as error:
+                    with self._lock:
+                        stats["lost"] += 1
+                    if attempts < self.retries:
+                        self._tasks.put((message, callback, error_callback,
+                                         attempts + 1))
+                    else:
+                        error_callback(RuntimeError(
+                            "task lost by {} workers: {}".format(
+                                attempts + 1, error)))
+                    return
+                with self._lock:
+                    stats["games"] += 1
+                    stats["busy"] += time.perf_counter() - start
+                if "error" in reply:
+                    error_callback(RuntimeError("worker {} failed: {}".format(
+                        name, reply["error"])))
+                else:
+                    callback(reply)
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                stats["connected"] -= 1
+                stats["end"] = time.perf_counter()
+            conn.close()
+
+    def print_throughput(self):
+        """Print the games played by each worker and its throughput."""
+        with self._lock:
+            workers = sorted(self.workers.items())
+        if not workers:
+            return
+        now = time.perf_counter()
+        print("\n{:^24}{:^10}{:^12}{:^12}{:^8}".format(
+            "Worker", "Games", "Games/min", "Busy", "Lost"))
+        for name, stats in workers:
+            elapsed = ((stats["end"] if not stats["connected"] else now) -
+                       stats["start"])
+            print("{:^24}{:^10}{:^12}{:^12}{:^8}".format(
+                name, stats["games"],
+                "{:.1f}".format(60 * stats["games"] / max(elapsed, 1e-9)),
+                "{:.0f}%".format(100 * stats["busy"] / max(elapsed, 1e-9)),
+                stats["lost"]))
+
+
+class _RemotePool:
+    """The subset of the `multiprocessing.Pool` interface used by the round
+    runners, playing `_play_game` tasks on the workers of a `Coordinator`.
     """
-    timeout_count = 0
-    forfeit_count = 0
-    for _ in range(num_matches):
+    def __init__(self, coordinator, cpu_agents, test_agents):
+        for agent in itertools.chain(cpu_agents, test_agents):
+            if agent.spec is None:
+                raise ValueError("Agent {} has no spec; build it with "
+                                 "make_agent()".format(agent.name))
+        self._coordinator = coordinator
+        self._agents = cpu_agents, test_agents
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def apply_async(self, func, args=(), callback=None, error_callback=None):
+        assert func is _play_game
+        cpu_idx, test_idx, match, seat, opening, clock = args[0]
+
+        def reply(message):
+            record = _decode_record(message["record"])
+            callback((cpu_idx, test_idx, message["won"], record))
+
+        self._coordinator.submit({
+            "type": "task",
+            "cpu_agent": self._agents[0][cpu_idx].spec,
+            "agent": self._agents[1][test_idx].spec,
+            "match": match,
+            "seat": seat,
+            "opening": list(opening),
+            "time_limit": TIME_LIMIT,
+            "clock": clock,
+        }, reply, error_callback)
+
+    def imap_unordered(self, func, tasks):
+        results = queue.Queue()
+        for task in tasks:
+            self.apply_async(func, (task,), results.put, results.put)
+        for _ in range(len(tasks)):
+            result = results.get()
+            if isinstance(result, BaseException):
+                raise result
+            yield result
+
 
-        games = sum([[Board(cpu_agent.player, agent.player),
-                      Board(agent.player, cpu_agent.player)]
-                    for agent in test_agents], [])
+def _send(stream, message):
+    stream.write(json.dumps(message).encode("utf-8") + b"\n")
+    stream.flush()
 
-        # initialize all games with a random move and response
-        for _ in range(2):
-            move = random.choice(games[0].get_legal_moves())
-            for game in games:
-                game.apply_move(move)
 
-        # play all games and tally the results
-        for game in games:
-            winner, _, termination = game.play(time_limit=TIME_LIMIT)
-            win_counts[winner] += 1
-            if termination == "timeout":
-                timeout_count += 1
-            elif termination == "forfeit":
-                forfeit_count += 1
+def _receive(stream):
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("connection closed")
+    return json.loads(line.decode("utf-8"))
 
-    return timeout_count, forfeit_count
+
+def run_worker(address, name=None):
+    """Connect to a `Coordinator` at `address` and play the games it hands
+    out until it dismisses the worker. The agents are built from their specs
+    (see `make_agent`) and kept for the following games.
+
+    Returns the number of games played.
+    """
+    if name is None:
+        name = "{}-{}".format(socket.gethostname(), os.getpid())
+    agents = {}
+
+    def agent(spec):
+        key = json.dumps(spec, sort_keys=True)
+        if key not in agents:
+            agents[key] = agent_from_spec(spec)
+        return agents[key]
+
+    games = 0
+    with socket.create_connection(address) as conn:
+        stream = conn.makefile("rwb")
+        _send(stream, {"type": "hello", "name": name})
+        while True:
+            try:
+                task = _receive(stream)
+            except ConnectionError:
+                break
+            if task["type"] == "done":
+                break
+            try:
+                won, record = play_game(
+                    agent(task["cpu_agent"]), agent(task["agent"]),
+                    task["match"], task["seat"],
+                    [tuple(move) for move in task["opening"]],
+                    task["clock"], task["time_limit"])
+            except Exception:
+                _send(stream, {"type": "result",
+                               "error": traceback.format_exc()})
+                continue
+            _send(stream, {"type": "result", "won": won, "record": record})
+            games += 1
+    return games
+
+
+def parse_address(text):
+    """Parse "host:port" or "port" into a (host, port) address."""
+    host, _, port = text.rpartition(":")
+    return host, int(port)
 
 
 def update(total_wins, wins):
@@ -77,28 +896,149 @@ def update(total_wins, wins):
     return total_wins
 
 
-def play_matches(cpu_agents, test_agents, num_matches):
-    """Play matches between the test agent and each cpu_agent individually. """
+def print_search_stats(records):
+    """Summarize the per-move search statistics collected in game records by
+    agents that have a `stats` attribute (see `game_agent.SearchStats`).
+    """
+    summary = {}
+    for record in records:
+        names = {record["seat"]: record["agent"],
+                 3 - record["seat"]: record["opponent"]}
+        for entry in record["moves"]:
+            stats = entry.get("stats")
+            if stats is not None:
+                summary.setdefault(names[entry["seat"]], []).append(stats)
+    if not summary:
+        return
+
+    print("\n{:^20}{:^10}{:^10}{:^12}{:^12}{:^12}".format(
+        "Agent", "Moves", "Depth", "Nodes/sec", "Cache hit", "Min margin"))
+    for name, moves in sorted(summary.items()):
+        depths = [m["depth"] for m in moves if m["depth"] is not None]
+        hits = [m["cache_hit_rate"] for m in moves
+                if m["cache_hit_rate"] is not None]
+        print("{:^20}{:^10}{:^10}{:^12}{:^12}{:^12}".format(
+            name, len(moves),
+            "{:.1f}".format(sum(depths) / len(depths)) if depths else "-",
+            "{:.0f}".format(sum(m["nps"] for m in moves) / len(moves)),
+            "{:.1f}%".format(100 * sum(hits) / len(hits)) if hits else "-",
+            "{:.1f}ms".format(min(m["margin_ms"] for m in moves))))
+
+
+def print_move_times(records):
+    """Print the mean time charged per move to each agent, with the mean
+    wall-clock and process CPU time of its moves (see `Board.play`).
+    """
+    summary = {}
+    for record in records:
+        names = {record["seat"]: record["agent"],
+                 3 - record["seat"]: record["opponent"]}
+        for entry in record["moves"]:
+            summary.setdefault(names[entry["seat"]], []).append(entry)
+    if not summary:
+        return
+
+    print("\n{:^20}{:^10}{:^12}{:^12}{:^12}".format(
+        "Agent", "Moves", "Charged", "Wall", "CPU"))
+    for name, moves in sorted(summary.items()):
+        print("{:^20}{:^10}{:^12}{:^12}{:^12}".format(
+            name, len(moves), *["{:.1f}ms".format(
+                sum(m[key] for m in moves) / len(moves))
+                for key in ("time_ms", "wall_ms", "cpu_ms")]))
+
+
+def print_sprt(cpu_agents, test_agents, tests):
+    """Print the result and the Elo estimate of each sequential test."""
+    print("\n{:^20}{:^13}{:^8}{:^22}{:^8}{:^10}".format(
+        "Agent", "Opponent", "Pairs", "Elo (95% CI)", "LLR", "Result"))
+    for cpu_agent, round_tests in zip(cpu_agents, tests):
+        for agent, test in zip(test_agents, round_tests):
+            print("{:^20}{:^13}{:^8}{:^22}{:^8}{:^10}".format(
+                agent.name, cpu_agent.name, test.pairs,
+                "{:+.0f} [{:+.0f}, {:+.0f}]".format(*test.elo()),
+                "{:.2f}".format(test.llr()), test.status or "-"))
+
+
+def play_matches(cpu_agents, test_agents, num_matches, processes=1,
+                 clock="wall", sprt=None, log=None, coordinator=None):
+    """Play matches between the test agent and each cpu_agent individually.
+
+    When `processes` is not 1, the games are played in parallel by
+    `play_rounds_parallel` on that many worker processes (None uses every
+    CPU). `clock` selects the clock the moves are timed on (see
+    `Board.play`); with a CPU clock, the mean time charged per move is
+    printed next to the wall-clock time, to show the load of the machine.
+
+    With an `SPRT` in `sprt`, each test agent plays fair pairs against each
+    cpu agent until a copy of `sprt` is decided (see `play_round_sprt`), with
+    at most `num_matches` pairs, and the result of every test is printed.
+
+    With a `GameLog` in `log`, every game played is appended to the log, and
+    the games it already holds are counted instead of being played, so an
+    interrupted tournament resumes where it stopped (the agent names
+    identify the games, so they must not change between runs).
+
+    With a `Coordinator` in `coordinator`, the games are played by its
+    remote workers, as with a pool of `processes`, and the throughput of
+    each worker is printed.
+
+    Returns the list of game records described in `play_round`.
+    """
+    records = []
     total_wins = {agent.player: 0 for agent in test_agents}
+    total_games = {agent.player: 0 for agent in test_agents}
     total_timeouts = 0.
     total_forfeits = 0.
-    total_matches = 2 * num_matches * len(cpu_agents)
+    tests = None
+    if sprt is not None:
+        tests = [[copy.deepcopy(sprt) for _ in test_agents]
+                 for _ in cpu_agents]
 
     print("\n{:^9}{:^13}".format("Match #", "Opponent") + ''.join(['{:^13}'.format(x[1].name) for x in enumerate(test_agents)]))
     print("{:^9}{:^13} ".format("", "") +  ' '.join(['{:^5}| {:^5}'.format("Won", "Lost") for x in enumerate(test_agents)]))
 
+    if coordinator is not None:
+        processes = None
+    if processes != 1 and tests is not None:
+        rounds = play_rounds_sprt_parallel(cpu_agents, test_agents, tests,
+                                           num_matches, records, processes,
+                                           clock, log, coordinator)
+    elif processes != 1:
+        rounds = play_rounds_parallel(cpu_agents, test_agents, num_matches,
+                                      records, processes, clock, log,
+                                      coordinator)
+
     for idx, agent in enumerate(cpu_agents):
-        wins = {key: 0 for (key, value) in test_agents}
+        wins = {test_agent.player: 0 for test_agent in test_agents}
         wins[agent.player] = 0
 
         print("{!s:^9}{:^13}".format(idx + 1, agent.name), end="", flush=True)
 
-        counts = play_round(agent, test_agents, wins, num_matches)
+        games = {test_agent.player: 2 * num_matches
+                 for test_agent in test_agents}
+
+        if tests is not None:
+            if processes == 1:
+                counts = play_round_sprt(agent, test_agents, tests[idx],
+                                         num_matches, records, clock, log)
+            else:
+                counts = next(rounds)
+            for test_agent, test in zip(test_agents, tests[idx]):
+                wins[test_agent.player] = test.wins
+                games[test_agent.player] = 2 * test.pairs
+        elif processes == 1:
+            counts = play_round(agent, test_agents, wins, num_matches,
+                                records, clock, log)
+        else:
+            round_wins, *counts = next(rounds)
+            for test_agent, won in zip(test_agents, round_wins):
+                wins[test_agent.player] = won
         total_timeouts += counts[0]
         total_forfeits += counts[1]
         total_wins = update(total_wins, wins)
-        _total = 2 * num_matches
-        round_totals = sum([[wins[agent.player], _total - wins[agent.player]]
+        total_games = update(total_games, games)
+        round_totals = sum([[wins[agent.player],
+                             games[agent.player] - wins[agent.player]]
                             for agent in test_agents], [])
         print(' ' + ' '.join([
             '{:^5}| {:^5}'.format(
@@ -110,7 +1050,8 @@ def play_matches(cpu_agents, test_agents, num_matches):
     print('{:^9}{:^13}'.format("", "Win Rate:") +
         ''.join([
             '{:^13}'.format(
-                "{:.1f}%".format(100 * total_wins[x[1].player] / total_matches)
+                "{:.1f}%".format(100 * total_wins[x[1].player] /
+                                 max(total_games[x[1].player], 1))
             ) for x in enumerate(test_agents)
     ]))
 
@@ -123,35 +1064,99 @@ def play_matches(cpu_agents, test_agents, num_matches):
         print(("\nYour agents forfeited {} games while there were still " +
                "legal moves available to play.\n").format(total_forfeits))
 
+    if tests is not None:
+        print_sprt(cpu_agents, test_agents, tests)
+    print_search_stats(records)
+    if clock != "wall":
+        print_move_times(records)
+    if coordinator is not None:
+        coordinator.print_throughput()
+    return records
+
 
 def main():
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("-p", "--processes", type=int, default=1,
+                        help="play the games on this many worker processes "
+                             "(0 uses every CPU)")
+    parser.add_argument("-c", "--clock", choices=sorted(CLOCKS),
+                        default="wall",
+                        help="time the moves on the wall clock, or on the "
+                             "CPU time of the thread or process")
+    parser.add_argument("--sprt", type=float, nargs=2,
+                        metavar=("ELO0", "ELO1"),
+                        help="play until a sequential test decides whether "
+                             "each agent is ELO0 or ELO1 points stronger "
+                             "than each opponent")
+    parser.add_argument("--alpha", type=float, default=0.05,
+                        help="probability of a false pass of the test")
+    parser.add_argument("--beta", type=float, default=0.05,
+                        help="probability of a false fail of the test")
+    parser.add_argument("-n", "--matches", type=int, default=None,
+                        help="matches against each opponent (default: {}, "
+                             "or at most {} with --sprt)".format(
+                                 NUM_MATCHES, MAX_SPRT_MATCHES))
+    parser.add_argument("--log", metavar="PATH",
+                        help="append every game to this JSON lines log, and "
+                             "resume the tournament it holds")
+    parser.add_argument("--serve", metavar="[HOST:]PORT",
+                        help="hand out the games to workers connecting to "
+                             "this address")
+    parser.add_argument("--worker", metavar="HOST:PORT",
+                        help="play the games of the coordinator at this "
+                             "address, instead of running a tournament")
+    args = parser.parse_args()
+    if args.worker:
+        games = run_worker(parse_address(args.worker))
+        print("Played {} games".format(games))
+        return
+
+    sprt = None
+    num_matches = args.matches or NUM_MATCHES
+    if args.sprt:
+        sprt = SPRT(args.sprt[0], args.sprt[1], args.alpha, args.beta)
+        num_matches = args.matches or MAX_SPRT_MATCHES
 
     # Define two agents to compare -- these agents will play from the same
     # starting position against the same adversaries in the tournament
+    # (the agents are built by name, so that remote workers can rebuild them)
     test_agents = [
-#        Agent(AlphaBetaPlayer(score_fn=improved_score), "AB_Improved"),
-        Agent(CustomPlayer(), "Compitition_agent"),
-        Agent(AlphaBetaPlayer(score_fn=custom_score), "AB_Custom")
-#        Agent(AlphaBetaPlayer(score_fn=custom_score_2), "AB_Custom_2"),
-#        Agent(AlphaBetaPlayer(score_fn=custom_score_3), "AB_Custom_3"),        
+#        make_agent("AB_Improved", "AlphaBetaPlayer", score_fn="improved_score"),
+        make_agent("Compitition_agent", "CustomPlayer"),
+        make_agent("AB_Custom", "AlphaBetaPlayer", score_fn="custom_score")
+#        make_agent("AB_Custom_2", "AlphaBetaPlayer", score_fn="custom_score_2"),
+#        make_agent("AB_Custom_3", "AlphaBetaPlayer", score_fn="custom_score_3"),
     ]
 
     # Define a collection of agents to compete against the test agents
     cpu_agents = [
-#        Agent(RandomPlayer(), "Random"),
-#        Agent(MinimaxPlayer(score_fn=open_move_score), "MM_Open"),
-#        Agent(MinimaxPlayer(score_fn=center_score), "MM_Center"),
-#        Agent(MinimaxPlayer(score_fn=improved_score), "MM_Improved"),
-#        Agent(AlphaBetaPlayer(score_fn=open_move_score), "AB_Open"),
-#        Agent(AlphaBetaPlayer(score_fn=center_score), "AB_Center"),
-        Agent(AlphaBetaPlayer(score_fn=improved_score), "AB_Improved")
+#        make_agent("Random", "RandomPlayer"),
+#        make_agent("MM_Open", "MinimaxPlayer", score_fn="open_move_score"),
+#        make_agent("MM_Center", "MinimaxPlayer", score_fn="center_score"),
+#        make_agent("MM_Improved", "MinimaxPlayer", score_fn="improved_score"),
+#        make_agent("AB_Open", "AlphaBetaPlayer", score_fn="open_move_score"),
+#        make_agent("AB_Center", "AlphaBetaPlayer", score_fn="center_score"),
+        make_agent("AB_Improved", "AlphaBetaPlayer", score_fn="improved_score")
     ]
 
     print(DESCRIPTION)
     print("{:^74}".format("*************************"))
     print("{:^74}".format("Playing Matches"))
     print("{:^74}".format("*************************"))
-    play_matches(cpu_agents, test_agents, NUM_MATCHES)
+    log = GameLog(args.log) if args.log else None
+    coordinator = None
+    if args.serve:
+        coordinator = Coordinator(parse_address(args.serve))
+        print("Waiting for workers on {}:{}".format(*coordinator.address))
+    try:
+        play_matches(cpu_agents, test_agents, num_matches,
+                     args.processes or None, args.clock, sprt, log,
+                     coordinator)
+    finally:
+        if coordinator is not None:
+            coordinator.close()
+        if log is not None:
+            log.close()
 
 
 if __name__ == "__main__":